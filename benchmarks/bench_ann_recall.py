@@ -0,0 +1,58 @@
+"""
+Recall@k vs. latency of the IVF index against exact search.
+
+Embeddings of real episodes are clustered rather than uniform, so the corpus is a
+mixture of Gaussians on the unit sphere; queries are drawn from the same mixture.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from common import time_per_call
+from vector_index import ExactIndex, IVFIndex
+
+
+def clustered_vectors(n, dim=384, clusters=512, spread=1.4, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    x = centers[rng.integers(0, clusters, n)] + spread * rng.standard_normal((n, dim)).astype(np.float32) / np.sqrt(dim)
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    return x
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    ap.add_argument("--spread", type=float, default=1.4, help="within-cluster noise; higher is harder")
+    args = ap.parse_args()
+
+    for n in args.sizes:
+        data = clustered_vectors(n + args.queries, spread=args.spread)
+        vectors, queries = data[:n], data[n:]
+        exact = ExactIndex()
+        truth = [set(exact.search(vectors, q, args.k)[0].tolist()) for q in queries]
+        exact_ms = time_per_call(lambda: [exact.search(vectors, q, args.k) for q in queries], repeat=3) / len(queries)
+
+        ivf = IVFIndex()
+        t0 = time.perf_counter()
+        ivf.build(vectors)
+        build_s = time.perf_counter() - t0
+
+        print(f"\n{n} vectors, k={args.k}: exact {exact_ms:.3f} ms/query, ivf build {build_s:.2f} s "
+              f"({len(ivf.lists)} buckets)")
+        print(f"{'nprobe':>8} {'recall@k':>9} {'ms/query':>9} {'speedup':>8}")
+        for nprobe in args.nprobe:
+            ivf.nprobe = nprobe
+            found = [set(ivf.search(vectors, q, args.k)[0].tolist()) for q in queries]
+            recall = np.mean([len(f & t) / len(t) for f, t in zip(found, truth)])
+            ms = time_per_call(lambda: [ivf.search(vectors, q, args.k) for q in queries], repeat=3) / len(queries)
+            print(f"{nprobe:>8} {recall:>9.3f} {ms:>9.3f} {exact_ms / ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
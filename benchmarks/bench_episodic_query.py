@@ -0,0 +1,56 @@
+"""
+Micro-benchmark for EpisodicStore.query at 1k, 10k and 100k episodes.
+
+"before" replays the old query path (torch.stack over per-doc tensors followed by
+util.semantic_search); "after" is the current contiguous-matrix EpisodicStore.
+Query encoding is excluded from both so only the search cost is compared.
+"""
+import argparse
+import tempfile
+import os
+
+from common import HashEncoder, random_unit_vectors, time_per_call
+from vector_store import EpisodicStore
+
+
+def bench_before(vectors, query, k):
+    import torch
+    from sentence_transformers import util
+
+    docs = [{"embedding": torch.from_numpy(v.copy())} for v in vectors]
+    q = torch.from_numpy(query)
+
+    def run():
+        corpus = torch.stack([d["embedding"] for d in docs])
+        util.semantic_search(q, corpus, top_k=k)
+
+    return time_per_call(run)
+
+
+def bench_after(vectors, query, k):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = EpisodicStore(path=os.path.join(tmp, "episodic_store.json"), model=HashEncoder(vectors.shape[1]),
+                               model_name=HashEncoder(vectors.shape[1]).name)
+        for i, v in enumerate(vectors):
+            store._append(f"event {i}", v, {})
+        store._encode = lambda text: query
+        return time_per_call(lambda: store.query("q", k=k))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    ap.add_argument("--k", type=int, default=5)
+    args = ap.parse_args()
+
+    print(f"{'episodes':>10} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for n in args.sizes:
+        vectors = random_unit_vectors(n)
+        query = random_unit_vectors(1, seed=1)[0]
+        before = bench_before(vectors, query, args.k)
+        after = bench_after(vectors, query, args.k)
+        print(f"{n:>10} {before:>10.3f} {after:>10.3f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
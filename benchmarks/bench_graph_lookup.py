@@ -0,0 +1,84 @@
+"""
+Benchmark for entity lookups at 1k, 10k and 100k graph nodes.
+
+"label-less" replays the old lookup, MATCH (a {name, session}), which no index can serve,
+so Neo4j scans every node; "indexed" is the current get_context_for_entities, which goes
+through the :Entity(name, session) constraint. The in-memory backend is timed on the
+same graph for comparison. The Neo4j columns need NEO4J_URI; the test session is deleted at the end.
+"""
+import argparse
+import random
+import uuid
+
+import common  # noqa: F401  (puts the repo root on sys.path)
+from common import time_per_call
+from config import settings
+from graph_store import Neo4jGraphStore
+from memory_graph import InMemoryGraphStore
+
+TYPES = ["Npc", "Location", "Item", "Creature", "Faction"]
+RELS = ["KNOWS", "LOCATED_IN", "OWNS", "GUARDS", "HUNTS"]
+
+LEGACY_QUERY = """
+UNWIND range(0, size($names) - 1) AS idx
+WITH idx, $names[idx] AS entity_name
+MATCH p = (a {name: entity_name, session: $session_id})-[*1..1]-(b)
+WITH idx, nodes(p)[-2] AS s, last(relationships(p)) AS r, b
+WITH idx, collect([labels(s)[0], s.name, type(r), labels(b)[0], b.name])[..$limit] AS rows
+RETURN idx, rows
+ORDER BY idx
+"""
+
+
+def make_world(n: int, seed: int = 0) -> dict:
+    """n typed nodes, each with one relationship to the next node and one to a random node."""
+    rng = random.Random(seed)
+    nodes = [{"id": str(i), "labels": ["Entity", TYPES[i % len(TYPES)]], "props": {"name": f"entity {i}"}}
+             for i in range(n)]
+    edges = []
+    for i in range(n):
+        edges.append({"src": str(i), "type": RELS[i % len(RELS)], "tgt": str((i + 1) % n)})
+        edges.append({"src": str(i), "type": rng.choice(RELS), "tgt": str(rng.randrange(n))})
+    return {"nodes": nodes, "edges": edges}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    ap.add_argument("--names", type=int, default=3, help="entity names looked up per call")
+    args = ap.parse_args()
+    use_neo4j = bool(settings.NEO4J_URI)
+    if not use_neo4j:
+        print("NEO4J_URI not set: timing the in-memory backend only")
+
+    print(f"{'nodes':>8} {'label-less ms':>14} {'indexed ms':>11} {'in-memory ms':>13}")
+    for n in args.sizes:
+        world = make_world(n)
+        rng = random.Random(n)
+        names = [f"entity {rng.randrange(n)}" for _ in range(args.names)]
+
+        memory = InMemoryGraphStore()
+        memory.import_graph(world)
+        mem_ms = time_per_call(lambda: memory.get_context_for_entities(names), repeat=50)
+
+        legacy_ms = indexed_ms = float("nan")
+        if use_neo4j:
+            graph = Neo4jGraphStore(session_id=f"bench-{uuid.uuid4().hex[:8]}")
+            try:
+                graph.import_graph(world)
+                params = {"names": names, "limit": 5, "session_id": graph.session_id}
+
+                def legacy():
+                    with graph.driver.session() as s:
+                        list(s.run(LEGACY_QUERY, params))
+
+                legacy_ms = time_per_call(legacy)
+                indexed_ms = time_per_call(lambda: graph.get_context_for_entities(names))
+            finally:
+                graph.clear_graph()
+                graph.close()
+        print(f"{n:>8} {legacy_ms:>14.2f} {indexed_ms:>11.2f} {mem_ms:>13.3f}")
+
+
+if __name__ == "__main__":
+    main()
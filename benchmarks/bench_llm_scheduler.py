@@ -0,0 +1,81 @@
+"""
+Load test of the LLM request scheduler (llm_scheduler.py) against a fake model that
+injects 429s and latency (fake_llm.FakeChatModel).
+
+--threads callers each run --calls extractions; every text is asked for by --dup callers
+at about the same time, as when several sessions extract the same narration. The fake
+provider rejects a --rate-limit-p share of calls and any call beyond --provider-limit
+in flight. Reports failures, retries, coalesced calls, provider calls and queue wait,
+without the scheduler (one attempt, no limit) and with it.
+
+    python benchmarks/bench_llm_scheduler.py --threads 32 --rate-limit-p 0.1
+"""
+import argparse
+import threading
+import time
+
+import common  # noqa: F401  (puts the repository root on sys.path)
+from fake_llm import FakeChatModel, extraction_reply, story_reply, STORIES
+from config import settings
+from llm_client import LLMClient
+from llm_scheduler import LLMScheduler
+from tracing import tracer
+
+
+def run(args, scheduler: LLMScheduler) -> dict:
+    settings.CACHE_DIR = ""
+    extractor = FakeChatModel(extraction_reply, latency=args.latency, rate_limit_p=args.rate_limit_p,
+                              max_concurrent=args.provider_limit)
+    llm = LLMClient(story_llm=FakeChatModel(story_reply), extractor_llm=extractor, scheduler=scheduler)
+    tracer.enabled = True
+    tracer.reset()
+    failures = []
+    start = threading.Barrier(args.threads)
+
+    def caller(t):
+        start.wait()
+        for c in range(args.calls):
+            text = f"{STORIES[c % len(STORIES)]} (turn {c}, group {t // args.dup})"
+            try:
+                llm.extract_entities(text)
+            except Exception as e:
+                failures.append(type(e).__name__)
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=caller, args=(t,)) for t in range(args.threads)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    wall = time.perf_counter() - t0
+    wait = tracer.stats().get("llm.queue_wait", {})
+    return {"wall_s": wall, "failed": len(failures), "provider_calls": extractor.calls,
+            "provider_429": extractor.rate_limited, "queue_p95_ms": wait.get("p95", 0.0), **scheduler.stats()}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, default=32)
+    ap.add_argument("--calls", type=int, default=20, help="extractions per thread")
+    ap.add_argument("--dup", type=int, default=4, help="threads asking for each text")
+    ap.add_argument("--latency", type=float, default=0.02)
+    ap.add_argument("--rate-limit-p", type=float, default=0.1)
+    ap.add_argument("--provider-limit", type=int, default=8, help="fake provider's concurrent request limit")
+    ap.add_argument("--concurrency", type=int, default=6)
+    ap.add_argument("--rate", type=float, default=0.0, help="scheduler requests/s (0 = unlimited)")
+    args = ap.parse_args()
+
+    modes = {
+        "no retries": LLMScheduler(max_concurrency=args.threads, max_retries=0),
+        "scheduled": LLMScheduler(rate=args.rate, burst=args.concurrency, max_concurrency=args.concurrency,
+                                  max_retries=6, backoff=0.02, max_backoff=0.5, timeout=30),
+    }
+    keys = ["wall_s", "failed", "provider_calls", "provider_429", "retries", "coalesced", "queue_p95_ms"]
+    print(f"{'mode':>12} " + " ".join(f"{k:>14}" for k in keys))
+    for name, scheduler in modes.items():
+        r = run(args, scheduler)
+        print(f"{name:>12} " + " ".join(f"{r[k]:>14.2f}" if isinstance(r[k], float) else f"{r[k]:>14}" for k in keys))
+
+
+if __name__ == "__main__":
+    main()
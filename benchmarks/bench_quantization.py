@@ -0,0 +1,77 @@
+"""
+Memory per episode, recall@k and query latency of the quantized EpisodicStore modes
+(EPISODIC_PRECISION x EPISODIC_INDEX) against the float32 exact path.
+
+One store of clustered vectors (see bench_ann_recall.py) is written once and reopened at each
+precision, so every mode searches the same episodes; recall is measured against exact float32
+search. Bytes per episode count what stays in RAM: the embedding codes plus the index's own codes.
+
+    python benchmarks/bench_quantization.py --sizes 10000 100000
+"""
+import argparse
+import os
+import tempfile
+
+import numpy as np
+
+from common import HashEncoder, time_per_call
+from bench_ann_recall import clustered_vectors
+from config import settings
+from vector_index import BinaryIndex
+from vector_store import EpisodicStore
+
+MODES = [("float32", "exact"), ("float16", "exact"), ("int8", "exact"),
+         ("float32", "binary"), ("int8", "binary")]
+
+
+def open_store(path, precision, index):
+    settings.EPISODIC_INDEX = index
+    encoder = HashEncoder()
+    return EpisodicStore(path=path, model=encoder, model_name=encoder.name, precision=precision)
+
+
+def ram_bytes(store) -> int:
+    n = store._matrix.nbytes
+    if isinstance(store.index, BinaryIndex):
+        n += store.index.bits[:len(store)].nbytes
+    return n
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--rerank", type=int, nargs="+", default=[20, 50])
+    ap.add_argument("--candidates", type=int, default=1000, help="BINARY_CANDIDATES")
+    args = ap.parse_args()
+    settings.BINARY_CANDIDATES = args.candidates
+
+    for n in args.sizes:
+        data = clustered_vectors(n + args.queries)
+        vectors, queries = data[:n], data[n:]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "episodic_store")
+            store = open_store(path, "float32", "exact")
+            for i, v in enumerate(vectors):
+                store._append(f"event {i}", v, {})
+            store.persist(vectors)
+
+            truth = [set(store._search(q, args.k)[0].tolist()) for q in queries]
+            base_bytes = ram_bytes(store)
+            print(f"\n{n} episodes, k={args.k}, dim {vectors.shape[1]}")
+            print(f"{'precision':>9} {'index':>7} {'rerank':>6} {'bytes/ep':>9} {'vs f32':>7} {'recall@k':>9} {'ms/query':>9}")
+            for precision, index in MODES:
+                store = open_store(path, precision, index)
+                for rerank in ([0] if precision == "float32" else args.rerank):
+                    settings.EPISODIC_RERANK = rerank
+                    found = [set(store._search(q, args.k)[0].tolist()) for q in queries]
+                    recall = np.mean([len(f & t) / len(t) for f, t in zip(found, truth)])
+                    ms = time_per_call(lambda: [store._search(q, args.k) for q in queries], repeat=3) / len(queries)
+                    per_ep = ram_bytes(store) / n
+                    print(f"{precision:>9} {index:>7} {rerank or '-':>6} {per_ep:>9.1f} "
+                          f"{ram_bytes(store) / base_bytes:>6.2f}x {recall:>9.3f} {ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
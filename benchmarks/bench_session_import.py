@@ -0,0 +1,82 @@
+"""
+Session export/import of an N-episode campaign (see session_archive.py).
+
+Reports the time to export, to import reusing the stored embeddings, and to import with
+re-encoding; and, for the embedding step alone, one encode() call per episode against
+batches of --batch-size. HashEncoder stands in for the model unless --real-model is given,
+in which case sentence-transformers is loaded (batching is where the real model gains).
+
+    python benchmarks/bench_session_import.py --sizes 1000 50000 --real-model
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from common import HashEncoder
+from fake_llm import FakeChatModel
+from llm_client import LLMClient
+from lazy import LazyResource
+from memory_graph import InMemoryGraphStore
+from memory_manager import MemoryManager
+from session_archive import export_session, import_session
+from vector_store import EpisodicStore, EMBEDDING_MODEL, EMBEDDING_MODEL_NAME
+
+
+def make_manager(tmp: str, name: str, model, model_name: str) -> MemoryManager:
+    episodic = EpisodicStore(path=os.path.join(tmp, name), model=model, model_name=model_name)
+    llm = LLMClient(story_llm=FakeChatModel(lambda prompt: ""), extractor_llm=FakeChatModel(lambda prompt: "{}"))
+    return MemoryManager(session_id=name, llm=llm, graph=InMemoryGraphStore(name), episodic=episodic)
+
+
+def campaign(manager: MemoryManager, n: int):
+    texts = [f"Player: I search room {i} of the keep\nDM: You find clue {i * 7919 % 104729}." for i in range(n)]
+    vectors = manager.episodic.encode_many(texts)
+    manager.episodic.import_events([{"id": i, "text": t, "metadata": {"ts": i}} for i, t in enumerate(texts)],
+                                   vectors)
+    ents = [{"name": f"Room {i}", "type": "Location"} for i in range(0, n, 10)]
+    rels = [{"source": "Kael", "relation": "VISITED", "target": e["name"]} for e in ents]
+    manager.graph.apply_extraction(ents + [{"name": "Kael", "type": "Character"}], rels)
+    return texts
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000])
+    ap.add_argument("--batch-size", type=int, default=256)
+    ap.add_argument("--single-limit", type=int, default=2_000,
+                    help="encode at most this many texts one by one and extrapolate")
+    ap.add_argument("--real-model", action="store_true")
+    args = ap.parse_args()
+    model = EMBEDDING_MODEL if args.real_model else LazyResource.of(HashEncoder(), "embedding model")
+    model_name = EMBEDDING_MODEL_NAME if args.real_model else HashEncoder().name
+
+    print(f"{'episodes':>9} {'export s':>9} {'import s':>9} {'re-encode s':>12} {'single s':>9} {'batched s':>10}")
+    for n in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            source = make_manager(tmp, "source", model, model_name)
+            texts = campaign(source, n)
+            archive = os.path.join(tmp, "campaign.zip")
+            t_export = timed(lambda: export_session(source, archive))
+            target = make_manager(tmp, "target", model, model_name)
+            t_import = timed(lambda: import_session(target, archive))
+            t_reencode = timed(lambda: import_session(target, archive, batch_size=args.batch_size, reembed=True))
+
+            m = min(n, args.single_limit)
+            t_single = timed(lambda: [target.episodic.model.encode(t, convert_to_numpy=True,
+                                                                   normalize_embeddings=True) for t in texts[:m]])
+            t_single *= n / m
+            t_batched = timed(lambda: target.episodic.encode_many(texts, args.batch_size))
+            print(f"{n:>9} {t_export:>9.2f} {t_import:>9.2f} {t_reencode:>12.2f} {t_single:>9.2f} {t_batched:>10.2f}")
+            for manager in (source, target):
+                manager.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Shared helpers for the benchmark scripts in this folder.
+Run the scripts from the repository root, e.g. `python benchmarks/bench_episodic_query.py`.
+"""
+import os
+import sys
+import time
+import hashlib
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+class HashEncoder:
+    """
+    Stand-in for SentenceTransformer: deterministic pseudo-random unit vectors
+    seeded by the text, so benchmarks don't need to download or run the model.
+    Pass `name` to EpisodicStore as model_name, so its vectors never share cache entries
+    with the real model's.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.name = f"hash-encoder-{dim}"
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, sentences, convert_to_numpy=True, normalize_embeddings=True, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for i, t in enumerate(texts):
+            seed = int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "little")
+            v = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            out[i] = v / np.linalg.norm(v)
+        return out[0] if single else out
+
+
+def random_unit_vectors(n: int, dim: int = 384, seed: int = 0) -> np.ndarray:
+    v = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    v /= np.linalg.norm(v, axis=1, keepdims=True)
+    return v
+
+
+def time_per_call(fn, repeat: int = 20) -> float:
+    """Median wall time of fn() in milliseconds."""
+    fn()  # warm-up
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return float(np.median(samples))
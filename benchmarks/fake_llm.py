@@ -0,0 +1,141 @@
+"""
+Deterministic stand-in for the Groq chat models, for load tests and benchmarks.
+Build an LLMClient around it with fake_llm_client().
+"""
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from types import SimpleNamespace
+
+# name -> extraction type
+WORLD = {
+    "Kael": "Player", "Mira": "NPC", "Goblin": "NPC", "Old Mill": "Location",
+    "Whispering Woods": "Location", "Silver Key": "Item", "Wolf": "Animal", "Bridge": "Location",
+}
+RELATIONS = ["LOCATED_IN", "CARRIES", "FIGHTS", "ALLIED_WITH", "GUARDS"]
+STORIES = [
+    "Kael pushes through the Whispering Woods while a Wolf howls somewhere behind. "
+    "Mira waits by the Old Mill, the Silver Key glinting on her belt. What do you do?",
+    "A Goblin blocks the Bridge, demanding a toll. Kael notices the Silver Key would fit "
+    "the gate behind it. Mira whispers that the Goblin fears fire. What do you do?",
+    "The Old Mill creaks as Kael steps inside. A Wolf sleeps by the cold hearth and Mira "
+    "signals to stay quiet. A ladder leads up into darkness. What do you do?",
+]
+
+
+def _seed(text: str) -> int:
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def story_reply(prompt: str) -> str:
+    return STORIES[_seed(prompt) % len(STORIES)]
+
+
+def extraction_reply(prompt: str) -> str:
+    """Canned extraction JSON naming the WORLD entities that appear in the story part of the prompt."""
+    story = prompt.split("Story:", 1)[-1]
+    names = [n for n in WORLD if re.search(rf"\b{re.escape(n)}\b", story)]
+    entities = [{"name": n, "type": WORLD[n], "attributes": {"status": "alive"}} for n in names]
+    rels = [
+        {"source": a, "relation": RELATIONS[_seed(a + b) % len(RELATIONS)], "target": b}
+        for a, b in zip(names, names[1:])
+    ]
+    return "Here you go:\n" + json.dumps({"entities": entities, "relationships": rels})
+
+
+class FakeRateLimitError(Exception):
+    """What the Groq SDK raises on HTTP 429, as far as LLMScheduler can tell."""
+
+    def __init__(self, retry_after: float = 0.0):
+        super().__init__("Error code: 429 - rate limit reached (fake)")
+        self.status_code = 429
+        self.response = SimpleNamespace(status_code=429, headers={"retry-after": str(retry_after)} if retry_after else {})
+
+
+class FakeChatModel:
+    """
+    Duck-typed replacement for a langchain chat model.
+    - invoke(messages) returns a message with .content after `latency` seconds, or raises
+      TimeoutError once a `timeout` keyword (as the scheduler passes) runs out first
+    - stream(messages) yields the same text in `chunk_words`-word chunks, `chunk_delay` seconds apart
+    `respond(prompt) -> str` produces the reply text; `model_name` keys LLMClient's extraction cache.
+    To exercise LLMScheduler, `rate_limit_p` fails that share of calls with FakeRateLimitError,
+    and `max_concurrent` fails any call made while that many are already running.
+    """
+
+    def __init__(self, respond=story_reply, latency: float = 0.0, chunk_delay: float = 0.0, chunk_words: int = 3,
+                 rate_limit_p: float = 0.0, max_concurrent: int = 0, seed: int = 0, model_name: str = "fake-chat"):
+        self.respond = respond
+        self.model_name = model_name
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.chunk_words = chunk_words
+        self.rate_limit_p = rate_limit_p
+        self.max_concurrent = max_concurrent
+        self.calls = 0
+        self.rate_limited = 0
+        self._running = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _admit(self):
+        with self._lock:
+            self.calls += 1
+            crowded = self.max_concurrent and self._running >= self.max_concurrent
+            if crowded or (self.rate_limit_p and self._rng.random() < self.rate_limit_p):
+                self.rate_limited += 1
+                raise FakeRateLimitError()
+            self._running += 1
+
+    def _leave(self):
+        with self._lock:
+            self._running -= 1
+
+    def _prompt(self, messages) -> str:
+        return "\n".join(m["content"] if isinstance(m, dict) else str(getattr(m, "content", m)) for m in messages)
+
+    def _message(self, prompt: str, text: str):
+        usage = {"input_tokens": len(prompt.split()), "output_tokens": len(text.split())}
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        return SimpleNamespace(content=text, usage_metadata=usage)
+
+    def _wait(self, timeout: float = None):
+        if timeout is not None and self.latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError("Request timed out (fake)")
+        if self.latency:
+            time.sleep(self.latency)
+
+    def invoke(self, messages, timeout: float = None, **kwargs):
+        self._admit()
+        try:
+            prompt = self._prompt(messages)
+            self._wait(timeout)
+            return self._message(prompt, self.respond(prompt))
+        finally:
+            self._leave()
+
+    def stream(self, messages, timeout: float = None, **kwargs):
+        self._admit()
+        try:
+            prompt = self._prompt(messages)
+            self._wait(timeout)
+            words = self.respond(prompt).split(" ")
+            for i in range(0, len(words), self.chunk_words):
+                if i and self.chunk_delay:
+                    time.sleep(self.chunk_delay)
+                piece = " ".join(words[i:i + self.chunk_words])
+                yield SimpleNamespace(content=(" " if i else "") + piece)
+        finally:
+            self._leave()
+
+
+def fake_llm_client(latency: float = 0.0, chunk_delay: float = 0.0):
+    from llm_client import LLMClient
+    return LLMClient(
+        story_llm=FakeChatModel(story_reply, latency=latency, chunk_delay=chunk_delay),
+        extractor_llm=FakeChatModel(extraction_reply, latency=latency),
+    )
@@ -0,0 +1,106 @@
+"""
+Load test for server.py: many simulated players against one in-process GameServer.
+
+The LLM is the deterministic fake from fake_llm.py (with configurable latency), so only
+the server, memory pipeline and graph are exercised. The graph uses the configured Neo4j
+database (every simulated session is partitioned by its own session id and cleared at the end),
+or the in-process graph with --graph memory.
+Reports p50/p99 turn latency and throughput.
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+
+import numpy as np
+
+from common import HashEncoder
+from config import settings
+from fake_llm import fake_llm_client
+from lazy import LazyResource
+from server import GameServer
+
+ACTIONS = [
+    "I look around the Old Mill.",
+    "I ask Mira about the Silver Key.",
+    "I draw my sword and face the Goblin.",
+    "I follow the Wolf into the Whispering Woods.",
+    "I try to cross the Bridge quietly.",
+]
+
+
+async def read_block(reader) -> str:
+    lines = []
+    while True:
+        line = (await reader.readline()).decode("utf-8")
+        if not line:
+            raise ConnectionError("server closed the connection")
+        line = line.rstrip("\n")
+        if line == ".":
+            return "\n".join(lines)
+        lines.append(line[1:] if line.startswith("..") else line)
+
+
+async def player(host, port, turns, latencies, start_gate):
+    reader, writer = await asyncio.open_connection(host, port)
+    await read_block(reader)  # SESSION <id>
+    await start_gate.wait()
+    for t in range(turns):
+        t0 = time.perf_counter()
+        writer.write((ACTIONS[t % len(ACTIONS)] + "\n").encode("utf-8"))
+        await writer.drain()
+        await read_block(reader)
+        latencies.append(time.perf_counter() - t0)
+    writer.write(b"/reset\n/quit\n")
+    await writer.drain()
+    await read_block(reader)
+    await read_block(reader)
+    writer.close()
+
+
+async def run(args):
+    settings.GRAPH_BACKEND = args.graph
+    model = LazyResource.of(HashEncoder(), "embedding model") if args.hash_embeddings else None
+    model_name = HashEncoder().name if args.hash_embeddings else None
+    with tempfile.TemporaryDirectory() as data_dir:
+        game = GameServer(llm=fake_llm_client(latency=args.llm_latency), embedding_model=model, embedding_model_name=model_name,
+                          data_dir=data_dir, threads=args.threads)
+        server = await game.start("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        latencies = []
+        gate = asyncio.Event()
+        players = [asyncio.create_task(player("127.0.0.1", port, args.turns, latencies, gate))
+                   for _ in range(args.sessions)]
+        await asyncio.sleep(0.5)
+        t0 = time.perf_counter()
+        gate.set()
+        await asyncio.gather(*players)
+        elapsed = time.perf_counter() - t0
+        while game.sessions:  # let the handlers finish closing their sessions
+            await asyncio.sleep(0.05)
+        server.close()
+        await server.wait_closed()
+        game.shutdown()
+
+    ms = np.array(latencies) * 1000
+    print(f"{args.sessions} sessions x {args.turns} turns, fake LLM latency {args.llm_latency * 1000:.0f} ms/call")
+    print(f"turn latency: p50 {np.percentile(ms, 50):.1f} ms, p99 {np.percentile(ms, 99):.1f} ms, "
+          f"max {ms.max():.1f} ms")
+    print(f"throughput: {len(latencies) / elapsed:.1f} turns/s over {elapsed:.2f} s")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=200)
+    ap.add_argument("--turns", type=int, default=5)
+    ap.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake LLM call")
+    ap.add_argument("--threads", type=int, default=64)
+    ap.add_argument("--hash-embeddings", action="store_true",
+                    help="use a hash-based stand-in instead of loading the sentence-transformers model")
+    ap.add_argument("--graph", choices=["neo4j", "memory"], default=settings.GRAPH_BACKEND,
+                    help="graph backend to run the sessions against")
+    asyncio.run(run(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
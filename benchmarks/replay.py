@@ -0,0 +1,306 @@
+"""
+Offline replay of the full turn pipeline: no Groq quota, no Neo4j server.
+
+Player transcripts are replayed through MemoryManager.generate_and_update (and query_memory
+every --query-every turns) with:
+- the deterministic fake chat models from fake_llm.py (configurable latency), answering with
+  stories and canned extraction JSON about a synthetic world that keeps growing
+- HashEncoder instead of the sentence-transformers model
+- the in-process graph (InMemoryGraphStore) instead of Neo4j
+
+Each size runs in a fresh subprocess so peak RSS is per run. Reported: turn latency
+percentiles, per-stage percentiles from the tracer, throughput (including draining the
+background writes and consolidation), peak RSS, and episodic store growth (EPISODIC_* settings
+come from the environment as usual, e.g. EPISODIC_COMPACT_EVERY=0 to turn consolidation off). --out writes the results as JSON;
+--compare prints the change against an earlier --out file. --max-p99 STAGE=MS fails the run
+(exit status 1) when a stage's p99 goes over MS; by default it guards context.entities, whose
+spotter must stay incremental as the graph grows.
+
+    python benchmarks/replay.py --turns 100 1000 10000 --out replay.json
+    python benchmarks/replay.py --transcript session.jsonl --compare replay.json
+
+A transcript is a JSONL file of {"player": "...", "dm": "..."} lines (dm optional: when given,
+it is replayed as the story model's answer) or a plain text file with one action per line.
+It is cycled if it is shorter than the number of turns.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+import common  # noqa: F401  (puts the repo root on sys.path)
+from common import HashEncoder, ROOT
+
+FIRST = ["Al", "Bran", "Cor", "Da", "El", "Fen", "Gar", "Hal", "Is", "Jor", "Ka", "Lor", "Mor", "Nim", "Or",
+         "Per", "Quel", "Ros", "Syl", "Tor", "Ul", "Val", "Wyn", "Yr"]
+SECOND = ["dric", "wen", "ric", "mira", "ath", "en", "ia", "dor", "wyn", "ys", "an", "ella"]
+PLACES = ["Ford", "Tower", "Hollow", "Market", "Crypt", "Mill", "Bridge", "Grove", "Keep", "Harbour"]
+TYPES = ["NPC", "NPC", "Animal", "Item", "Location"]
+RELATIONS = ["LOCATED_IN", "CARRIES", "FIGHTS", "ALLIED_WITH", "GUARDS", "KNOWS"]
+ACTIONS = [
+    "I ask {a} about {b}.",
+    "I travel to {p} with {a}.",
+    "I search {p} for {b}.",
+    "I attack {a} before it reaches {p}.",
+    "I offer {b} to {a} in exchange for safe passage.",
+    "I sneak past {a} and hide near {p}.",
+]
+
+
+class SyntheticWorld:
+    """A deterministic cast of named entities; turn i introduces new names at a steady rate."""
+
+    def __init__(self, seed: int = 0, size: int = 5000):
+        rng = random.Random(seed)
+        types = {}
+        while len(types) < size:
+            kind = rng.choice(TYPES)
+            word = f"{rng.choice(FIRST)}{rng.choice(SECOND)}"
+            last = rng.choice(PLACES) if kind == "Location" else f"{rng.choice(FIRST)}{rng.choice(SECOND)}"
+            types.setdefault(f"{word} {last}", kind)
+        self.entities = list(types.items())
+        self.types = types
+        from entity_spotter import EntitySpotter
+        self.spotter = EntitySpotter()
+        self.spotter.add_many(self.types)
+
+    def action(self, turn: int) -> str:
+        rng = random.Random(turn)
+        # the cast in play widens slowly, so old names keep coming back
+        pool = min(len(self.entities), 20 + turn // 2)
+        names = [self.entities[rng.randrange(pool)][0] for _ in range(2)]
+        places = [n for n, t in self.entities[:pool] if t == "Location"] or ["the Old Mill"]
+        return rng.choice(ACTIONS).format(a=names[0], b=names[1], p=rng.choice(places))
+
+    def story(self, prompt: str) -> str:
+        action = prompt.split("Player action:", 1)[-1]
+        names = self.spotter.find(action) or ["Kael"]
+        rng = random.Random(action)
+        mood = rng.choice(["Rain hammers the roof.", "A cold wind rises.", "Torches gutter.", "Crows circle."])
+        return (f"{mood} Kael faces {', '.join(names)}. " +
+                " ".join(f"{n} watches Kael carefully." for n in names) +
+                f" Something stirs ({rng.randrange(10 ** 6)}). What do you do?")
+
+    def extraction(self, prompt: str) -> str:
+        story = prompt.split("Story:", 1)[-1]
+        names = self.spotter.find(story)
+        entities = [{"name": n, "type": self.types.get(n, "Other"), "attributes": {"status": "alive"}} for n in names]
+        rels = [{"source": a, "relation": RELATIONS[zlib.crc32(f"{a}|{b}".encode("utf-8")) % len(RELATIONS)], "target": b}
+                for a, b in zip(names, names[1:])]
+        return json.dumps({"entities": entities, "relationships": rels})
+
+
+def load_transcript(path: str) -> list:
+    turns = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                rec = json.loads(line)
+                turns.append((rec["player"], rec.get("dm")))
+            else:
+                turns.append((line, None))
+    if not turns:
+        raise SystemExit(f"{path} has no turns")
+    return turns
+
+
+def _percentiles(xs: list) -> dict:
+    from tracing import _percentile
+    xs = sorted(xs)
+    if not xs:
+        return {}
+    return {"p50": _percentile(xs, 50) * 1000, "p95": _percentile(xs, 95) * 1000,
+            "p99": _percentile(xs, 99) * 1000, "mean": sum(xs) / len(xs) * 1000}
+
+
+def run_once(turns: int, args) -> dict:
+    """One replay in this process; returns the result record."""
+    from fake_llm import FakeChatModel
+    from lazy import LazyResource
+    from llm_client import LLMClient
+    from memory_graph import InMemoryGraphStore
+    from memory_manager import MemoryManager
+    from tracing import tracer
+    from vector_store import EpisodicStore
+
+    world = SyntheticWorld(seed=args.seed)
+    transcript = load_transcript(args.transcript) if args.transcript else None
+    recorded = []
+
+    def story(prompt):
+        return recorded.pop() if recorded else world.story(prompt)
+
+    llm = LLMClient(story_llm=FakeChatModel(story, latency=args.llm_latency),
+                    extractor_llm=FakeChatModel(world.extraction, latency=args.llm_latency))
+
+    tracer.enabled = True
+    tracer.reset()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with tempfile.TemporaryDirectory() as tmp:
+        episodic = EpisodicStore(path=os.path.join(tmp, "episodic_store"),
+                                 model=LazyResource.of(HashEncoder(), "embedding model"), model_name=HashEncoder().name)
+        manager = MemoryManager(session_id="replay", llm=llm, graph=InMemoryGraphStore("replay"),
+                                episodic=episodic)
+        checkpoints = sorted({max(1, turns * i // 10) for i in range(1, 11)})
+        growth, turn_times, query_times = [], [], []
+
+        t_start = time.perf_counter()
+        for t in range(turns):
+            if transcript:
+                action, dm = transcript[t % len(transcript)]
+                if dm:
+                    recorded.append(dm)
+            else:
+                action = world.action(t)
+            t0 = time.perf_counter()
+            manager.generate_and_update(action)
+            turn_times.append(time.perf_counter() - t0)
+            if args.query_every and (t + 1) % args.query_every == 0:
+                t0 = time.perf_counter()
+                manager.query_memory(action)
+                query_times.append(time.perf_counter() - t0)
+            if t + 1 in checkpoints:
+                es = episodic.stats()
+                growth.append({"turn": t + 1, "episodes": es["episodes"], "summaries": es["summaries"],
+                               "disk_bytes": es["disk_bytes"], "matrix_bytes": es["matrix_bytes"]})
+        manager.flush()
+        manager.compactor.flush()
+        elapsed = time.perf_counter() - t_start
+        graph = manager.graph.stats()
+        episodic_stats = episodic.stats()
+        manager.close()
+
+    return {
+        "turns": turns,
+        "elapsed_s": elapsed,
+        "turns_per_s": turns / elapsed,
+        "turn_ms": _percentiles(turn_times),
+        "query_memory_ms": _percentiles(query_times),
+        "stages_ms": tracer.stats(),
+        "counters": dict(tracer.counters),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "rss_before_mb": rss_before / 1024,
+        "episodic_growth": growth,
+        "episodic": episodic_stats,
+        "graph": {"nodes": graph.get("nodes"), "edges": graph.get("edges"), "bytes": graph.get("bytes")},
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def print_run(r: dict):
+    tm = r["turn_ms"]
+    last = r["episodic_growth"][-1] if r["episodic_growth"] else {}
+    print(f"\n=== {r['turns']} turns: {r['turns_per_s']:.1f} turns/s, peak RSS {r['peak_rss_mb']:.0f} MB, "
+          f"episodic {last.get('disk_bytes', 0) / 1e6:.1f} MB on disk, graph {r['graph']['nodes']} nodes ===")
+    es = r.get("episodic", {})
+    if es:
+        print(f"episodic: {es['episodes']} episodes, {es['summaries']} summaries of {es['merged_episodes']}, "
+              f"{es['duplicates_dropped']} duplicates dropped, {es['compactions']} consolidations")
+    print(f"turn ms: p50 {tm['p50']:.2f}  p95 {tm['p95']:.2f}  p99 {tm['p99']:.2f}")
+    if r["query_memory_ms"]:
+        q = r["query_memory_ms"]
+        print(f"query_memory ms: p50 {q['p50']:.2f}  p95 {q['p95']:.2f}  p99 {q['p99']:.2f}")
+    width = max(len(s) for s in r["stages_ms"])
+    for name in sorted(r["stages_ms"]):
+        st = r["stages_ms"][name]
+        print(f"  {name:<{width}}  n={st['count']:<6} p50 {st['p50']:8.3f}  p95 {st['p95']:8.3f}  p99 {st['p99']:8.3f}")
+
+
+def compare(baseline: dict, results: dict):
+    """Print the relative change of the headline numbers against an earlier --out file."""
+    base = {r["turns"]: r for r in baseline["runs"]}
+    print(f"\n=== vs {baseline['meta'].get('commit')} ===")
+    metrics = [("turns/s", lambda r: r["turns_per_s"]), ("turn p50 ms", lambda r: r["turn_ms"]["p50"]),
+               ("turn p99 ms", lambda r: r["turn_ms"]["p99"]), ("peak RSS MB", lambda r: r["peak_rss_mb"])]
+    for r in results["runs"]:
+        old = base.get(r["turns"])
+        if old is None:
+            continue
+        cells = []
+        for label, get in metrics:
+            a, b = get(old), get(r)
+            cells.append(f"{label} {a:.2f} -> {b:.2f} ({(b - a) / a * 100:+.1f}%)" if a else f"{label} {b:.2f}")
+        print(f"{r['turns']:>6} turns: " + ", ".join(cells))
+
+
+def check_limits(results: dict, limits: list) -> list:
+    """The "STAGE=MS" p99 limits broken by any run, as messages."""
+    broken = []
+    for limit in limits:
+        stage, _, ms = limit.partition("=")
+        for r in results["runs"]:
+            p99 = r["stages_ms"].get(stage, {}).get("p99")
+            if p99 is not None and p99 > float(ms):
+                broken.append(f"{r['turns']} turns: {stage} p99 {p99:.3f} ms > {float(ms):g} ms")
+    return broken
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, nargs="+", default=[100, 1_000, 10_000])
+    ap.add_argument("--llm-latency", type=float, default=0.0, help="seconds per fake LLM call")
+    ap.add_argument("--query-every", type=int, default=10, help="call query_memory every N turns (0 = never)")
+    ap.add_argument("--transcript", help="JSONL or text transcript to replay instead of synthetic actions")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="write the results as JSON")
+    ap.add_argument("--compare", help="an earlier --out file to compare against")
+    ap.add_argument("--max-p99", nargs="*", default=["context.entities=5"], metavar="STAGE=MS",
+                    help="fail if a stage's p99 exceeds MS milliseconds (pass none to disable)")
+    ap.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.single:
+        # child process: one run, JSON on the last stdout line
+        print(json.dumps(run_once(args.single, args)))
+        return
+
+    passthrough = ["--llm-latency", str(args.llm_latency), "--query-every", str(args.query_every),
+                   "--seed", str(args.seed)] + (["--transcript", args.transcript] if args.transcript else [])
+    runs = []
+    for n in args.turns:
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--single", str(n)] + passthrough,
+                             capture_output=True, text=True, check=True, env=dict(os.environ, TRACE_FILE=""))
+        run = json.loads(out.stdout.strip().splitlines()[-1])
+        print_run(run)
+        runs.append(run)
+
+    results = {
+        "meta": {"commit": _git_commit(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                 "python": platform.python_version(), "machine": platform.machine(),
+                 "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "single")}},
+        "runs": runs,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nwrote {args.out}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), results)
+    broken = check_limits(results, args.max_p99)
+    for msg in broken:
+        print(f"REGRESSION {msg}")
+    if broken:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
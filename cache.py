@@ -0,0 +1,124 @@
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+log = logging.getLogger("cache")
+
+
+def make_key(*parts) -> str:
+    """Content address of the inputs, e.g. make_key(model_name, template_version, text)."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+class ContentCache:
+    """
+    Bounded LRU cache for values that are pure functions of their inputs.
+    - get(key) / put(key, value), with keys built by make_key()
+    - the in-memory tier holds at most `max_bytes` (serialised size) and evicts least recently used first
+    - `directory` enables a disk tier (one file per entry) that survives restarts
+    - stats() returns the hit/miss/eviction counters
+    `dumps`/`loads` convert a value to and from bytes; they are used for sizing and for the disk tier.
+    """
+
+    def __init__(self, name: str, dumps, loads, max_bytes: int, directory: str = ""):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+        self.max_bytes = max_bytes
+        self.directory = os.path.join(directory, name) if directory else ""
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        data = self._read_disk(key)
+        if data is not None:
+            value = self.loads(data)
+            with self._lock:
+                self.disk_hits += 1
+                self._insert(key, value, len(data))
+            return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value):
+        data = self.dumps(value)
+        with self._lock:
+            self._insert(key, value, len(data))
+        self._write_disk(key, data)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+    def _insert(self, key: str, value, size: int):
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted
+            self.evictions += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _read_disk(self, key: str):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            log.warning("%s cache: could not read %s: %s", self.name, key, e)
+            return None
+
+    def _write_disk(self, key: str, data: bytes):
+        if not self.directory:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            log.warning("%s cache: could not write %s: %s", self.name, key, e)
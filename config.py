@@ -9,11 +9,77 @@ class Settings:
     NEO4J_URI = os.getenv("NEO4J_URI", "")
     NEO4J_USER = os.getenv("NEO4J_USER", "")
     NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "")
+    # graph backend: "neo4j", or "memory" for an in-process graph snapshotted to disk
+    GRAPH_BACKEND = os.getenv("GRAPH_BACKEND", "neo4j").lower()
+    # where the in-memory graph of the REPL is snapshotted; empty keeps it in memory only
+    GRAPH_PATH = os.getenv("GRAPH_PATH", "")
+    # serve Neo4j reads from an in-process copy of the session's graph (kept in sync by our own writes)
+    GRAPH_MIRROR = os.getenv("GRAPH_MIRROR", "true").lower() in ("1", "true", "yes")
     # how many episodic items to retrieve
     EPISODIC_K = int(os.getenv("EPISODIC_K", "5"))
     # working memory capacity (recent turns)
     WORKING_CAPACITY = int(os.getenv("WORKING_CAPACITY", "6"))
     SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.7"))
+    # token budget of the world context put in each story prompt
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+    # seconds get_world_context() waits for each retrieval source before leaving it out (0 = no limit)
+    CONTEXT_EPISODIC_TIMEOUT = float(os.getenv("CONTEXT_EPISODIC_TIMEOUT", "15"))
+    CONTEXT_GRAPH_TIMEOUT = float(os.getenv("CONTEXT_GRAPH_TIMEOUT", "15"))
+    # path to a tokenizer.json (HuggingFace `tokenizers` format) for exact counts; empty = local estimate
+    CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "")
+    # episodic search index: "exact", "ivf" (approximate), "binary" (Hamming prefilter on sign bits),
+    # or "auto" to switch to ivf at ANN_THRESHOLD episodes
+    EPISODIC_INDEX = os.getenv("EPISODIC_INDEX", "auto").lower()
+    ANN_THRESHOLD = int(os.getenv("ANN_THRESHOLD", "20000"))
+    # how many ivf buckets to scan per query (higher = better recall, slower)
+    IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+    # how many rows nearest in Hamming distance the binary index scores (higher = better recall, slower)
+    BINARY_CANDIDATES = int(os.getenv("BINARY_CANDIDATES", "1000"))
+    # in-memory episodic embeddings: "float32", "float16" or "int8" (the file on disk stays float32)
+    EPISODIC_PRECISION = os.getenv("EPISODIC_PRECISION", "float32").lower()
+    # below float32, how many of the best rows found on the codes are re-scored at full precision
+    EPISODIC_RERANK = int(os.getenv("EPISODIC_RERANK", "50"))
+    # texts per model.encode() call when episodes are added in bulk (session import, add_events)
+    EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+    # drop a new episode whose cosine similarity to a stored one reaches this (0 disables)
+    EPISODIC_DEDUP_THRESHOLD = float(os.getenv("EPISODIC_DEDUP_THRESHOLD", "0.97"))
+    # consolidate the episodic store after this many new episodes (0 disables consolidation)
+    EPISODIC_COMPACT_EVERY = int(os.getenv("EPISODIC_COMPACT_EVERY", "500"))
+    # "age:similarity,...": episodes at least `age` episodes old are merged with similar ones at >= `similarity`
+    EPISODIC_AGE_TIERS = os.getenv("EPISODIC_AGE_TIERS", "200:0.85,2000:0.75")
+    # at most this many episodes are kept; the oldest are merged pairwise beyond it (0 = no cap)
+    EPISODIC_MAX_EPISODES = int(os.getenv("EPISODIC_MAX_EPISODES", "20000"))
+    # most episodes merged into one summary
+    EPISODIC_MAX_CLUSTER = int(os.getenv("EPISODIC_MAX_CLUSTER", "16"))
+    # how merged episodes are summarised: "extractive" (local, offline) or "llm"
+    EPISODIC_SUMMARIZER = os.getenv("EPISODIC_SUMMARIZER", "extractive").lower()
+    # ask the LLM for entity names when the local spotter finds no known names in a turn
+    ENTITY_LLM_FALLBACK = os.getenv("ENTITY_LLM_FALLBACK", "false").lower() in ("1", "true", "yes")
+    # LLM request scheduler (llm_scheduler.py): requests per second and burst (rate 0 = unlimited;
+    # Groq's free tier allows 30 requests a minute), requests in flight at once, retries on
+    # 429/5xx with backoff from LLM_BACKOFF up to LLM_MAX_BACKOFF seconds, and the deadline of a
+    # call in seconds, queueing and retries included (0 = none)
+    LLM_RATE = float(os.getenv("LLM_RATE", "0.5"))
+    LLM_BURST = int(os.getenv("LLM_BURST", "5"))
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+    LLM_BACKOFF = float(os.getenv("LLM_BACKOFF", "0.5"))
+    LLM_MAX_BACKOFF = float(os.getenv("LLM_MAX_BACKOFF", "20"))
+    LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+    # size cap (bytes) of each in-memory cache: extraction results, embeddings
+    CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    # directory for the on-disk cache tier that survives restarts; empty disables it
+    CACHE_DIR = os.getenv("CACHE_DIR", "")
+    # multi-session server (server.py)
+    SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+    SERVER_PORT = int(os.getenv("SERVER_PORT", "7777"))
+    SERVER_THREADS = int(os.getenv("SERVER_THREADS", "64"))
+    SESSIONS_DIR = os.getenv("SESSIONS_DIR", "sessions")
+    # per-stage latency tracing (/stats); TRACE_FILE also appends every span to a JSONL file
+    TRACE = os.getenv("TRACE", "true").lower() in ("1", "true", "yes")
+    TRACE_FILE = os.getenv("TRACE_FILE", "")
+    # how many recent spans of each stage the percentiles are computed over
+    TRACE_WINDOW = int(os.getenv("TRACE_WINDOW", "1000"))
 
 
 settings = Settings()
@@ -0,0 +1,130 @@
+import re
+from collections import Counter
+import numpy as np
+
+_SENTENCE = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORD = re.compile(r"\w+")
+
+
+def parse_tiers(spec: str) -> list:
+    """
+    "200:0.85,2000:0.75" -> [(200, 0.85), (2000, 0.75)]: episodes at least 200 episodes old are
+    merged at >= 0.85 cosine similarity, those at least 2000 old already at >= 0.75.
+    """
+    tiers = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        age, threshold = part.split(":")
+        tiers.append((int(age), float(threshold)))
+    return sorted(tiers)
+
+
+def extractive_summary(texts: list, max_sentences: int = 3, max_chars: int = 600) -> str:
+    """
+    Offline summary of a group of episodes: the sentences whose words recur most across the
+    group (so what the episodes have in common), skipping near-repeats of a sentence already
+    picked, in their original order.
+    """
+    sentences = []
+    for text in texts:
+        for s in _SENTENCE.split(text):
+            s = s.strip()
+            if s and s not in sentences:
+                sentences.append(s)
+    if not sentences:
+        return ""
+    # document frequency of each word across the episodes
+    df = Counter(w for text in texts for w in set(_WORD.findall(text.lower())))
+    def score(s):
+        words = _WORD.findall(s.lower())
+        return sum(df[w] for w in set(words)) / (len(words) ** 0.5 or 1)
+    best, seen = [], []
+    for i in sorted(range(len(sentences)), key=lambda i: -score(sentences[i])):
+        words = set(_WORD.findall(sentences[i].lower()))
+        if any(len(words & w) > 0.7 * min(len(words), len(w)) for w in seen):
+            continue
+        best.append(i)
+        seen.append(words)
+        if len(best) == max_sentences:
+            break
+    summary = " ".join(sentences[i] for i in sorted(best))
+    if len(summary) > max_chars:
+        summary = summary[:max_chars].rsplit(" ", 1)[0] + " …"
+    return summary
+
+
+def tier_of(ages: np.ndarray, tiers: list) -> np.ndarray:
+    """Index into `tiers` of each age; -1 for episodes younger than the first tier."""
+    if not tiers:
+        return np.full(len(ages), -1)
+    return np.searchsorted(np.array([a for a, _ in tiers]), ages, side="right") - 1
+
+
+def plan_groups(vectors: np.ndarray, tier: np.ndarray, tiers: list, fresh: np.ndarray, max_group: int) -> list:
+    """
+    Groups of row indexes to merge into one episode each.
+    - only rows with a tier (see tier_of) take part
+    - a pair qualifies if its cosine similarity reaches the threshold of the younger row's tier
+    - only pairs with a `fresh` row (one whose tier changed since it was last checked) are
+      scored, so each pass costs |fresh| x |candidates| rather than |candidates|^2
+    - pairs are joined best first, and no group grows past max_group rows
+    """
+    if not tiers or len(vectors) == 0:
+        return []
+    thresholds = np.array([t for _, t in tiers], dtype=np.float32)
+    candidates = np.flatnonzero(tier >= 0)
+    fresh_rows = np.intersect1d(np.flatnonzero(fresh), candidates)
+    if len(candidates) < 2 or len(fresh_rows) == 0:
+        return []
+
+    cand_vecs = vectors[candidates]
+    pairs = []
+    for start in range(0, len(fresh_rows), 512):
+        rows = fresh_rows[start:start + 512]
+        sims = vectors[rows] @ cand_vecs.T
+        # threshold of the younger row (the higher tier index is the older one)
+        need = thresholds[np.minimum(tier[rows][:, None], tier[candidates][None, :])]
+        hit_r, hit_c = np.nonzero(sims >= need)
+        for r, c in zip(rows[hit_r].tolist(), candidates[hit_c].tolist()):
+            if r != c:
+                pairs.append((float(vectors[r] @ vectors[c]), min(r, c), max(r, c)))
+
+    parent = {}
+    size = {}
+    def find(x):
+        while parent.get(x, x) != x:
+            x = parent[x]
+        return x
+    for _, a, b in sorted(set(pairs), reverse=True):
+        ra, rb = find(a), find(b)
+        if ra == rb or size.get(ra, 1) + size.get(rb, 1) > max_group:
+            continue
+        parent[rb] = ra
+        size[ra] = size.get(ra, 1) + size.get(rb, 1)
+
+    groups = {}
+    for x in parent:
+        groups.setdefault(find(x), set()).add(x)
+    for root in list(groups):
+        groups[root].add(root)
+    return sorted(sorted(g) for g in groups.values())
+
+
+def cap_groups(n: int, groups: list, max_rows: int) -> list:
+    """
+    Extra groups (consecutive pairs of the oldest ungrouped rows) so that at most max_rows rows
+    remain once every group is merged.
+    """
+    excess = n - sum(len(g) - 1 for g in groups) - max_rows
+    if max_rows <= 0 or excess <= 0:
+        return groups
+    grouped = {r for g in groups for r in g}
+    free = [r for r in range(n) if r not in grouped]
+    extra = []
+    for i in range(0, len(free) - 1, 2):
+        if len(extra) >= excess:
+            break
+        extra.append([free[i], free[i + 1]])
+    return sorted(groups + extra)
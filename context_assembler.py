@@ -0,0 +1,165 @@
+import re
+import threading
+import logging
+from config import settings
+
+log = logging.getLogger("context_assembler")
+
+# Allocation priorities (lower is kept first). The newest turn comes first because the story has
+# to continue from it; older turns rank below graph facts and recalled events, newest first.
+LAST_TURN = 0
+WORLD_FACTS = 1
+EPISODES = 2
+EARLIER_TURNS = 3
+
+# A line is only cut to fit if at least this many tokens of it would survive.
+MIN_TRUNCATED_TOKENS = 16
+
+# Words, numbers and single punctuation marks; long words count one token per 4 characters,
+# which is close to what BPE tokenizers do with English prose.
+_PIECE = re.compile(r"\w+|[^\w\s]")
+
+
+class TokenCounter:
+    """
+    Local token counting with memoized counts per string.
+    Uses the `tokenizers` tokenizer.json at `path` when given (e.g. the story model's), else a
+    regex estimate. count() and truncate() never call out of the process.
+    """
+
+    MAX_MEMO = 8192
+
+    def __init__(self, path: str = ""):
+        self._tokenizer = None
+        if path:
+            from tokenizers import Tokenizer
+            self._tokenizer = Tokenizer.from_file(path)
+        self._lock = threading.Lock()
+        self._memo = {}
+
+    def _spans(self, text: str) -> list:
+        """End offset of every token in text."""
+        if self._tokenizer is not None:
+            return [end for _, end in self._tokenizer.encode(text, add_special_tokens=False).offsets]
+        ends = []
+        for m in _PIECE.finditer(text):
+            start, end = m.span()
+            ends.extend(range(start + 4, end, 4))
+            ends.append(end)
+        return ends
+
+    def count(self, text: str) -> int:
+        with self._lock:
+            n = self._memo.get(text)
+        if n is None:
+            n = len(self._spans(text))
+            with self._lock:
+                if len(self._memo) >= self.MAX_MEMO:
+                    self._memo.clear()
+                self._memo[text] = n
+        return n
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """The longest prefix of text with at most max_tokens tokens, marked with an ellipsis."""
+        ends = self._spans(text)
+        if len(ends) <= max_tokens:
+            return text
+        return text[:ends[max(0, max_tokens - 1)]].rstrip() + " …"
+
+
+class Section:
+    """
+    One titled block of the prompt.
+    `lines` are in display order; `priority` is one number for the whole section or one per line.
+    """
+    __slots__ = ("name", "header", "lines", "priority")
+
+    def __init__(self, name: str, header: str, lines: list, priority):
+        self.name = name
+        self.header = header
+        self.lines = list(lines)
+        self.priority = priority
+
+    def line_priority(self, i: int):
+        return self.priority[i] if isinstance(self.priority, (list, tuple)) else self.priority
+
+
+class ContextAssembler:
+    """
+    Builds the prompt context from sections under a token budget.
+    - lines are admitted in priority order (then display order) while they fit; a line that
+      doesn't fit is cut if enough of it would remain, otherwise skipped
+    - a section's header is charged when its first line is admitted
+    - sections are rendered in the order given, each with its admitted lines in display order,
+      and the rendered text of each section is kept until its admitted lines change
+    last_report holds the tokens each section used, for /context and tracing.
+    """
+
+    def __init__(self, budget: int = None, counter: TokenCounter = None):
+        self.budget = settings.CONTEXT_TOKEN_BUDGET if budget is None else budget
+        self.counter = TokenCounter(settings.CONTEXT_TOKENIZER) if counter is None else counter
+        self._rendered = {}  # section name -> (header, admitted lines, text)
+        self.last_report = {}
+
+    def assemble(self, sections: list) -> str:
+        count = self.counter.count
+        order = sorted(
+            ((s.line_priority(i), si, i) for si, s in enumerate(sections) for i in range(len(s.lines))),
+        )
+        admitted = [{} for _ in sections]  # section index -> {line index: text}
+        used = 0
+        for _, si, i in order:
+            section = sections[si]
+            line = section.lines[i]
+            # +1 for the newline joining it to what comes before
+            cost = count(line) + 1 + (0 if admitted[si] else count(section.header) + 2)
+            if used + cost <= self.budget:
+                admitted[si][i] = line
+                used += cost
+                continue
+            room = self.budget - used - (cost - count(line))
+            if room >= MIN_TRUNCATED_TOKENS:
+                cut = self.counter.truncate(line, room - 1)
+                admitted[si][i] = cut
+                used += cost - count(line) + count(cut)
+
+        text, report = self._render(sections, admitted)
+        # Joining can merge or split a token at the seams; drop lowest-priority lines until it fits.
+        while report["total"] > self.budget and any(admitted):
+            _, si, i = max((sections[si].line_priority(i), si, i) for si, a in enumerate(admitted) for i in a)
+            del admitted[si][i]
+            text, report = self._render(sections, admitted)
+        self.last_report = report
+        return text
+
+    def _render(self, sections: list, admitted: list):
+        blocks = []
+        report = {}
+        for section, lines in zip(sections, admitted):
+            kept = tuple(lines[i] for i in sorted(lines))
+            entry = {"tokens": 0, "lines": len(kept), "dropped": len(section.lines) - len(kept),
+                     "truncated": sum(1 for i in lines if lines[i] is not section.lines[i]), "cached": False}
+            report[section.name] = entry
+            if not kept:
+                continue
+            cached = self._rendered.get(section.name)
+            if cached is not None and cached[0] == section.header and cached[1] == kept:
+                block = cached[2]
+                entry["cached"] = True
+            else:
+                block = "\n".join((section.header,) + kept)
+                self._rendered[section.name] = (section.header, kept, block)
+            entry["tokens"] = self.counter.count(block)
+            blocks.append(block)
+        text = "\n\n".join(blocks)
+        report["total"] = self.counter.count(text) if text else 0
+        report["budget"] = self.budget
+        return text, report
+
+    @staticmethod
+    def format_report(report: dict) -> str:
+        if not report:
+            return "(no context built yet)"
+        parts = [f"{name} {r['tokens']}" + (f" (-{r['dropped']})" if r["dropped"] else "")
+                 for name, r in report.items() if isinstance(r, dict)]
+        return f"{report['total']}/{report['budget']} tokens: " + ", ".join(parts)
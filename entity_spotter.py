@@ -0,0 +1,145 @@
+import re
+from collections import deque
+
+_WORD = re.compile(r"\w+(?:'\w+)*")
+
+
+def _singular(word: str) -> str:
+    if word.endswith("'s"):
+        word = word[:-2]
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("ches", "shes", "sses", "xes", "zes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def normalize(text: str) -> str:
+    """Casefold, split into words and singularise each one: "the Goblins' caves" -> "the goblin cave"."""
+    return " ".join(_singular(w) for w in _WORD.findall(text.casefold()))
+
+
+class EntitySpotter:
+    """
+    Finds known entity names in free text with Aho-Corasick automata.
+    - add(name) indexes a name incrementally
+    - find(text) returns the known names mentioned in text, in order of first mention
+    - clear() forgets every name
+    Matching works on normalize()d text, so it ignores case and simple plurals, and
+    only whole words match ("Kael" is not found in "Kaelith").
+
+    Names are kept in a few automata of roughly doubling size (newest smallest). New names
+    are built into a fresh automaton on the next find(), which is merged with the smaller
+    ones before it whenever it is at least as large, so each name is rebuilt O(log n)
+    times in all instead of on every turn, and find() scans O(log n) automata.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def clear(self):
+        self._names = set()
+        self._patterns = {}     # normalised pattern -> id
+        self._originals = []    # id -> list of original names
+        self._levels = []       # _Automaton per level, largest first
+        self._pending = []      # (pattern, id) not in any automaton yet
+
+    def add(self, name: str):
+        if not name or name in self._names:
+            return
+        self._names.add(name)
+        norm = normalize(name)
+        if not norm:
+            return
+        pid = self._patterns.get(norm)
+        if pid is not None:
+            self._originals[pid].append(name)
+            return
+        pid = len(self._originals)
+        self._patterns[norm] = pid
+        self._originals.append([name])
+        self._pending.append((norm, pid))
+
+    def add_many(self, names):
+        for name in names:
+            self.add(name)
+
+    def find(self, text: str) -> list:
+        if not self._originals or not text:
+            return []
+        if self._pending:
+            self._flush()
+        # Padding with spaces makes every pattern match on word boundaries only.
+        padded = f" {normalize(text)} "
+        hits = {}  # pid -> (end position of the first match, -pattern length)
+        for automaton in self._levels:
+            automaton.scan(padded, hits)
+        found = []
+        for pid in sorted(hits, key=hits.get):
+            found.extend(self._originals[pid])
+        return found
+
+    def _flush(self):
+        """Build the pending names into an automaton, merging it with the levels no larger than it."""
+        patterns, self._pending = self._pending, []
+        while self._levels and len(self._levels[-1].patterns) <= len(patterns):
+            patterns = self._levels.pop().patterns + patterns
+        self._levels.append(_Automaton(patterns))
+
+
+class _Automaton:
+    """Aho-Corasick automaton over a fixed list of (pattern, id); O(total pattern length) to build."""
+
+    __slots__ = ("patterns", "goto", "fail", "out")
+
+    def __init__(self, patterns: list):
+        self.patterns = patterns
+        goto = [{}]     # trie edges per state
+        ends = [None]   # (id, length) of the pattern ending exactly at each state
+        for norm, pid in patterns:
+            state = 0
+            for ch in f" {norm} ":
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    ends.append(None)
+                state = nxt
+            ends[state] = (pid, len(norm))
+
+        # failure links and outputs (patterns ending at each state or any of its suffixes), breadth-first
+        fail = [0] * len(goto)
+        out = [[] if e is None else [e] for e in ends]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                queue.append(nxt)
+            out[state].extend(out[fail[state]])
+        self.goto, self.fail, self.out = goto, fail, out
+
+    def scan(self, padded: str, hits: dict):
+        """Record in `hits` the earliest (end position, -length) of every pattern found in `padded`."""
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for pos, ch in enumerate(padded):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pid, length in out[state]:
+                key = (pos, -length)
+                if key < hits.get(pid, (len(padded), 0)):
+                    hits[pid] = key
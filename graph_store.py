@@ -1,28 +1,425 @@
 from config import settings
+import json
 import logging
-from neo4j import GraphDatabase
+import os
+from lazy import LazyResource, startup_report
+from entity_spotter import EntitySpotter
+from tracing import tracer
 
 log = logging.getLogger("graph_store")
 
+
+def make_driver() -> LazyResource:
+    """A lazily connected Neo4j driver that several GraphStores can share."""
+    return LazyResource("neo4j driver", Neo4jGraphStore._connect)
+
+
+def make_graph_store(session_id: str = "default", driver: LazyResource = None, path: str = None):
+    """
+    Build the graph backend picked by settings.GRAPH_BACKEND ("neo4j" or "memory").
+    `driver` is only used by Neo4j; `path` is where the in-memory graph snapshots itself.
+    """
+    backend = settings.GRAPH_BACKEND
+    if backend == "memory":
+        from memory_graph import InMemoryGraphStore
+        return InMemoryGraphStore(session_id=session_id, path=path or settings.GRAPH_PATH or None)
+    if backend != "neo4j":
+        raise RuntimeError(f"Unknown GRAPH_BACKEND {backend!r}; use 'neo4j' or 'memory'")
+    return Neo4jGraphStore(session_id=session_id, driver=driver)
+
+
 class GraphStore:
     """
-    Storing entities and relationships in a graph database.
+    Storing entities and relationships in a graph. Backends implement:
     - merge_entity() used for creating new nodes
     - merge_relationship() used for creating new relationships
+    - apply_extraction() used for writing a whole extraction result at once
     - fetch_context() used for fetching context from database (universal)
     - get_context_for_entities() used for fetching context from entities
     - clear_graph() used for clearing graph for debugging purposes
+    - export_graph()/import_graph() used for dumping and loading the whole graph
+    - stats() used for reporting the size of what the backend keeps in memory
+    Shared here:
+    - find_entities() used for spotting known node names in free text, without a query
+    - snapshot()/restore() used for saving the graph to disk and loading it back
+
+    There is one node per name. Every node has the shared "Entity" label, and typed nodes
+    also have their type label. Prompt lines look like "Npc 'Mira' LOCATEDIN Location 'Old Mill'",
+    and an untyped node is shown as "Entity".
     """
 
 
-    def __init__(self):
+    def __init__(self, session_id: str = "default"):
+        self.session_id = session_id
+        # Index of every node name written through this store; hydrated on first use.
+        self.names = EntitySpotter()
+        self._names_loaded = False
+
+
+    def warm_up(self):
+        pass
+
+
+    def close(self):
+        pass
+
+
+    def stats(self) -> dict:
+        return {}
+
+
+    def merge_entity(self, name: str, typ: str, attributes: dict = None):
+        raise NotImplementedError
+
+
+    def merge_relationship(self, src: str, rel: str, tgt: str):
+        raise NotImplementedError
+
+
+    def apply_extraction(self, entities: list, relationships: list):
+        raise NotImplementedError
+
+
+    def fetch_context(self, limit: int = 100):
+        raise NotImplementedError
+
+
+    def get_context_for_entities(self, entity_names: list, limit_per_entity: int = 5,
+                                 depth: int = 1, rel_types: list = None):
+        raise NotImplementedError
+
+
+    def clear_graph(self):
+        raise NotImplementedError
+
+
+    def export_graph(self) -> dict:
+        """{"nodes": [{"id", "labels", "props"}], "edges": [{"src", "type", "tgt"}]}; props include name."""
+        raise NotImplementedError
+
+
+    def import_graph(self, data: dict):
+        """Replace this session's graph with an export_graph() dump."""
+        raise NotImplementedError
+
+
+    def _load_names(self):
+        """Every node name currently in the graph (used once to hydrate the name index)."""
+        raise NotImplementedError
+
+
+    def find_entities(self, text: str) -> list:
+        """Names of known nodes mentioned in text (case- and plural-insensitive), in order of mention."""
+        if not self._names_loaded:
+            self.names.add_many(str(n) for n in self._load_names())
+            self._names_loaded = True
+        return self.names.find(text)
+
+
+    def snapshot(self, path: str):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.export_graph(), f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+    def restore(self, path: str):
+        with open(path, "r", encoding="utf-8") as f:
+            self.import_graph(json.load(f))
+
+
+    def _group_extraction(self, entities: list, relationships: list):
+        """Clean an extraction result into {label: [rows]} and {rel type: [rows]}."""
+        entity_batches = {}
+        for ent in entities or []:
+            name = ent.get("name")
+            if not name:
+                continue
+            label = self._label(ent.get("type") or "Other")
+            props = self._safe_attributes(ent.get("attributes") or {})
+            entity_batches.setdefault(label, []).append({"name": name, "props": props})
+
+        rel_batches = {}
+        for r in relationships or []:
+            src, tgt = r.get("source"), r.get("target")
+            if not (src and tgt):
+                continue
+            rel_type = self._rel_type(r.get("relation") or "RELATED")
+            rel_batches.setdefault(rel_type, []).append({"src": src, "tgt": tgt})
+        return entity_batches, rel_batches
+
+
+    def _index_names(self, entity_batches: dict, rel_batches: dict):
+        for rows in entity_batches.values():
+            self.names.add_many(row["name"] for row in rows)
+        for rows in rel_batches.values():
+            self.names.add_many(name for row in rows for name in (row["src"], row["tgt"]))
+
+
+    @staticmethod
+    def _new_counts() -> dict:
+        return {"entities": 0, "relationships": 0, "nodes_created": 0,
+                "relationships_created": 0, "properties_set": 0}
+
+    @staticmethod
+    def _line(a_type, a_name, rel, b_type, b_name) -> str:
+        return f"{a_type or 'Entity'} '{a_name}' {rel} {b_type or 'Entity'} '{b_name}'"
+
+    @staticmethod
+    def _label(typ: str) -> str:
+        return "".join([c for c in typ.title() if c.isalnum()]) or "Entity"
+
+    @staticmethod
+    def _rel_type(rel: str) -> str:
+        return "".join([c for c in rel.upper() if c.isalnum() or c == "_"]) or "RELATED"
+
+    @staticmethod
+    def _safe_attributes(attributes: dict) -> dict:
+        # Sanitize attribute keys: replace spaces and hyphens with underscores.
+        # `session` is the partition key, so an extracted attribute may not overwrite it.
+        safe = {key.replace(" ", "_").replace("-", "_"): value for key, value in attributes.items()}
+        safe.pop("session", None)
+        return safe
+
+
+# Schema every Neo4j-backed store relies on. The composite constraint both keeps one node per
+# (name, session) and provides the index behind every name lookup and MERGE; the session index
+# serves the whole-session scans (fetch_context, clear_graph, export).
+SCHEMA = [
+    "CREATE CONSTRAINT entity_name_session IF NOT EXISTS "
+    "FOR (n:Entity) REQUIRE (n.name, n.session) IS UNIQUE",
+    "CREATE INDEX entity_session IF NOT EXISTS FOR (n:Entity) ON (n.session)",
+]
+
+# Cypher for a node's type: its first label other than the shared :Entity one (null if untyped).
+_TYPE = "head([l IN labels({0}) WHERE l <> 'Entity'])"
+
+
+def ensure_schema(driver) -> bool:
+    """Create the constraint and indexes if they are missing. Safe to run on every start."""
+    try:
+        with driver.session() as s:
+            for statement in SCHEMA:
+                s.run(statement).consume()
+        return True
+    except Exception as e:
+        # Usually duplicate or unlabeled nodes left by an older version.
+        log.warning("GraphStore: could not create the graph schema (%s); "
+                    "run `python graph_store.py --migrate` once to upgrade an existing graph", e)
+        return False
+
+
+def migrate_to_entity_label(driver, default_session: str = "default") -> dict:
+    """
+    One-time upgrade of a graph written before the :Entity label and its uniqueness constraint:
+    - named nodes without a session (written before sessions existed) go to `default_session`
+    - nodes sharing a (name, session) are merged into one: labels, properties (the oldest node
+      wins on conflicts) and relationships are moved onto the oldest node, the rest deleted
+    - every named node gets the :Entity label
+    and then the schema is created. Running it again finds nothing to do.
+    """
+    counts = {"sessions_set": 0, "duplicates_merged": 0, "labels_added": 0}
+    with driver.session() as s:
+        summary = s.run(
+            "MATCH (n) WHERE n.name IS NOT NULL AND n.session IS NULL "
+            "CALL { WITH n SET n.session = $session } IN TRANSACTIONS OF 10000 ROWS",
+            {"session": default_session}).consume()
+        counts["sessions_set"] = summary.counters.properties_set
+
+        groups = s.run(
+            "MATCH (n) WHERE n.name IS NOT NULL "
+            "WITH n.session AS session, n.name AS name, n ORDER BY id(n) "
+            "WITH session, name, collect(elementId(n)) AS ids WHERE size(ids) > 1 "
+            "RETURN ids").value()
+        for ids in groups:
+            s.execute_write(_merge_duplicates, ids[0], ids[1:])
+            counts["duplicates_merged"] += len(ids) - 1
 
-        self.driver = GraphDatabase.driver(settings.NEO4J_URI, auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD))
+        summary = s.run(
+            "MATCH (n) WHERE n.name IS NOT NULL AND NOT n:Entity "
+            "CALL { WITH n SET n:Entity } IN TRANSACTIONS OF 10000 ROWS").consume()
+        counts["labels_added"] = summary.counters.labels_added
+    ensure_schema(driver)
+    log.info("GraphStore: migration done: %s", counts)
+    return counts
+
+
+def _merge_duplicates(tx, keep: str, duplicates: list):
+    """Fold the duplicate nodes into `keep` (all element ids) inside one transaction."""
+    for dup in duplicates:
+        rec = tx.run("MATCH (k), (d) WHERE elementId(k) = $keep AND elementId(d) = $dup "
+                     "RETURN labels(d) AS labels, properties(d) AS dprops, properties(k) AS kprops",
+                     {"keep": keep, "dup": dup}).single()
+        props = dict(rec["dprops"])
+        props.update(rec["kprops"])
+        labels = "".join(f":{GraphStore._label(l)}" for l in rec["labels"])
+        tx.run("MATCH (k) WHERE elementId(k) = $keep SET k += $props" + (f", k{labels}" if labels else ""),
+               {"keep": keep, "props": props}).consume()
+        rels = tx.run("MATCH (d)-[r]-(o) WHERE elementId(d) = $dup "
+                      "RETURN type(r) AS type, startNode(r) = d AS outgoing, elementId(o) AS other, "
+                      "elementId(o) = $dup AS loop", {"dup": dup})
+        for r in list(rels):
+            other = keep if r["loop"] else r["other"]
+            rel_type = GraphStore._rel_type(r["type"])
+            src, tgt = (keep, other) if r["outgoing"] else (other, keep)
+            tx.run(f"MATCH (a), (b) WHERE elementId(a) = $src AND elementId(b) = $tgt MERGE (a)-[:{rel_type}]->(b)",
+                   {"src": src, "tgt": tgt}).consume()
+        tx.run("MATCH (d) WHERE elementId(d) = $dup DETACH DELETE d", {"dup": dup}).consume()
+
+
+class _CountingSession:
+    """Wraps a Neo4j session (or transaction) to count every query sent as a round trip."""
+
+    def __init__(self, inner):
+        self._inner = inner
+
+    def __enter__(self):
+        self._inner.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._inner.__exit__(*exc)
+
+    def run(self, *args, **kwargs):
+        tracer.count("neo4j.round_trips")
+        return self._inner.run(*args, **kwargs)
+
+    def execute_write(self, fn, *args, **kwargs):
+        # the commit is a round trip of its own
+        tracer.count("neo4j.round_trips")
+        return self._inner.execute_write(lambda tx, *a, **kw: fn(_CountingSession(tx), *a, **kw), *args, **kwargs)
+
+
+class Neo4jGraphStore(GraphStore):
+    """
+    GraphStore backed by Neo4j.
+    The driver is created lazily; warm_up() imports neo4j and connects on a background thread.
+
+    Every node carries a `session` property and every query is scoped to this store's
+    session_id, so several games can share one database (and one driver, passed in as a
+    LazyResource) without seeing or clearing each other's worlds.
+
+    Every node also carries the shared :Entity label next to its type label, and all merges
+    and lookups go through :Entity(name, session), so they hit the unique index created by
+    ensure_schema() on connect instead of scanning all nodes.
+
+    With settings.GRAPH_MIRROR, the session's graph is also kept in an InMemoryGraphStore:
+    it is loaded with one query on warm-up, every write is applied to it after Neo4j has
+    accepted it, and fetch_context / get_context_for_entities / find_entities read from it
+    (memoized until the next write). This assumes this store is the only writer of its session;
+    resync() reloads the mirror from Neo4j. If loading fails, reads go to Neo4j and the next
+    read loads it again; a write that finds the mirror not loaded yet drops it, so it is
+    reloaded afterwards instead of missing that write.
+    """
+
+
+    def __init__(self, session_id: str = "default", driver: LazyResource = None):
+
+        super().__init__(session_id)
+        # A shared driver belongs to whoever created it; close() only closes our own.
+        self._owns_driver = driver is None
+        self._driver = driver or LazyResource("neo4j driver", self._connect)
+        self._mirror = LazyResource("graph mirror", self._hydrate) if settings.GRAPH_MIRROR else None
+
+
+    @staticmethod
+    def _connect():
+        with startup_report.measure("imports: neo4j"):
+            from neo4j import GraphDatabase
+        with startup_report.measure("driver connect"):
+            driver = GraphDatabase.driver(settings.NEO4J_URI, auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD))
+            try:
+                driver.verify_connectivity()
+            except Exception as e:
+                # Surface the error on the first real query instead, like before.
+                log.warning("GraphStore: could not verify connectivity to %s: %s", settings.NEO4J_URI, e)
+                return driver
+        with startup_report.measure("graph schema"):
+            ensure_schema(driver)
         log.info("GraphStore: using Neo4j at %s", settings.NEO4J_URI)
+        return driver
+
+
+    @property
+    def driver(self):
+        return self._driver.get()
+
+
+    @property
+    def mirror(self):
+        """The loaded mirror, or None when it is off or failed to load (then read from Neo4j)."""
+        resource = self._mirror
+        if resource is None:
+            return None
+        try:
+            return resource.get()
+        except Exception:
+            # Don't keep the failure for good: the next read tries again.
+            if self._mirror is resource:
+                self._mirror = LazyResource("graph mirror", self._hydrate)
+            return None
+
+
+    def _update_mirror(self, write):
+        """Apply `write(mirror)` to a loaded mirror; drop one still loading or failed so it is reloaded."""
+        resource = self._mirror
+        if resource is None:
+            return
+        if resource.ready and not resource.failed:
+            write(resource.get())
+        else:
+            self._mirror = LazyResource("graph mirror", self._hydrate)
+
+
+    def _session(self):
+        session = self.driver.session()
+        return _CountingSession(session) if tracer.enabled else session
+
+
+    def warm_up(self):
+        self._driver.start()
+        if self._mirror is not None:
+            self._mirror.start()
 
 
     def close(self):
-        self.driver.close()
+        if self._owns_driver and self._driver.ready:
+            self.driver.close()
+
+
+    def _hydrate(self):
+        """Load this session's whole graph from Neo4j in one query."""
+        from memory_graph import InMemoryGraphStore
+        q = """
+            MATCH (n:Entity {session: $session_id})
+            OPTIONAL MATCH (n)-[r]->(b)
+            RETURN elementId(n) AS id, labels(n) AS labels, properties(n) AS props,
+                   collect(CASE WHEN r IS NULL THEN null ELSE [type(r), elementId(b)] END) AS out
+            """
+        nodes, edges = [], []
+        with tracer.span("graph.hydrate"), self._session() as s:
+            for rec in s.run(q, {"session_id": self.session_id}):
+                nodes.append({"id": rec["id"], "labels": rec["labels"], "props": rec["props"]})
+                edges.extend({"src": rec["id"], "type": rel, "tgt": tgt} for rel, tgt in rec["out"])
+        mirror = InMemoryGraphStore(session_id=self.session_id)
+        mirror.import_graph({"nodes": nodes, "edges": edges})
+        log.info("GraphStore: mirrored %d nodes / %d relationships of session %s",
+                 len(nodes), len(edges), self.session_id)
+        return mirror
+
+
+    def resync(self):
+        """Reload the mirror from Neo4j, e.g. after something else wrote to this session."""
+        if self._mirror is not None:
+            self._mirror = LazyResource("graph mirror", self._hydrate)
+            self.mirror  # load it now rather than on the next read
+
+
+    def stats(self) -> dict:
+        if self._mirror is None or not self._mirror.ready:
+            return {}
+        mirror = self.mirror
+        return mirror.stats() if mirror is not None else {}
 
 
 
@@ -30,92 +427,252 @@ class GraphStore:
         attributes = attributes or {}
 
 
-        # Sanitize attribute keys: replace spaces and hyphens with underscores
-        safe_attributes = {key.replace(" ", "_").replace("-", "_"): value for key, value in attributes.items()}
+        safe_attributes = self._safe_attributes(attributes)
 
-        label = "".join([c for c in typ.title() if c.isalnum()]) or "Entity"
+        label = self._label(typ)
 
         props = ", ".join([f"n.`{k}` = ${k}" for k in safe_attributes.keys()])
         params = dict(safe_attributes)
 
         params["name"] = name
-        query = f"MERGE (n:{label} {{name:$name}})"
+        params["session_id"] = self.session_id
+        query = f"MERGE (n:Entity {{name:$name, session:$session_id}}) SET n:{label}"
         if props:
-            query += " SET " + props
-        with self.driver.session() as s:
+            query += ", " + props
+        with self._session() as s:
             s.run(query, params)
+        self.names.add(name)
+        self._update_mirror(lambda mirror: mirror.merge_entity(name, typ, attributes))
 
 
     def merge_relationship(self, src: str, rel: str, tgt: str):
 
-        rel_label = "".join([c for c in rel.upper() if c.isalnum() or c == "_"]) or "RELATED"
+        rel_label = self._rel_type(rel)
         query = (
-                "MERGE (a {name:$src}) MERGE (b {name:$tgt}) "
+                "MERGE (a:Entity {name:$src, session:$session_id}) MERGE (b:Entity {name:$tgt, session:$session_id}) "
                 f"MERGE (a)-[r:{rel_label}]->(b)"
             )
-        with self.driver.session() as s:
-            s.run(query, {"src": src, "tgt": tgt})
+        with self._session() as s:
+            s.run(query, {"src": src, "tgt": tgt, "session_id": self.session_id})
+        self.names.add_many((src, tgt))
+        self._update_mirror(lambda mirror: mirror.merge_relationship(src, rel, tgt))
+
+
+    def apply_extraction(self, entities: list, relationships: list):
+        """
+        Bulk version of merge_entity/merge_relationship for one extraction result.
+        Entities are grouped by label and relationships by type, and every group is
+        sent as a single UNWIND query inside one write transaction.
+        Returns the write counts.
+        """
+        entity_batches, rel_batches = self._group_extraction(entities, relationships)
+        counts = self._new_counts()
+        if not entity_batches and not rel_batches:
+            return counts
+
+        def _write(tx):
+            # Entities first so relationship MERGEs match the freshly typed nodes.
+            for label, rows in entity_batches.items():
+                q = (
+                    "UNWIND $rows AS row "
+                    "MERGE (n:Entity {name: row.name, session: $session_id}) "
+                    f"SET n:{label}, n += row.props"
+                )
+                self._add_counters(counts, tx.run(q, {"rows": rows, "session_id": self.session_id}).consume())
+                counts["entities"] += len(rows)
+            for rel_type, rows in rel_batches.items():
+                q = (
+                    "UNWIND $rows AS row "
+                    "MERGE (a:Entity {name: row.src, session: $session_id}) "
+                    "MERGE (b:Entity {name: row.tgt, session: $session_id}) "
+                    f"MERGE (a)-[r:{rel_type}]->(b)"
+                )
+                self._add_counters(counts, tx.run(q, {"rows": rows, "session_id": self.session_id}).consume())
+                counts["relationships"] += len(rows)
+
+        with tracer.span("graph.apply_extraction", entities=len(entities or []),
+                         relationships=len(relationships or [])), self._session() as s:
+            s.execute_write(_write)
+        self._index_names(entity_batches, rel_batches)
+        self._update_mirror(lambda mirror: mirror.apply_extraction(entities, relationships))
+        return counts
+
+
+    def _load_names(self):
+        mirror = self.mirror
+        if mirror is not None:
+            return mirror._load_names()
+        with self._session() as s:
+            res = s.run("MATCH (n:Entity {session: $session_id}) RETURN n.name AS name",
+                        {"session_id": self.session_id})
+            return [rec["name"] for rec in res]
+
+
+    @staticmethod
+    def _add_counters(counts: dict, summary):
+        c = summary.counters
+        counts["nodes_created"] += c.nodes_created
+        counts["relationships_created"] += c.relationships_created
+        counts["properties_set"] += c.properties_set
 
 
     def fetch_context(self, limit: int = 100):
         """
         Return a textual summary of relationships for use in prompts.
         """
+        mirror = self.mirror
+        if mirror is not None:
+            return mirror.fetch_context(limit)
 
-        q = """
-            MATCH (a)-[r]->(b)
-            RETURN labels(a)[0] AS a_type, a.name AS a_name, type(r) AS rel, labels(b)[0] AS b_type, b.name AS b_name
+        q = f"""
+            MATCH (a:Entity {{session: $session_id}})-[r]->(b)
+            RETURN {_TYPE.format("a")} AS a_type, a.name AS a_name, type(r) AS rel,
+                   {_TYPE.format("b")} AS b_type, b.name AS b_name
             LIMIT $limit
             """
-        with self.driver.session() as s:
-            res = s.run(q, {"limit": limit})
+        with tracer.span("graph.fetch_context", backend="neo4j"), self._session() as s:
+            res = s.run(q, {"limit": limit, "session_id": self.session_id})
             rows = [rec for rec in res]
         lines = []
         for r in rows:
-            a_type = r["a_type"] or "Entity"
-            a_name = r["a_name"]
-            rel = r["rel"]
-            b_type = r["b_type"] or "Entity"
-            b_name = r["b_name"]
-            lines.append(f"{a_type} '{a_name}' {rel} {b_type} '{b_name}'")
+            lines.append(self._line(r["a_type"], r["a_name"], r["rel"], r["b_type"], r["b_name"]))
         return "\n".join(lines)
 
 
 
-    def get_context_for_entities(self, entity_names: list, limit_per_entity: int = 5):
+    def get_context_for_entities(self, entity_names: list, limit_per_entity: int = 5,
+                                 depth: int = 1, rel_types: list = None):
         """
-        For a given list of entity names, find all their direct relationships.
-        Returns a text summary.
+        For a given list of entity names, find their relationships up to `depth` hops away,
+        optionally restricted to `rel_types`. Returns a text summary.
+        All names are looked up in a single query; the per-entity limit is applied
+        inside Cypher by collecting and slicing the rows of each name.
         """
         if not entity_names:
             return ""
+        mirror = self.mirror
+        if mirror is not None:
+            return mirror.get_context_for_entities(entity_names, limit_per_entity, depth, rel_types)
 
-        q = """
-        UNWIND $names AS entity_name
-        MATCH (a {name: entity_name})-[r]-(b)
-        RETURN labels(a)[0] AS a_type, a.name AS a_name, type(r) AS rel, labels(b)[0] AS b_type, b.name AS b_name
-        LIMIT $limit
+        depth = max(1, int(depth))
+        if rel_types:
+            rel_types = [self._rel_type(t) for t in rel_types]
+        # For multi-hop paths only the last hop is reported; the earlier hops are
+        # already reported by the shorter paths. With depth 1 this is (a)-[r]-(b).
+        # Each name keeps its `limit` shortest paths (as the in-memory store does, nearest
+        # hop first), cut inside the subquery so no more rows than that leave it.
+        q = f"""
+        UNWIND range(0, size($names) - 1) AS idx
+        WITH idx, $names[idx] AS entity_name
+        CALL {{
+            WITH entity_name
+            MATCH p = (a:Entity {{name: entity_name, session: $session_id}})-[*1..{depth}]-(b)
+            WHERE $rel_types IS NULL OR all(x IN relationships(p) WHERE type(x) IN $rel_types)
+            WITH p ORDER BY length(p)
+            LIMIT $limit
+            RETURN nodes(p)[-2] AS s, last(relationships(p)) AS r, last(nodes(p)) AS b
+        }}
+        WITH idx, collect([{_TYPE.format("s")}, s.name, type(r), {_TYPE.format("b")}, b.name]) AS rows
+        RETURN idx, rows
+        ORDER BY idx
         """
-        with self.driver.session() as s:
-            # We need to run this per entity to respect the limit for each one
-            lines = []
-            for name in entity_names:
-                params = {"names": [name], "limit": limit_per_entity}
-                res = s.run(q, params)
-                for r in res:
-                    a_type = r["a_type"] or "Entity"
-                    a_name = r["a_name"]
-                    rel = r["rel"]
-                    b_type = r["b_type"] or "Entity"
-                    b_name = r["b_name"]
-                    lines.append(f"{a_type} '{a_name}' {rel} {b_type} '{b_name}'")
+        params = {"names": list(entity_names), "limit": limit_per_entity, "rel_types": rel_types or None,
+                  "session_id": self.session_id}
+        with tracer.span("graph.context", backend="neo4j"), self._session() as s:
+            records = list(s.run(q, params))
+
+        lines = []
+        for rec in records:
+            for row in rec["rows"]:
+                lines.append(self._line(*row))
 
         # Remove duplicates while preserving order
         return "\n".join(list(dict.fromkeys(lines)))
 
     def clear_graph(self):
-        """Deletes all nodes and relationships from the graph. For debugging."""
-        query = "MATCH (n) DETACH DELETE n"
-        with self.driver.session() as s:
-            s.run(query)
-        log.info("Graph database has been cleared.")
\ No newline at end of file
+        """Deletes all nodes and relationships of this session's graph. For debugging."""
+        query = "MATCH (n:Entity {session: $session_id}) DETACH DELETE n"
+        with self._session() as s:
+            s.run(query, {"session_id": self.session_id})
+        if self._mirror is not None:
+            # The session is empty now; no need to load anything from Neo4j.
+            from memory_graph import InMemoryGraphStore
+            self._mirror = LazyResource.of(InMemoryGraphStore(session_id=self.session_id), "graph mirror")
+        self.names.clear()
+        self._names_loaded = True
+        log.info("Graph of session %s has been cleared.", self.session_id)
+
+
+    def export_graph(self) -> dict:
+        params = {"session_id": self.session_id}
+        with self._session() as s:
+            nodes = [
+                {"id": rec["id"], "labels": rec["labels"], "props": rec["props"]}
+                for rec in s.run("MATCH (n:Entity {session: $session_id}) "
+                                 "RETURN elementId(n) AS id, labels(n) AS labels, properties(n) AS props", params)
+            ]
+            edges = [
+                {"src": rec["src"], "type": rec["type"], "tgt": rec["tgt"]}
+                for rec in s.run("MATCH (a:Entity {session: $session_id})-[r]->(b) "
+                                 "RETURN elementId(a) AS src, type(r) AS type, elementId(b) AS tgt", params)
+            ]
+        for n in nodes:
+            n["props"].pop("session", None)
+        return {"nodes": nodes, "edges": edges}
+
+
+    def import_graph(self, data: dict, batch_size: int = 5000):
+        """
+        Clear this session and load an export_graph() dump with UNWIND batches:
+        one MERGE query per distinct label set, then one per relationship type.
+        """
+        self.clear_graph()
+        by_labels = {}
+        for n in data.get("nodes", []):
+            props = dict(n.get("props") or {})
+            if props.get("name") is None:
+                continue
+            props.pop("session", None)
+            labels = tuple(l for l in dict.fromkeys(self._label(l) for l in n.get("labels") or []) if l != "Entity")
+            by_labels.setdefault(labels, []).append({"id": n["id"], "props": props})
+        by_type = {}
+        for e in data.get("edges", []):
+            by_type.setdefault(self._rel_type(e["type"]), []).append({"src": e["src"], "tgt": e["tgt"]})
+
+        element_ids = {}
+        with self._session() as s:
+            for labels, rows in by_labels.items():
+                label_str = "".join(f", n:{l}" for l in labels)
+                q = ("UNWIND $rows AS row MERGE (n:Entity {name: row.props.name, session: $session_id}) "
+                     f"SET n += row.props{label_str} RETURN row.id AS id, elementId(n) AS eid")
+                for start in range(0, len(rows), batch_size):
+                    res = s.run(q, {"rows": rows[start:start + batch_size], "session_id": self.session_id})
+                    element_ids.update((rec["id"], rec["eid"]) for rec in res)
+            for rel_type, rows in by_type.items():
+                rows = [{"src": element_ids[r["src"]], "tgt": element_ids[r["tgt"]]} for r in rows
+                        if r["src"] in element_ids and r["tgt"] in element_ids]
+                q = ("UNWIND $rows AS row MATCH (a) WHERE elementId(a) = row.src "
+                     f"MATCH (b) WHERE elementId(b) = row.tgt MERGE (a)-[:{rel_type}]->(b)")
+                for start in range(0, len(rows), batch_size):
+                    s.run(q, {"rows": rows[start:start + batch_size]}).consume()
+        self.resync()
+        self.names.add_many(str(n["props"]["name"]) for n in data.get("nodes", []) if n.get("props", {}).get("name"))
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Graph schema maintenance for the Neo4j backend.")
+    ap.add_argument("--migrate", action="store_true",
+                    help="upgrade a graph written by an older version (adds :Entity, merges duplicates)")
+    ap.add_argument("--default-session", default="default",
+                    help="session id given to nodes written before sessions existed")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    driver = make_driver().get()
+    try:
+        if args.migrate:
+            print(migrate_to_entity_label(driver, args.default_session))
+        else:
+            print("schema ok" if ensure_schema(driver) else "schema not created; try --migrate")
+    finally:
+        driver.close()
@@ -0,0 +1,110 @@
+import time
+import threading
+import logging
+from contextlib import contextmanager
+
+log = logging.getLogger("lazy")
+
+
+class StartupReport:
+    """
+    Wall-clock time spent in each startup stage, e.g. "imports: neo4j",
+    "model load" or "driver connect". Stages may be recorded from warm-up threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+
+    @contextmanager
+    def measure(self, stage: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - t0)
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def format(self) -> str:
+        with self._lock:
+            stages = dict(self.stages)
+        if not stages:
+            return "(nothing loaded yet)"
+        width = max(len(s) for s in stages)
+        lines = [f"{s:<{width}}  {secs * 1000:8.1f} ms" for s, secs in stages.items()]
+        groups = {}
+        for s, secs in stages.items():
+            group = s.split(":")[0]
+            groups[group] = groups.get(group, 0.0) + secs
+        if len(groups) < len(stages):
+            lines.append("")
+            lines += [f"{g:<{width}}  {secs * 1000:8.1f} ms total" for g, secs in groups.items()]
+        return "\n".join(lines)
+
+
+startup_report = StartupReport()
+
+
+class LazyResource:
+    """
+    A value that is built on first use, or ahead of time on a background warm-up thread.
+    - start() kicks off the warm-up thread (no-op if it is already running or done)
+    - get() returns the value, blocking only while the warm-up has not finished
+    A loader error is re-raised on every get(); `failed` tells it apart without raising.
+    """
+
+    def __init__(self, name: str, loader):
+        self.name = name
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = None
+        self._value = None
+        self._error = None
+
+    @classmethod
+    def of(cls, value, name: str = "value"):
+        """An already-loaded resource, for callers that pass in a ready object."""
+        res = cls(name, None)
+        res._value = value
+        res._done.set()
+        return res
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def failed(self) -> bool:
+        return self._done.is_set() and self._error is not None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None and not self._done.is_set():
+                self._thread = threading.Thread(target=self._load, name=f"warmup-{self.name}", daemon=True)
+                self._thread.start()
+        return self
+
+    def get(self):
+        if not self._done.is_set():
+            self.start()
+            t0 = time.perf_counter()
+            self._done.wait()
+            waited = time.perf_counter() - t0
+            if waited > 0.01:
+                log.info("Waited %.2fs for %s to finish warming up", waited, self.name)
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def _load(self):
+        try:
+            self._value = self._loader()
+        except BaseException as e:
+            log.warning("Warm-up of %s failed: %s", self.name, e)
+            self._error = e
+        finally:
+            self._done.set()
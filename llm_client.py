@@ -1,39 +1,150 @@
-import json, re
+import json, re, copy
 from typing import Dict, Any
 from config import settings
-from langchain_groq.chat_models import ChatGroq
+from lazy import LazyResource, startup_report
+from cache import ContentCache, make_key
+from llm_scheduler import LLMScheduler
+from tracing import tracer
+
+MODEL_NAME = "llama-3.1-8b-instant"
+# bump whenever the extraction prompt changes, so cached results of the old prompt are not reused
+EXTRACT_PROMPT_VERSION = "1"
 
 class LLMClient:
     """
     Used for interacting with LLM client (Groq)
     - generate_story() Used to generate the story.
+    - stream_story() Same as generate_story(), but yields the text as it is generated.
     - extract_entities() Used to extract properties of entities and their relationships.
+      Results are cached by (model, prompt version, text); see extract_cache.stats().
+    - summarize_events() Used to write one summary of several episodes (episodic consolidation).
     - _extract_first_json()  Used to extract only the JSON part of the string.
+    The langchain models are built lazily; warm_up() builds them on a background thread.
+    Every model call goes through `scheduler` (see llm_scheduler.py): rate limiting, bounded
+    concurrency, retries and deadlines, and identical extractions in flight are sent once.
+    The Groq models get LLMScheduler.from_settings(); pre-built models (fakes) get an
+    unthrottled one unless a scheduler is passed in.
+    Pre-built models key the extraction cache by `model_name` (default: the extractor's own
+    `model_name` attribute), so they never read or write the Groq model's entries.
     """
 
 
-    def __init__(self):
+    def __init__(self, story_llm=None, extractor_llm=None, scheduler: LLMScheduler = None, model_name: str = None):
         provider = settings.LLM_PROVIDER.lower()
 
-        if ChatGroq is None:
-            raise RuntimeError("langchain-groq is not installed. Please install it: pip install langchain-groq")
-        if not settings.GROQ_API_KEY:
-            raise RuntimeError("GROQ_API_KEY not set in env for Groq provider")
-        # Create two Groq LLMs: one for story, one for extraction
-        self.story_llm = ChatGroq(
-            model="llama-3.1-8b-instant",
+        if story_llm is not None and extractor_llm is not None:
+            # Pre-built chat models (e.g. a fake model for load tests)
+            self._llms = LazyResource.of((story_llm, extractor_llm), "llm clients")
+            self.scheduler = scheduler or LLMScheduler(max_concurrency=settings.LLM_MAX_CONCURRENCY)
+            # the name keys extract_cache, so other models must not borrow the Groq model's entries
+            self.model_name = model_name or getattr(extractor_llm, "model_name", None)
+            if not self.model_name:
+                raise ValueError("pass model_name along with pre-built chat models")
+        else:
+            if not settings.GROQ_API_KEY:
+                raise RuntimeError("GROQ_API_KEY not set in env for Groq provider")
+            self._llms = LazyResource("llm clients", self._build_llms)
+            self.scheduler = scheduler or LLMScheduler.from_settings()
+            self.model_name = MODEL_NAME
+        self.extract_cache = ContentCache(
+            "extract",
+            dumps=lambda v: json.dumps(v).encode("utf-8"),
+            loads=lambda b: json.loads(b.decode("utf-8")),
+            max_bytes=settings.CACHE_MAX_BYTES,
+            directory=settings.CACHE_DIR,
+        )
+
+
+    @staticmethod
+    def _build_llms():
+        with startup_report.measure("imports: langchain_groq"):
+            try:
+                from langchain_groq.chat_models import ChatGroq
+            except ImportError:
+                raise RuntimeError("langchain-groq is not installed. Please install it: pip install langchain-groq")
+        # Create two Groq LLMs: one for story, one for extraction.
+        # Retries are left to the LLMScheduler, which sees every caller's requests; it also
+        # passes each request the time left of its deadline, so this is only the fallback.
+        request_timeout = settings.LLM_TIMEOUT or None
+        story_llm = ChatGroq(
+            model=MODEL_NAME,
             groq_api_key=settings.GROQ_API_KEY,
-            temperature=0.9
+            temperature=0.9,
+            max_retries=0,
+            timeout=request_timeout,
         )
-        self.extractor_llm = ChatGroq(
-            model="llama-3.1-8b-instant",
+        extractor_llm = ChatGroq(
+            model=MODEL_NAME,
             groq_api_key=settings.GROQ_API_KEY,
-            temperature=0.0
+            temperature=0.0,
+            max_retries=0,
+            timeout=request_timeout,
         )
+        return story_llm, extractor_llm
+
+
+    @property
+    def story_llm(self):
+        return self._llms.get()[0]
+
+
+    @property
+    def extractor_llm(self):
+        return self._llms.get()[1]
+
+
+    def warm_up(self):
+        self._llms.start()
 
 
     def generate_story(self, world_context: str, player_input: str) -> str:
-        prompt = (
+        prompt = self._story_prompt(world_context, player_input)
+        # Use ChatGroq as chat model
+        with tracer.span("llm.story", prompt_chars=len(prompt)) as span:
+            msg = self.scheduler.call(lambda timeout: self._ask(self.story_llm, prompt, timeout), name="story")
+            self._record_usage(span, getattr(msg, "usage_metadata", None))
+        return msg.content.strip()
+
+
+    def stream_story(self, world_context: str, player_input: str):
+        prompt = self._story_prompt(world_context, player_input)
+        started = False
+        with tracer.span("llm.story", prompt_chars=len(prompt), stream=True) as span:
+            for chunk in self.scheduler.stream(lambda timeout: self._ask(self.story_llm, prompt, timeout, stream=True),
+                                               name="story"):
+                # the usage normally rides on the last chunk
+                self._record_usage(span, getattr(chunk, "usage_metadata", None))
+                text = chunk.content
+                if not started:
+                    # match generate_story(), which strips leading whitespace
+                    text = text.lstrip()
+                    started = bool(text)
+                if text:
+                    yield text
+
+
+    @staticmethod
+    def _ask(model, prompt: str, timeout: float = None, stream: bool = False):
+        """Send `prompt` as one request, bounded by `timeout` seconds (None keeps the model's own)."""
+        kwargs = {} if timeout is None else {"timeout": timeout}
+        messages = [{"role":"user","content": prompt}]
+        return model.stream(messages, **kwargs) if stream else model.invoke(messages, **kwargs)
+
+
+    @staticmethod
+    def _record_usage(span, usage):
+        """Token counts reported by the provider, on the span and in the running totals."""
+        if not usage:
+            return
+        input_tokens = usage.get("input_tokens", 0) or 0
+        output_tokens = usage.get("output_tokens", 0) or 0
+        span.set(input_tokens=input_tokens, output_tokens=output_tokens)
+        tracer.count("llm.input_tokens", input_tokens)
+        tracer.count("llm.output_tokens", output_tokens)
+
+
+    def _story_prompt(self, world_context: str, player_input: str) -> str:
+        return (
             "The system is a Dungeon Master guiding a fantasy adventure. "
             "The system narrates the continuous sequence of the storyline to the player in a max of 120 words."
             "The system creates roadblocks for the player and ask what to do in those scenarios."
@@ -42,12 +153,14 @@ class LLMClient:
             f"World context:\n{world_context}\n\n"
             f"Player action:\n{player_input}\n\n"
         )
-        # Use ChatGroq as chat model
-        msg = self.story_llm.invoke([{"role":"user","content": prompt}])
-        return msg.content.strip()
 
 
     def extract_entities(self, story_text: str) -> Dict[str, Any]:
+        key = make_key(self.model_name, EXTRACT_PROMPT_VERSION, story_text)
+        cached = self.extract_cache.get(key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+
         prompt = (
             "Extract entities and relationships from the following story excerpt. Return **strict JSON only**.\n\n"
             "Use the `attributes` field to describe the state of an entity, such as its status (alive, dead, friendly, hostile) or condition.\n\n"
@@ -60,12 +173,36 @@ class LLMClient:
             f"Story:\n{story_text}\n\n"
             "Return JSON exactly (no extra text)."
         )
-        msg = self.extractor_llm.invoke([{"role":"user","content": prompt}])
-        raw = msg.content
+        with tracer.span("llm.extract", prompt_chars=len(prompt)) as span:
+            # concurrent calls for the same text share one request
+            msg = self.scheduler.call(lambda timeout: self._ask(self.extractor_llm, prompt, timeout),
+                                      key=key, name="extract")
+            self._record_usage(span, getattr(msg, "usage_metadata", None))
+        parsed = self._parse_json(msg.content)
+        if parsed is None:
+            # not cached, so the next call with this text asks the model again
+            return {"entities": [], "relationships": []}
+        self.extract_cache.put(key, parsed)
+        return copy.deepcopy(parsed)
 
+    def summarize_events(self, texts: list) -> str:
+        events = "\n\n".join(f"Event {i + 1}:\n{t}" for i, t in enumerate(texts))
+        prompt = (
+            "Summarize the following events of a fantasy adventure as one short paragraph (max 80 words). "
+            "Keep every name, place, item and outcome; drop repetition and flavour text. "
+            "Return only the summary.\n\n"
+            f"{events}\n"
+        )
+        with tracer.span("llm.summarize", prompt_chars=len(prompt), events=len(texts)) as span:
+            msg = self.scheduler.call(lambda timeout: self._ask(self.extractor_llm, prompt, timeout),
+                                      name="summarize")
+            self._record_usage(span, getattr(msg, "usage_metadata", None))
+        return msg.content.strip()
+
+    def _parse_json(self, raw: str):
         jtxt = self._extract_first_json(raw)
         if not jtxt:
-            return {"entities": [], "relationships": []}
+            return None
         try:
             return json.loads(jtxt)
         except Exception:
@@ -75,7 +212,7 @@ class LLMClient:
             try:
                 return json.loads(cleaned)
             except Exception:
-                return {"entities": [], "relationships": []}
+                return None
 
     def _extract_first_json(self, text: str) -> str:
         start = text.find("{")
@@ -0,0 +1,253 @@
+import time
+import random
+import logging
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from config import settings
+from tracing import tracer
+
+log = logging.getLogger("llm_scheduler")
+
+_RETRYABLE_NAMES = {"RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError",
+                    "ServiceUnavailableError"}
+_END = object()
+
+
+class LLMUnavailable(RuntimeError):
+    """The provider kept failing with rate-limit or transient errors; raised from the last one."""
+
+
+class LLMDeadlineExceeded(LLMUnavailable, TimeoutError):
+    """A call could not finish (queueing and retries included) before its deadline."""
+
+
+class TokenBucket:
+    """
+    `rate` requests per second on average, with bursts of up to `burst`.
+    A rate of 0 disables the limit.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline: float = None) -> bool:
+        """Take one token, waiting for it until `deadline` (time.monotonic()); False if that passes first."""
+        if self.rate <= 0:
+            return True
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class LLMScheduler:
+    """
+    Sits in front of the chat models of an LLMClient (and so of every session sharing it).
+    - call(fn) runs one request: at most `max_concurrency` at a time, paced by a token bucket
+      of `rate` requests/s, retried on rate-limit (429) and transient (5xx, timeout,
+      connection) errors with jittered exponential backoff, honouring Retry-After
+    - call(fn, key=...) shares one request between callers asking the same thing at once
+    - stream(open_stream) does the same for a streamed reply; it is retried only until
+      the first chunk arrives and keeps its slot until the stream ends
+    - every call has a deadline (`timeout` seconds, 0 = none) covering queueing and retries;
+      fn(timeout) / open_stream(timeout) get the seconds left of it (None without one) as
+      the request timeout of each attempt, so no single request can outlive the deadline
+    - stats() gives the counters; queue waits go to the tracer as "llm.queue_wait"
+    Retries that run out raise LLMUnavailable, missed deadlines LLMDeadlineExceeded; any
+    other error is raised as it is.
+    """
+
+    def __init__(self, rate: float = 0.0, burst: int = 1, max_concurrency: int = 8, max_retries: int = 4,
+                 backoff: float = 0.5, max_backoff: float = 20.0, timeout: float = 0.0):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+        self._lock = threading.Lock()
+        self._inflight = {}  # coalescing key -> Future of the leading call
+        self._waiting = 0
+        self._running = 0
+        self.counters = {"attempts": 0, "retries": 0, "rate_limited": 0, "coalesced": 0, "failed": 0,
+                         "deadline_exceeded": 0}
+
+    @classmethod
+    def from_settings(cls):
+        return cls(rate=settings.LLM_RATE, burst=settings.LLM_BURST, max_concurrency=settings.LLM_MAX_CONCURRENCY,
+                   max_retries=settings.LLM_MAX_RETRIES, backoff=settings.LLM_BACKOFF,
+                   max_backoff=settings.LLM_MAX_BACKOFF, timeout=settings.LLM_TIMEOUT)
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self.counters)
+            out["waiting"] = self._waiting
+            out["running"] = self._running
+            out["coalescing"] = len(self._inflight)
+        return out
+
+    def call(self, fn, key: str = None, name: str = "llm", timeout: float = None):
+        """fn(timeout) under the limits above. Callers passing the same `key` while it runs share its result."""
+        deadline = self._deadline(timeout)
+        if key is None:
+            return self._run(fn, name, deadline)
+        with self._lock:
+            leader = self._inflight.get(key)
+            if leader is None:
+                future = self._inflight[key] = Future()
+            else:
+                self.counters["coalesced"] += 1
+        if leader is not None:
+            tracer.count("llm.coalesced")
+            try:
+                return leader.result(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+            except FutureTimeout:
+                raise self._expired(name) from None
+        try:
+            result = self._run(fn, name, deadline)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stream(self, open_stream, name: str = "llm", timeout: float = None):
+        """Yield the chunks of iter(open_stream(timeout)), retrying the request until its first chunk."""
+        deadline = self._deadline(timeout)
+        attempt = 0
+        while True:
+            self._acquire(name, deadline)
+            try:
+                chunks = iter(open_stream(_remaining(deadline)))
+                first = next(chunks, _END)
+                break
+            except Exception as e:
+                self._release()
+                self._backoff(e, attempt, name, deadline)
+                attempt += 1
+            except BaseException:
+                self._release()
+                raise
+        try:
+            if first is not _END:
+                yield first
+            yield from chunks
+        finally:
+            self._release()
+
+    def _run(self, fn, name: str, deadline: float):
+        attempt = 0
+        while True:
+            self._acquire(name, deadline)
+            try:
+                return fn(_remaining(deadline))
+            except Exception as e:
+                error = e
+            finally:
+                self._release()
+            self._backoff(error, attempt, name, deadline)
+            attempt += 1
+
+    def _acquire(self, name: str, deadline: float):
+        """Wait for a concurrency slot, then a rate-limit token."""
+        t0 = time.monotonic()
+        with self._lock:
+            self._waiting += 1
+            self.counters["attempts"] += 1
+        try:
+            got = self._slots.acquire(timeout=None if deadline is None else max(0.0, deadline - t0))
+            if got and not self.bucket.acquire(deadline):
+                self._slots.release()
+                got = False
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        tracer.record("llm.queue_wait", time.monotonic() - t0, call=name)
+        if not got:
+            raise self._expired(name)
+        with self._lock:
+            self._running += 1
+
+    def _release(self):
+        with self._lock:
+            self._running -= 1
+        self._slots.release()
+
+    def _backoff(self, error: Exception, attempt: int, name: str, deadline: float):
+        """Sleep before retrying after `error`, or raise if it can't or shouldn't be retried."""
+        status = _status_code(error)
+        if status == 429:
+            with self._lock:
+                self.counters["rate_limited"] += 1
+            tracer.count("llm.rate_limited")
+        if not _retryable(error, status):
+            raise error
+        if deadline is not None and time.monotonic() >= deadline:
+            raise self._expired(name) from error
+        if attempt >= self.max_retries:
+            with self._lock:
+                self.counters["failed"] += 1
+            what = "rate limited" if status == 429 else "unavailable"
+            raise LLMUnavailable(f"LLM {what}; gave up on {name} after {attempt + 1} attempts: {error}") from error
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+        delay = max(delay, _retry_after(error))
+        if deadline is not None and time.monotonic() + delay > deadline:
+            raise self._expired(name) from error
+        with self._lock:
+            self.counters["retries"] += 1
+        tracer.count("llm.retries")
+        log.info("%s failed (%s); retry %d in %.2fs", name, status or type(error).__name__, attempt + 1, delay)
+        time.sleep(delay)
+
+    def _deadline(self, timeout: float = None):
+        timeout = self.timeout if timeout is None else timeout
+        return time.monotonic() + timeout if timeout and timeout > 0 else None
+
+    def _expired(self, name: str) -> LLMDeadlineExceeded:
+        with self._lock:
+            self.counters["deadline_exceeded"] += 1
+        tracer.count("llm.deadline_exceeded")
+        return LLMDeadlineExceeded(f"{name} did not finish within its deadline")
+
+
+def _remaining(deadline: float):
+    """Seconds left until `deadline` (a little above 0 once it has passed), or None without one."""
+    return None if deadline is None else max(0.001, deadline - time.monotonic())
+
+
+def _status_code(error: Exception):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _retryable(error: Exception, status) -> bool:
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (TimeoutError, ConnectionError)) or type(error).__name__ in _RETRYABLE_NAMES
+
+
+def _retry_after(error: Exception) -> float:
+    """Seconds asked for by a Retry-After header on the error's response, else 0."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("retry-after") or headers.get("Retry-After") or 0))
+    except (TypeError, ValueError, AttributeError):
+        return 0.0
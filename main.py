@@ -1,15 +1,18 @@
-import sys, traceback
+import sys, time, traceback
+from lazy import startup_report
 from memory_manager import MemoryManager
+from session_archive import export_session, import_session
+from tracing import tracer
 from utils import pretty_print_memory
-import os
 
 def repl():
+    t0 = time.perf_counter()
     print("Summoning the Dungeon Master...")
     manager = MemoryManager()
-    manager.reset_memory()
+    # clear the last game's memory on the write worker, so Neo4j isn't touched before the prompt
+    manager.reset_memory(wait=False)
+    startup_report.add("first prompt", time.perf_counter() - t0)
     print("I am the Dungeon Master. Type your action or '/help' for commands. You can type start to start the game!")
-    if os.path.exists("episodic_store.json"):
-        os.remove("episodic_store.json")
     try:
 
         while True:
@@ -22,16 +25,51 @@ def repl():
                     print("Exiting.")
                     break
                 elif cmd == "help":
-                    print("Commands:\n /help\n /exit or /quit\n /memory <query>  -- query episodic & graph\n /context -- print current prompt context\n /dump -- print entire graph summary + episodic store")
+                    print("Commands:\n /help\n /exit or /quit\n /memory <query>  -- query episodic & graph\n /context -- print current prompt context\n /dump -- print entire graph summary + episodic store\n /startup -- show where startup time went\n /cache -- show extraction/embedding cache hits, graph and episodic store size\n /stats -- per-stage latency percentiles\n /export <file> -- save the whole session to an archive\n /import <file> -- replace the session with an archive")
                 elif cmd.startswith("memory"):
                     parts = raw.split(" ", 1)
                     q = parts[1] if len(parts) > 1 else ""
                     mem = manager.query_memory(q or "")
                     pretty_print_memory(mem)
+                elif cmd == "startup":
+                    print("=== Startup time ===")
+                    print(startup_report.format())
+                elif cmd == "cache":
+                    print("=== Caches ===")
+                    for name, st in manager.cache_stats().items():
+                        print(f"{name}: {st['hits']} hits, {st['disk_hits']} disk hits, {st['misses']} misses "
+                              f"({st['hit_rate']:.0%}), {st['entries']} entries / {st['bytes']} bytes, "
+                              f"{st['evictions']} evicted")
+                    gs = manager.graph_stats()
+                    if gs:
+                        print(f"graph: {gs['nodes']} nodes, {gs['edges']} edges, ~{gs['bytes']} bytes "
+                              f"(version {gs['version']}, {gs['memoized']} memoized reads)")
+                    es = manager.episodic_stats()
+                    print(f"episodic: {es['episodes']} episodes ({es['summaries']} summaries of "
+                          f"{es['merged_episodes']}), {es['disk_bytes']} bytes on disk, "
+                          f"{es['duplicates_dropped']} duplicates dropped, {es['compactions']} consolidations")
+                elif cmd == "stats":
+                    print("=== Stage latency (rolling) ===")
+                    print(tracer.format())
+                    print("\nLLM scheduler:", ", ".join(f"{k} {v}" for k, v in manager.llm.scheduler.stats().items()))
+                elif cmd.startswith("export") or cmd.startswith("import"):
+                    parts = raw.split(" ", 1)
+                    if len(parts) < 2 or not parts[1].strip():
+                        print(f"Usage: /{cmd.split()[0]} <file>")
+                        continue
+                    try:
+                        if cmd.startswith("export"):
+                            m = export_session(manager, parts[1].strip(), progress=_print_progress)
+                        else:
+                            m = import_session(manager, parts[1].strip(), progress=_print_progress)
+                        print(f"{m['turns']} turns, {m['episodes']} episodes, {m['nodes']} nodes, {m['edges']} edges")
+                    except Exception as e:
+                        print(f"{cmd.split()[0].capitalize()} failed:", e)
                 elif cmd == "context":
                     ctx = manager.get_world_context2()
                     print("=== World Context ===")
                     print(ctx or "(no context)")
+                    print("\nLast prompt context:", manager.assembler.format_report(manager.context_report))
 
                 elif cmd == "reset": # for debugging purposes
                     manager.reset_memory()
@@ -49,17 +87,24 @@ def repl():
 
             # normal player turn
             try:
-                dm = manager.generate_and_update(raw)
                 print("\n--- DM ---\n")
-                print(dm)
+                for chunk in manager.stream_and_update(raw):
+                    print(chunk, end="", flush=True)
+                print()
             except Exception as e:
                 print("Error during generation:", e)
                 traceback.print_exc()
     finally:
+        # let queued memory writes land before tearing the stores down
+        manager.flush()
         manager.graph.clear_graph()
         manager.close()
-        if os.path.exists("episodic_store.json"):
-             os.remove("episodic_store.json")
+        manager.episodic.remove_files()
+        tracer.close()
+
+
+def _print_progress(stage: str, done: int, total: int):
+    print(f"\r{stage}: {done}/{total}", end="\n" if done >= total else "", flush=True)
 
 
 if __name__ == "__main__":
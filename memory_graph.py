@@ -0,0 +1,320 @@
+import logging
+import os
+import sys
+import threading
+from graph_store import GraphStore
+from tracing import tracer
+
+log = logging.getLogger("memory_graph")
+
+
+class InMemoryGraphStore(GraphStore):
+    """
+    GraphStore kept in process memory, with the same semantics as the Neo4j queries:
+    - there is one node per name, labelled "Entity" plus any type labels merged onto it
+    - merge_relationship() creates untyped nodes for names it has not seen yet
+    - relationships are merged on (source node, type, target node)
+
+    Indexes:
+    - by_name: name -> node id
+    - by_label: label -> {node id: None}
+    - out_adj / in_adj: node id -> {relationship type: {neighbour id: None}}, so a lookup filtered by
+      relationship type only touches edges of those types
+    Nothing here leaves the process; if `path` is given the graph is restored from it on start and
+    snapshotted to it on close().
+
+    `version` goes up on every change. The rendered text of fetch_context() and
+    get_context_for_entities() is memoized per version, so repeated reads between two
+    writes cost a dict lookup.
+    """
+
+    MAX_MEMO = 256
+
+
+    def __init__(self, session_id: str = "default", path: str = None):
+
+        super().__init__(session_id)
+        self.path = path
+        self._lock = threading.RLock()
+        self.version = 0
+        self._reset()
+        if path and os.path.exists(path):
+            self.restore(path)
+            log.info("InMemoryGraphStore: restored %d nodes from %s", len(self.nodes), path)
+
+
+    def _reset(self):
+        self.nodes = {}
+        self.edges = {}
+        self.by_name = {}
+        self.by_label = {}
+        self.out_adj = {}
+        self.in_adj = {}
+        self._next_id = 0
+        self._memo = {}
+        self.version += 1
+
+
+    def close(self):
+        if self.path:
+            self.snapshot(self.path)
+
+
+    def _create_node(self, labels: list, props: dict, counts: dict = None) -> int:
+        node_id = self._next_id
+        self._next_id += 1
+        self.nodes[node_id] = {"labels": list(labels), "props": dict(props)}
+        self.out_adj[node_id] = {}
+        self.in_adj[node_id] = {}
+        self.by_name[props["name"]] = node_id
+        for label in labels:
+            self.by_label.setdefault(label, {})[node_id] = None
+        self._changed()
+        if counts is not None:
+            counts["nodes_created"] += 1
+            # name + session, as counted by Neo4j
+            counts["properties_set"] += 2
+        return node_id
+
+
+    def _merge_node(self, name: str, counts: dict) -> int:
+        node_id = self.by_name.get(name)
+        if node_id is None:
+            node_id = self._create_node(["Entity"], {"name": name}, counts)
+        return node_id
+
+
+    def _merge_labeled(self, label: str, name: str, props: dict, counts: dict):
+        node_id = self._merge_node(name, counts)
+        node = self.nodes[node_id]
+        changed = False
+        if label not in node["labels"]:
+            node["labels"].append(label)
+            self.by_label.setdefault(label, {})[node_id] = None
+            changed = True
+        if any(k not in node["props"] or node["props"][k] != v for k, v in props.items()):
+            node["props"].update(props)
+            changed = True
+        counts["properties_set"] += len(props)
+        # Re-merging what is already there keeps the memoized context valid.
+        if changed:
+            self._changed()
+
+
+    def _merge_edge(self, src: int, rel_type: str, tgt: int, counts: dict):
+        key = (src, rel_type, tgt)
+        if key in self.edges:
+            return
+        self.edges[key] = None
+        self.out_adj[src].setdefault(rel_type, {})[tgt] = None
+        self.in_adj[tgt].setdefault(rel_type, {})[src] = None
+        counts["relationships_created"] += 1
+        self._changed()
+
+
+    def _changed(self):
+        self.version += 1
+        self._memo.clear()
+
+
+    def _memoized(self, key, render):
+        """render() under the lock, reusing the text from an earlier call at the same version."""
+        with self._lock:
+            text = self._memo.get(key)
+            if text is None:
+                if len(self._memo) >= self.MAX_MEMO:
+                    self._memo.clear()
+                text = self._memo[key] = render()
+            return text
+
+
+    def merge_entity(self, name: str, typ: str, attributes: dict = None):
+        with self._lock:
+            self._merge_labeled(self._label(typ), name, self._safe_attributes(attributes or {}),
+                                self._new_counts())
+        self.names.add(name)
+
+
+    def merge_relationship(self, src: str, rel: str, tgt: str):
+        counts = self._new_counts()
+        rel_type = self._rel_type(rel)
+        with self._lock:
+            self._merge_edge(self._merge_node(src, counts), rel_type, self._merge_node(tgt, counts), counts)
+        self.names.add_many((src, tgt))
+
+
+    def apply_extraction(self, entities: list, relationships: list):
+        """Write one extraction result under a single lock hold. Returns the same counts as Neo4j."""
+        entity_batches, rel_batches = self._group_extraction(entities, relationships)
+        counts = self._new_counts()
+        with self._lock:
+            for label, rows in entity_batches.items():
+                for row in rows:
+                    self._merge_labeled(label, row["name"], row["props"], counts)
+                counts["entities"] += len(rows)
+            for rel_type, rows in rel_batches.items():
+                for row in rows:
+                    a = self._merge_node(row["src"], counts)
+                    self._merge_edge(a, rel_type, self._merge_node(row["tgt"], counts), counts)
+                counts["relationships"] += len(rows)
+        self._index_names(entity_batches, rel_batches)
+        return counts
+
+
+    def _load_names(self):
+        with self._lock:
+            return list(self.by_name)
+
+
+    def _type_and_name(self, node_id: int):
+        node = self.nodes[node_id]
+        return next((l for l in node["labels"] if l != "Entity"), None), node["props"]["name"]
+
+
+    def fetch_context(self, limit: int = 100):
+        """
+        Return a textual summary of relationships for use in prompts.
+        """
+        with tracer.span("graph.fetch_context", backend="memory"):
+            return self._memoized(("fetch_context", limit), lambda: self._render_edges(limit))
+
+
+    def _render_edges(self, limit: int) -> str:
+        lines = []
+        for src, rel, tgt in self.edges:
+            if len(lines) >= limit:
+                break
+            lines.append(self._line(*self._type_and_name(src), rel, *self._type_and_name(tgt)))
+        return "\n".join(lines)
+
+
+    def _incident(self, node_id: int, rel_types: list):
+        """(edge key, neighbour) for every relationship touching node_id, in either direction."""
+        for adj, outgoing in ((self.out_adj[node_id], True), (self.in_adj[node_id], False)):
+            for rel_type in (rel_types if rel_types is not None else adj):
+                for other in adj.get(rel_type, ()):
+                    if outgoing:
+                        yield (node_id, rel_type, other), other
+                    elif other != node_id:
+                        # A self-loop was already yielded from the outgoing side.
+                        yield (other, rel_type, node_id), other
+
+
+    def get_context_for_entities(self, entity_names: list, limit_per_entity: int = 5,
+                                 depth: int = 1, rel_types: list = None):
+        """
+        For a given list of entity names, find their relationships up to `depth` hops away,
+        optionally restricted to `rel_types`. Returns a text summary.
+        Paths are expanded one hop at a time without reusing a relationship (as in a Cypher
+        variable-length match), and only the last hop of each path is reported, nearest first.
+        """
+        if not entity_names:
+            return ""
+
+        depth = max(1, int(depth))
+        if rel_types:
+            rel_types = [self._rel_type(t) for t in rel_types]
+        else:
+            rel_types = None
+        key = ("context", tuple(entity_names), limit_per_entity, depth, tuple(rel_types or ()))
+        with tracer.span("graph.context", backend="memory"):
+            return self._memoized(key, lambda: self._render_neighbourhoods(entity_names, limit_per_entity,
+                                                                           depth, rel_types))
+
+
+    def _render_neighbourhoods(self, entity_names: list, limit_per_entity: int, depth: int,
+                               rel_types: list) -> str:
+        lines = []
+        for name in entity_names:
+            rows = 0
+            frontier = [(self.by_name[name], frozenset())] if name in self.by_name else []
+            for _ in range(depth):
+                if rows >= limit_per_entity or not frontier:
+                    break
+                next_frontier = []
+                for node_id, used in frontier:
+                    for key, other in self._incident(node_id, rel_types):
+                        if key in used:
+                            continue
+                        if rows >= limit_per_entity:
+                            break
+                        lines.append(self._line(*self._type_and_name(node_id), key[1],
+                                                *self._type_and_name(other)))
+                        rows += 1
+                        next_frontier.append((other, used | {key}))
+                frontier = next_frontier
+
+        # Remove duplicates while preserving order
+        return "\n".join(list(dict.fromkeys(lines)))
+
+
+    def clear_graph(self):
+        """Deletes all nodes and relationships of this session's graph. For debugging."""
+        with self._lock:
+            self._reset()
+        self.names.clear()
+        self._names_loaded = True
+        log.info("Graph of session %s has been cleared.", self.session_id)
+
+
+    def export_graph(self) -> dict:
+        with self._lock:
+            nodes = [{"id": str(node_id), "labels": list(node["labels"]), "props": dict(node["props"])}
+                     for node_id, node in self.nodes.items()]
+            edges = [{"src": str(src), "type": rel, "tgt": str(tgt)} for src, rel, tgt in self.edges]
+        return {"nodes": nodes, "edges": edges}
+
+
+    def import_graph(self, data: dict):
+        counts = self._new_counts()
+        with self._lock:
+            self._reset()
+            ids = {}
+            for n in data.get("nodes", []):
+                props = dict(n.get("props") or {})
+                if props.get("name") is None:
+                    continue
+                props.pop("session", None)
+                node_id = self._merge_node(props["name"], counts)
+                for label in n.get("labels") or []:
+                    self._merge_labeled(self._label(label), props["name"], props, counts)
+                self.nodes[node_id]["props"].update(props)
+                ids[n["id"]] = node_id
+            for e in data.get("edges", []):
+                if e["src"] in ids and e["tgt"] in ids:
+                    self._merge_edge(ids[e["src"]], self._rel_type(e["type"]), ids[e["tgt"]], counts)
+        self.names.clear()
+        self.names.add_many(str(name) for name in self.by_name)
+        self._names_loaded = True
+
+
+    def stats(self) -> dict:
+        """Size of the graph and an estimate of the memory it (indexes and memoized text included) takes."""
+        with self._lock:
+            return {
+                "nodes": len(self.nodes),
+                "edges": len(self.edges),
+                "version": self.version,
+                "memoized": len(self._memo),
+                "bytes": _deep_size((self.nodes, self.edges, self.by_name, self.by_label,
+                                     self.out_adj, self.in_adj, self._memo)),
+            }
+
+
+def _deep_size(obj) -> int:
+    """sys.getsizeof summed over containers, counting shared objects (interned names etc.) once."""
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+    return total
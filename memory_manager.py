@@ -1,75 +1,226 @@
 import time
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from config import settings
 from llm_client import LLMClient
-from graph_store import GraphStore
-from vector_store import EpisodicStore
+from graph_store import GraphStore, make_graph_store
+from vector_store import EpisodicStore, EMBEDDING_CACHE
+from memory_worker import MemoryWorker
+from tracing import tracer
+from context_assembler import ContextAssembler, Section, LAST_TURN, WORLD_FACTS, EPISODES, EARLIER_TURNS
 import logging
 log = logging.getLogger("memory_manager")
 
 class MemoryManager:
     """
     A memory manager system.
-    - get_world_context() Builds a dynamic, filtered context based on the player's input.
+    - get_world_context() Builds a dynamic, filtered context based on the player's input,
+      fitted to settings.CONTEXT_TOKEN_BUDGET by a ContextAssembler (see context_report).
     - get_world_context2() Provides a general-purpose context.
     - generate_and_update() Generates and updates the memory as the game progresses.
+    - stream_and_update() Same, but yields the narration as it streams in.
     - query_memory() Generates a precise memory log for the /memory <query> command
     - query_memory2() Generates a general memory log for the /dump command
+    - flush() Waits for the background memory writes queued by earlier turns
+    - episodic_stats() Size of the episodic store and what consolidation did to it
+
+    After a turn, the episodic write and the extraction + graph merge run on a background
+    MemoryWorker, so the player gets the DM text right away. The next turn's
+    get_world_context() waits only for the write each retrieval step reads from.
+    Consolidation of the episodic store runs on its own `compactor` worker, so a long
+    pass never holds up those writes.
+
+    get_world_context() runs the episodic search (on the `retrieval` pool) and the graph
+    lookup of the input's entities (on the `graph_retrieval` pool) at the same time, each
+    bounded by its settings.CONTEXT_*_TIMEOUT. A source that fails or times out is logged
+    and left out of the context, so the turn still goes through. A timed-out lookup keeps
+    running, so a source whose last lookup has not finished yet is skipped (and logged)
+    rather than queued again: a stuck Neo4j holds at most one thread per session.
     """
 
 
-    def __init__(self, working_capacity: int = None):
+    def __init__(self, working_capacity: int = None, session_id: str = "default",
+                 llm: LLMClient = None, graph: GraphStore = None, episodic: EpisodicStore = None,
+                 writer: MemoryWorker = None, compactor: MemoryWorker = None,
+                 retrieval: ThreadPoolExecutor = None, graph_retrieval: ThreadPoolExecutor = None):
+        # The keyword arguments let a server share one LLM client / driver / thread pool
+        # between sessions; the REPL just uses the defaults.
+        self.session_id = session_id
         self.capacity = working_capacity or settings.WORKING_CAPACITY
         self.working_buffer = deque(maxlen=self.capacity)
-        self.llm = LLMClient()
-        self.graph = GraphStore()
-        self.episodic = EpisodicStore()
+        # per-turn generation timings: {"ttft": seconds to first token, "total": seconds}
+        self.turn_timings = deque(maxlen=1000)
+        self.llm = LLMClient() if llm is None else llm
+        self.graph = make_graph_store(session_id) if graph is None else graph
+        self.episodic = EpisodicStore() if episodic is None else episodic  # an empty store is falsy
+        self.writer = MemoryWorker() if writer is None else writer
+        self.compactor = MemoryWorker("compactor") if compactor is None else compactor
+        # One thread per source is enough: a source never has two lookups in flight.
+        self._own_pools = []
+        if retrieval is None:
+            retrieval = ThreadPoolExecutor(max_workers=1, thread_name_prefix="retrieval-episodic")
+            self._own_pools.append(retrieval)
+        if graph_retrieval is None:
+            graph_retrieval = ThreadPoolExecutor(max_workers=1, thread_name_prefix="retrieval-graph")
+            self._own_pools.append(graph_retrieval)
+        self.retrieval = retrieval
+        self.graph_retrieval = graph_retrieval
+        self._lookups = {}  # source -> its latest retrieval job, which may outlive its turn
+        self.assembler = ContextAssembler()
+        # latest queued write of each store; the worker is FIFO, so these cover all earlier ones
+        self._episodic_write = None
+        self._graph_write = None
+        self.warm_up()
+
+    def warm_up(self):
+        """Start loading the model, LLM clients and graph backend in the background."""
+        self.episodic.warm_up()
+        self.llm.warm_up()
+        self.graph.warm_up()
+
+    @property
+    def pending_writes(self) -> int:
+        """How many background memory writes are still queued or running."""
+        return self.writer.pending
+
+    def flush(self):
+        """Block until every queued memory write has finished."""
+        self.writer.flush()
+
+    def cache_stats(self):
+        """Hit/miss counters of the extraction and embedding caches."""
+        return {"extract": self.llm.extract_cache.stats(), "embedding": EMBEDDING_CACHE.stats()}
+
+    def episodic_stats(self):
+        """Episodes, summaries, bytes on disk and consolidation counters of the episodic store."""
+        return self.episodic.stats()
+
+    def graph_stats(self):
+        """Nodes, edges and estimated bytes of the in-process graph (mirror or memory backend)."""
+        return self.graph.stats()
+
+    @staticmethod
+    def _await(write):
+        # Failures are already logged by the worker; a failed write just means less context.
+        if write is not None:
+            try:
+                write.result()
+            except Exception:
+                pass
+
+    @property
+    def context_report(self) -> dict:
+        """Tokens used per section by the last get_world_context()."""
+        return self.assembler.last_report
 
     def get_world_context(self, player_input: str):
         k = settings.EPISODIC_K or 3
-        parts = []
+        sections = []
 
-        if self.working_buffer:
-            parts.append("Recent actions and DM responses:")
-            for e in list(self.working_buffer):
-                parts.append(f"- Player: {e['player']} | DM: {e['dm']}")
+        recent = list(self.working_buffer)
+        if recent:
+            newest = len(recent) - 1
+            sections.append(Section(
+                "recent", "Recent actions and DM responses:",
+                [f"- Player: {e['player']} | DM: {e['dm']}" for e in recent],
+                [LAST_TURN if i == newest else EARLIER_TURNS + newest - i for i in range(len(recent))],
+            ))
+
+        # --- Fan-out: episodic search and the graph lookup of the input's entities run at once ---
+        started = time.perf_counter()
+        episodic_job = self._lookup(self.retrieval, "episodic", self._episodic_hits, player_input, k)
+        graph_job = self._lookup(self.graph_retrieval, "graph", self._graph_facts, player_input)
+        graph_deadline = _deadline(started, settings.CONTEXT_GRAPH_TIMEOUT)
 
         # --- Step 1: Semantic Search for Relevant Events ---
+        episodic_hits = self._gather(episodic_job, "episodic", _deadline(started, settings.CONTEXT_EPISODIC_TIMEOUT), [])
+        if episodic_hits:
+            sections.append(Section("events", "Recent relevant events:",
+                                    ["- " + hit['text'].replace("\n", " ") for hit in episodic_hits], EPISODES))
+
+        # --- Step 2 + 3: Entities and their graph neighbourhoods ---
+        # The input's entities were looked up speculatively; the events add only the names
+        # they mention beyond those (plus the player), so the facts come out in the same
+        # order as one lookup over input + events would give them.
+        input_names, facts = self._gather(graph_job, "graph", graph_deadline, (None, []))
+        if input_names is not None:
+            event_text = "\n".join(h['text'] for h in episodic_hits)
+            job = self._lookup(self.graph_retrieval, "graph", self._graph_facts, event_text, input_names)
+            more = self._gather(job, "graph", graph_deadline, (None, []))[1]
+            facts = list(dict.fromkeys(facts + more))
+        if facts:
+            sections.append(Section("facts", "Relevant world facts and relationships:", facts, WORLD_FACTS))
+
+        with tracer.span("context.assemble") as span:
+            context = self.assembler.assemble(sections)
+            span.set(tokens=self.assembler.last_report.get("total", 0))
+        return context
+
+    def _episodic_hits(self, player_input: str, k: int) -> list:
         # Use the vector store to find the most relevant past events
-        candidate_hits = self.episodic.query(player_input, k=k)
+        with tracer.span("context.wait_episodic"):
+            self._await(self._episodic_write)
+        with tracer.span("context.episodic"):
+            candidate_hits = self.episodic.query(player_input, k=k)
         episodic_hits = [hit for hit in candidate_hits if hit['score'] >= settings.SIMILARITY_THRESHOLD]
-        episodic_hits = episodic_hits[:k]
-        if episodic_hits:
-            parts.append("\nRecent relevant events:")
-            for hit in episodic_hits:
-                parts.append("- " + hit['text'].replace("\n", " "))
+        return episodic_hits[:k]
 
-        # --- Step 2: Extract Key Entities from the Current Scene ---
-        # Combine recent text to find key entities for the graph search
-        text_to_extract_from = player_input
-        if episodic_hits:
-            text_to_extract_from += "\n" + "\n".join([h['text'] for h in episodic_hits])
-
-        # Use the LLM to find what entities we should look up in the graph
-        extracted = self.llm.extract_entities(text_to_extract_from)
-        entity_names = [e['name'] for e in extracted.get("entities", []) if e.get('name')]
-        # Always include the player character
-        # NOTE: You'll need a way to know the player's name. Let's assume it's "Kael".
-        player_name = "Kael"
-        if player_name not in entity_names:
-            entity_names.append(player_name)
-
-        # --- Step 3: Targeted Graph Traversal ---
+    def _graph_facts(self, text: str, known: list = None):
+        """
+        Names of known graph nodes mentioned in `text` that aren't in `known`, and the
+        fact lines of those names. The first pass (no `known`) may fall back to the LLM; the
+        second adds the player if neither list has them yet. Returns (names, lines).
+        """
+        # Spot the names of known graph nodes locally; the LLM is only an opt-in fallback
+        with tracer.span("context.wait_graph"):
+            self._await(self._graph_write)
+        with tracer.span("context.entities"):
+            names = [n for n in self.graph.find_entities(text) if n not in (known or ())] if text else []
+            if not names and known is None and settings.ENTITY_LLM_FALLBACK:
+                extracted = self.llm.extract_entities(text)
+                names = [e['name'] for e in extracted.get("entities", []) if e.get('name')]
+        if known is not None:
+            # Always include the player character
+            # NOTE: You'll need a way to know the player's name. Let's assume it's "Kael".
+            player_name = "Kael"
+            if player_name not in known and player_name not in names:
+                names.append(player_name)
+        if not names:
+            return names, []
         # Use the new graph store method with the extracted entities
-        if entity_names:
-            gctx = self.graph.get_context_for_entities(entity_names, limit_per_entity=5)
-            if gctx:
-                parts.append("\nRelevant world facts and relationships:")
-                parts.append(gctx)
+        with tracer.span("context.graph", entities=len(names)):
+            gctx = self.graph.get_context_for_entities(names, limit_per_entity=5)
+        return names, gctx.split("\n") if gctx else []
 
-        return "\n".join(parts)
+    def _lookup(self, pool: ThreadPoolExecutor, source: str, fn, *args):
+        """Submit fn(*args) to `pool`, or return None while this source's previous lookup still runs."""
+        previous = self._lookups.get(source)
+        if previous is not None and not previous.done():
+            log.warning("%s retrieval from an earlier turn is still running; building the context without it",
+                        source)
+            tracer.count(f"context.{source}_skipped")
+            return None
+        job = self._lookups[source] = pool.submit(fn, *args)
+        return job
+
+    @staticmethod
+    def _gather(job, source: str, deadline: float, default):
+        """The result of a retrieval job, or `default` if it was skipped, failed or missed its deadline."""
+        if job is None:
+            return default
+        timeout = None if deadline is None else max(0.0, deadline - time.perf_counter())
+        try:
+            return job.result(timeout=timeout)
+        except FutureTimeout:
+            log.warning("%s retrieval timed out; building the context without it", source)
+            tracer.count(f"context.{source}_timeouts")
+        except Exception as e:
+            log.warning("%s retrieval failed; building the context without it: %s", source, e)
+            tracer.count(f"context.{source}_errors")
+        return default
 
     def get_world_context2(self):
+        self.flush()
         parts = []
         # recent working
         if self.working_buffer:
@@ -84,7 +235,7 @@ class MemoryManager:
             parts.append(gctx)
         # episodic top few events
         # optional: show last 3 episodic events
-        last_e = self.episodic.docs[-3:] if self.episodic.docs else []
+        last_e = self.episodic.recent(3)
         if last_e:
             parts.append("\nRecent episodic memory:")
             for d in last_e:
@@ -92,42 +243,78 @@ class MemoryManager:
         return "\n".join(parts)
 
     def generate_and_update(self, player_input: str):
-        # 1. build context
-        context = self.get_world_context(player_input)  # Pass player_input here
-        # 2. generate narrative
-        dm_text = self.llm.generate_story(world_context=context, player_input=player_input)
-        # 3. store episodic
-        self.episodic.add_event(f"Player: {player_input}\nDM: {dm_text}", metadata={"ts": time.time()})
-        # 4. extract entities
-        extracted = self.llm.extract_entities(dm_text)
-        ents = extracted.get("entities", []) if isinstance(extracted, dict) else []
-        rels = extracted.get("relationships", []) if isinstance(extracted, dict) else []
-        # 5. update graph
-        for ent in ents:
-            name = ent.get("name")
-            typ = ent.get("type", "Other")
-            attrs = ent.get("attributes", {})
-            if name:
-                self.graph.merge_entity(name, typ, attrs)
-                log.info("Merged entity: %s (%s)", name, typ)
-        for r in rels:
-            src = r.get("source")
-            relname = r.get("relation", "RELATED")
-            tgt = r.get("target")
-            if src and tgt:
-                self.graph.merge_relationship(src, relname, tgt)
-                log.info("Merged relation: %s -%s-> %s", src, relname, tgt)
-        # 6. update working buffer
-        self.working_buffer.append({"ts": time.time(), "player": player_input, "dm": dm_text})
+        with tracer.span("turn", session=self.session_id):
+            # 1. build context
+            with tracer.span("context"):
+                context = self.get_world_context(player_input)  # Pass player_input here
+            # 2. generate narrative
+            t0 = time.perf_counter()
+            dm_text = self.llm.generate_story(world_context=context, player_input=player_input)
+            total = time.perf_counter() - t0
+            self._record_timing(total, total)
+            self._update_memory(player_input, dm_text)
         return dm_text
 
+    def stream_and_update(self, player_input: str):
+        """
+        Generator version of generate_and_update(): yields narration chunks as they arrive.
+        Memory is updated with the full text once the stream is exhausted.
+        """
+        turn_start = time.perf_counter()
+        with tracer.span("context"):
+            context = self.get_world_context(player_input)
+        t0 = time.perf_counter()
+        ttft = None
+        chunks = []
+        for chunk in self.llm.stream_story(world_context=context, player_input=player_input):
+            if ttft is None:
+                ttft = time.perf_counter() - t0
+            chunks.append(chunk)
+            yield chunk
+        total = time.perf_counter() - t0
+        self._record_timing(total if ttft is None else ttft, total)
+        self._update_memory(player_input, "".join(chunks).strip())
+        tracer.record("turn", time.perf_counter() - turn_start, session=self.session_id)
+
+    def _record_timing(self, ttft: float, total: float):
+        self.turn_timings.append({"ttft": ttft, "total": total})
+        tracer.record("llm.ttft", ttft)
+        log.info("Story generation: first token %.3fs, total %.3fs", ttft, total)
+
+    def _update_memory(self, player_input: str, dm_text: str):
+        # 3. update working buffer (the next turn needs it straight away)
+        self.working_buffer.append({"ts": time.time(), "player": player_input, "dm": dm_text})
+        # 4. store episodic, in the background
+        self._episodic_write = self.writer.submit(
+            self.episodic.add_event, f"Player: {player_input}\nDM: {dm_text}", metadata={"ts": time.time()})
+        # 5. extract entities and update the graph, in the background
+        self._graph_write = self.writer.submit(self._extract_and_merge, dm_text)
+        # 6. consolidate old episodes now and then, off the write queue
+        if not self.compactor.pending and self.episodic.compaction_due():
+            self.compactor.submit(self.episodic.consolidate, self._summarizer())
+
+    def _summarizer(self):
+        # the store falls back to its extractive summary if this one fails
+        return self.llm.summarize_events if settings.EPISODIC_SUMMARIZER == "llm" else None
+
+    def _extract_and_merge(self, dm_text: str):
+        with tracer.span("write.extract_merge"):
+            extracted = self.llm.extract_entities(dm_text)
+            ents = extracted.get("entities", []) if isinstance(extracted, dict) else []
+            rels = extracted.get("relationships", []) if isinstance(extracted, dict) else []
+            # single transaction, constant number of round trips
+            counts = self.graph.apply_extraction(ents, rels)
+        log.info("Merged %d entities and %d relations", counts["entities"], counts["relationships"])
+
     def query_memory2(self, q: str, k: int = None):
+        self.flush()
         k = k or settings.EPISODIC_K
         episodic_hits = self.episodic.query(q, k=k)
         graph_ctx = self.graph.fetch_context(limit=50)
         return {"episodic": episodic_hits, "graph": graph_ctx}
 
     def query_memory(self, q: str, k: int = None):
+        self.flush()
         k = k or settings.EPISODIC_K
         episodic_hits = self.episodic.query(q, k=k)
 
@@ -145,17 +332,40 @@ class MemoryManager:
         return {"episodic": episodic_hits, "graph": graph_ctx}
 
     def close(self):
+        """Drain pending memory writes, then release the stores."""
+        self.writer.close()
+        self.compactor.close()
+        for pool in self._own_pools:
+            pool.shutdown(wait=False)
+        try:
+            self.episodic.close()
+        except Exception:
+            pass
         try:
             self.graph.close()
         except Exception:
             pass
 
-    def reset_memory(self):
-        """Clears all memory stores."""
-        self.graph.clear_graph()
-        self.episodic.docs = []
-        self.episodic.persist()
+    def reset_memory(self, wait: bool = True):
+        """
+        Clears all memory stores. With wait=False the stores are cleared on the write worker
+        instead (the working buffer at once), and the next turn's reads wait for it, so the
+        caller doesn't block on connecting to the graph backend.
+        """
         self.working_buffer.clear()
+        if not wait:
+            self._episodic_write = self._graph_write = self.writer.submit(self._clear_stores)
+            return
+        self.flush()
+        self.compactor.flush()
+        self._clear_stores()
+
+    def _clear_stores(self):
+        self.graph.clear_graph()
+        self.episodic.clear()
         log.info("All memory stores have been reset.")
 
 
+def _deadline(started: float, timeout: float):
+    """perf_counter() time a retrieval source must answer by; None when `timeout` is 0 (no limit)."""
+    return started + timeout if timeout > 0 else None
@@ -0,0 +1,77 @@
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+log = logging.getLogger("memory_worker")
+
+
+class MemoryWorker:
+    """
+    Runs post-turn memory writes in the background, strictly in submission order.
+    - submit(fn, *args) queues a write and returns its Future
+    - pending is the queue depth (submitted writes that haven't finished)
+    - flush() waits for everything submitted so far
+    - close() drains the queue and stops the worker
+    Several workers can share one thread pool (pass `executor`); each worker still runs
+    its own tasks one at a time and in order, so one session's writes never reorder.
+    """
+
+    def __init__(self, name: str = "memory", executor: ThreadPoolExecutor = None):
+        self.name = name
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{name}-writer")
+        self._lock = threading.Lock()
+        self._queue = deque()
+        self._running = False
+        self._pending = 0
+        self._last = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        fut = Future()
+        with self._lock:
+            self._queue.append((fut, fn, args, kwargs))
+            self._pending += 1
+            self._last = fut
+            start = not self._running
+            self._running = True
+        log.debug("%s: queued %s (%d pending)", self.name, getattr(fn, "__name__", fn), self._pending)
+        if start:
+            self._executor.submit(self._run_next)
+        return fut
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait for all writes submitted so far. Returns False on timeout."""
+        last = self._last
+        if last is None:
+            return True
+        done, _ = wait([last], timeout=timeout)
+        return bool(done)
+
+    def close(self):
+        self.flush()
+        if self._own_executor:
+            self._executor.shutdown(wait=True)
+
+    def _run_next(self):
+        # One task per pool slot, then hand the slot back, so workers sharing a pool take turns.
+        with self._lock:
+            fut, fn, args, kwargs = self._queue.popleft()
+        try:
+            if fut.set_running_or_notify_cancel():
+                try:
+                    fut.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    log.exception("%s: background write %s failed", self.name, getattr(fn, "__name__", fn))
+                    fut.set_exception(e)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                more = bool(self._queue)
+                self._running = more
+            if more:
+                self._executor.submit(self._run_next)
@@ -0,0 +1,97 @@
+import numpy as np
+
+PRECISIONS = ("float32", "float16", "int8")
+
+
+class EmbeddingMatrix:
+    """
+    Growable (n, dim) matrix of L2-normalised embeddings, kept at one of PRECISIONS:
+    - float32  4 bytes per dimension, exact
+    - float16  2 bytes per dimension
+    - int8     1 byte per dimension plus one float32 scale per row (symmetric, per-row max-abs)
+    Rows are decoded to float32 on access, so the matrix can be handed to the indexes in
+    vector_index.py wherever they take an array: shape, m[rows] and m @ query.
+    Scores from float16/int8 codes are approximate; EpisodicStore re-ranks its shortlist
+    against the float32 rows on disk.
+    """
+
+    CHUNK = 8192
+
+    def __init__(self, dim: int, precision: str = "float32", capacity: int = 64):
+        if precision not in PRECISIONS:
+            raise ValueError(f"unknown embedding precision {precision!r} (expected one of {', '.join(PRECISIONS)})")
+        self.dim = dim
+        self.precision = precision
+        dtype = {"float32": np.float32, "float16": np.float16, "int8": np.int8}[precision]
+        self._codes = np.empty((capacity, dim), dtype=dtype)
+        self._scales = np.empty(capacity, dtype=np.float32) if precision == "int8" else None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def shape(self):
+        return (self._size, self.dim)
+
+    @property
+    def exact(self) -> bool:
+        return self.precision == "float32"
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of the rows in use (capacity slack excluded)."""
+        n = self._codes[:self._size].nbytes
+        if self._scales is not None:
+            n += self._scales[:self._size].nbytes
+        return int(n)
+
+    def append(self, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        m = vectors.shape[0]
+        self._reserve(self._size + m)
+        end = self._size + m
+        if self._scales is None:
+            self._codes[self._size:end] = vectors
+        else:
+            scales = np.abs(vectors).max(axis=1) / 127
+            scales[scales == 0] = 1
+            self._codes[self._size:end] = np.rint(vectors / scales[:, None])
+            self._scales[self._size:end] = scales
+        self._size = end
+
+    def truncate(self, n: int):
+        """Drop every row from `n` on."""
+        self._size = min(self._size, max(0, n))
+
+    def __getitem__(self, rows) -> np.ndarray:
+        codes = self._codes[:self._size][rows]
+        if self.exact:
+            return codes
+        if self._scales is None:
+            return codes.astype(np.float32)
+        scales = self._scales[:self._size][rows]
+        return codes.astype(np.float32) * np.asarray(scales, dtype=np.float32)[..., None]
+
+    def __matmul__(self, query: np.ndarray) -> np.ndarray:
+        if self.exact:
+            return self._codes[:self._size] @ query
+        # decode a chunk at a time so a full-size float32 copy is never built
+        out = np.empty(self._size, dtype=np.float32)
+        for start in range(0, self._size, self.CHUNK):
+            out[start:start + self.CHUNK] = self[start:start + self.CHUNK] @ query
+        return out
+
+    def _reserve(self, n: int):
+        capacity = max(self._codes.shape[0], 1)
+        if n <= self._codes.shape[0]:
+            return
+        while capacity < n:
+            capacity *= 2
+        grown = np.empty((capacity, self.dim), dtype=self._codes.dtype)
+        grown[:self._size] = self._codes[:self._size]
+        self._codes = grown
+        if self._scales is not None:
+            scales = np.empty(capacity, dtype=np.float32)
+            scales[:self._size] = self._scales[:self._size]
+            self._scales = scales
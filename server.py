@@ -0,0 +1,243 @@
+import os
+import re
+import uuid
+import asyncio
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import settings
+from graph_store import make_driver, make_graph_store
+from llm_client import LLMClient
+from memory_manager import MemoryManager
+from memory_worker import MemoryWorker
+from vector_store import EpisodicStore, EMBEDDING_MODEL
+from utils import format_memory
+from tracing import tracer
+
+log = logging.getLogger("server")
+
+HELP = ("Commands:\n /help\n /exit or /quit\n /memory <query>  -- query episodic & graph\n"
+        " /context -- print current prompt context\n /dump -- print entire graph summary + episodic store\n"
+        " /reset -- clear this session's memory\n /stats -- per-stage latency percentiles (whole server)\n"
+        " /session <id> -- switch to (or resume) another session")
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class GameServer:
+    """
+    Hosts many game sessions in one process behind a line-based TCP protocol.
+    - each session gets its own MemoryManager: working buffer, EpisodicStore under
+      <data_dir>/<session id>/, a GraphStore scoped to the session id (with the in-memory
+      backend, snapshotted to the same directory) and a MemoryWorker
+    - all sessions share one embedding model, one Neo4j driver (and its connection pool),
+      one LLMClient, and four thread pools: one for turns, one for background memory writes,
+      and one each for the episodic and graph lookups of get_world_context() (kept apart so
+      a turn waiting on its writes or lookups can never starve them, and a stuck graph
+      backend can't take the threads of the episodic search)
+
+    Protocol: the client sends one action or /command per line. Every reply is a block of
+    lines ended by a line holding a single "." (reply lines starting with "." get an extra
+    "."). The first reply on a connection is "SESSION <id>".
+    """
+
+    def __init__(self, llm: LLMClient = None, driver=None, embedding_model=None, embedding_model_name: str = None,
+                 data_dir: str = None, threads: int = None):
+        self.llm = LLMClient() if llm is None else llm
+        if driver is None and settings.GRAPH_BACKEND == "neo4j":
+            driver = make_driver()
+        self.driver = driver
+        if embedding_model is not None and embedding_model_name is None:
+            raise ValueError("pass embedding_model_name along with a custom embedding_model")
+        self.embedding_model = EMBEDDING_MODEL if embedding_model is None else embedding_model
+        self.embedding_model_name = embedding_model_name
+        self.data_dir = data_dir or settings.SESSIONS_DIR
+        threads = threads or settings.SERVER_THREADS
+        self.turn_pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="turn")
+        self.write_pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="memory-writer")
+        self.retrieval_pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="retrieval-episodic")
+        self.graph_pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="retrieval-graph")
+        self.sessions = {}   # session id -> MemoryManager
+        self._attached = {}  # session id -> open connections
+        self._locks = {}     # session id -> asyncio.Lock serialising its turns (kept for resumes)
+        self._sessions_lock = threading.Lock()
+
+    def warm_up(self):
+        self.embedding_model.start()
+        self.llm.warm_up()
+        if self.driver is not None:
+            self.driver.start()
+
+    # ---- sessions (blocking, run on the turn pool) ----
+
+    def open_session(self, session_id: str = None) -> MemoryManager:
+        session_id = session_id or uuid.uuid4().hex[:12]
+        with self._sessions_lock:
+            return self._open_session(session_id)
+
+    def _open_session(self, session_id: str) -> MemoryManager:
+        manager = self.sessions.get(session_id)
+        if manager is None:
+            path = os.path.join(self.data_dir, session_id)
+            os.makedirs(path, exist_ok=True)
+            manager = MemoryManager(
+                session_id=session_id,
+                llm=self.llm,
+                graph=make_graph_store(session_id, driver=self.driver, path=os.path.join(path, "graph.json")),
+                episodic=EpisodicStore(path=os.path.join(path, "episodic_store"), model=self.embedding_model,
+                                       model_name=self.embedding_model_name),
+                writer=MemoryWorker(name=f"session-{session_id}", executor=self.write_pool),
+                compactor=MemoryWorker(name=f"compact-{session_id}", executor=self.write_pool),
+                retrieval=self.retrieval_pool,
+                graph_retrieval=self.graph_pool,
+            )
+            self.sessions[session_id] = manager
+            log.info("Opened session %s (%d live)", session_id, len(self.sessions))
+        return manager
+
+    def close_session(self, session_id: str):
+        """Flush and drop a session from memory; its episodic files and graph stay for a later resume."""
+        with self._sessions_lock:
+            manager = self.sessions.pop(session_id, None)
+        if manager is not None:
+            manager.close()
+            log.info("Closed session %s (%d live)", session_id, len(self.sessions))
+
+    def dispatch(self, manager: MemoryManager, raw: str) -> str:
+        """Run one REPL-style line for a session and return the reply text."""
+        if not raw.startswith("/"):
+            try:
+                return manager.generate_and_update(raw)
+            except Exception as e:
+                log.exception("Session %s: error during generation", manager.session_id)
+                return f"Error during generation: {e}"
+
+        cmd = raw[1:].strip().lower()
+        if cmd == "help":
+            return HELP
+        if cmd.startswith("memory"):
+            parts = raw.split(" ", 1)
+            q = parts[1] if len(parts) > 1 else ""
+            return format_memory(manager.query_memory(q))
+        if cmd == "stats":
+            return ("=== Stage latency (rolling, all sessions) ===\n" + tracer.format() + "\n\nLLM scheduler: " +
+                    ", ".join(f"{k} {v}" for k, v in manager.llm.scheduler.stats().items()))
+        if cmd == "context":
+            return ("=== World Context ===\n" + (manager.get_world_context2() or "(no context)") +
+                    "\n\nLast prompt context: " + manager.assembler.format_report(manager.context_report))
+        if cmd == "reset":
+            manager.reset_memory()
+            return "--- All memory has been cleared. A new story can begin. ---"
+        if cmd == "dump":
+            lines = [format_memory(manager.query_memory2("", k=20)), "\n=== Working buffer ==="]
+            lines += [f"- Player: {e['player']} | DM: {e['dm'][:300]}" for e in manager.working_buffer]
+            return "\n".join(lines)
+        return "Unknown command. Type /help"
+
+    # ---- networking ----
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        loop = asyncio.get_running_loop()
+        session_id = None
+        try:
+            session_id = await self._attach(None)
+            await self._reply(writer, f"SESSION {session_id}")
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                raw = line.decode("utf-8", "replace").strip()
+                if not raw:
+                    continue
+                lowered = raw.lower()
+                if lowered in ("/quit", "/exit"):
+                    await self._reply(writer, "Exiting.")
+                    break
+                if lowered.startswith("/session"):
+                    parts = raw.split()
+                    if len(parts) != 2 or not _SESSION_ID.match(parts[1]):
+                        await self._reply(writer, "Usage: /session <id>  (letters, digits, _ and -)")
+                        continue
+                    await self._detach(session_id)
+                    session_id = None
+                    session_id = await self._attach(parts[1])
+                    await self._reply(writer, f"SESSION {session_id}")
+                    continue
+                async with self._locks[session_id]:
+                    # a concurrent detach may have closed the session in between; reopen it
+                    manager = self.sessions.get(session_id) or await loop.run_in_executor(
+                        self.turn_pool, self.open_session, session_id)
+                    reply = await loop.run_in_executor(self.turn_pool, self.dispatch, manager, raw)
+                await self._reply(writer, reply)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if session_id is not None:
+                await self._detach(session_id)
+            writer.close()
+
+    async def _attach(self, session_id):
+        loop = asyncio.get_running_loop()
+        manager = await loop.run_in_executor(self.turn_pool, self.open_session, session_id)
+        sid = manager.session_id
+        self._attached[sid] = self._attached.get(sid, 0) + 1
+        self._locks.setdefault(sid, asyncio.Lock())
+        return sid
+
+    async def _detach(self, session_id):
+        self._attached[session_id] -= 1
+        if self._attached[session_id] == 0:
+            del self._attached[session_id]
+            loop = asyncio.get_running_loop()
+            async with self._locks[session_id]:
+                if session_id not in self._attached:  # nobody re-attached while we waited
+                    await loop.run_in_executor(self.turn_pool, self.close_session, session_id)
+
+    @staticmethod
+    async def _reply(writer: asyncio.StreamWriter, text: str):
+        lines = ["." + l if l.startswith(".") else l for l in text.split("\n")]
+        writer.write(("\n".join(lines) + "\n.\n").encode("utf-8"))
+        await writer.drain()
+
+    async def start(self, host: str = None, port: int = None):
+        self.warm_up()
+        server = await asyncio.start_server(self.handle, host or settings.SERVER_HOST,
+                                            settings.SERVER_PORT if port is None else port)
+        log.info("Serving on %s", ", ".join(str(s.getsockname()) for s in server.sockets))
+        return server
+
+    def shutdown(self):
+        for session_id in list(self.sessions):
+            self.close_session(session_id)
+        self.turn_pool.shutdown(wait=True)
+        self.write_pool.shutdown(wait=True)
+        self.retrieval_pool.shutdown(wait=True)
+        self.graph_pool.shutdown(wait=True)
+        if self.driver is not None and self.driver.ready:
+            try:
+                self.driver.get().close()
+            except Exception:
+                pass
+
+
+async def serve(host: str = None, port: int = None):
+    game = GameServer()
+    server = await game.start(host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        game.shutdown()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Multi-session Dungeon Master server")
+    ap.add_argument("--host", default=None)
+    ap.add_argument("--port", type=int, default=None)
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
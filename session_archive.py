@@ -0,0 +1,129 @@
+import io
+import json
+import time
+import logging
+import zipfile
+import numpy as np
+from tracing import tracer
+
+log = logging.getLogger("session_archive")
+
+FORMAT = "dm-session"
+VERSION = 1
+
+
+def export_session(manager, path: str, progress=None) -> dict:
+    """
+    Write a MemoryManager's working buffer, episodic store and graph to one zip archive:
+    - manifest.json   format, version, embedding model name and the width of its vectors,
+                      and the counts below
+    - working.json    the working buffer, oldest turn first
+    - episodes.jsonl  one {"id", "text", "metadata"} record per episode
+    - embeddings.f32  their float32 embeddings, row by row (stored uncompressed)
+    - graph.json      GraphStore.export_graph() of the session
+    Embeddings whose width doesn't match the store's model (written by another model under
+    the same name) are left out, so they are encoded again on import. Pending memory writes
+    are flushed first. `progress(stage, done, total)` is called as each part is written.
+    Returns the manifest.
+    """
+    with tracer.span("session.export") as span:
+        manager.flush()
+        manager.compactor.flush()
+        working = list(manager.working_buffer)
+        records, vectors = manager.episodic.export_events()
+        dim = manager.episodic.embedding_dim if vectors is not None else 0
+        if vectors is not None and vectors.shape[1] != dim:
+            log.warning("Episodic embeddings of session %s are %d-d but %s gives %d-d; leaving them out",
+                        manager.session_id, vectors.shape[1], manager.episodic.model_name, dim)
+            vectors = None
+        graph = manager.graph.export_graph()
+        manifest = {
+            "format": FORMAT,
+            "version": VERSION,
+            "session_id": manager.session_id,
+            "created": time.time(),
+            "model": manager.episodic.model_name,
+            "dim": dim,
+            "turns": len(working),
+            "episodes": len(records),
+            "nodes": len(graph.get("nodes", [])),
+            "edges": len(graph.get("edges", [])),
+        }
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("manifest.json", json.dumps(manifest, indent=2))
+            zf.writestr("working.json", json.dumps(working, ensure_ascii=False))
+            _report(progress, "working", len(working), len(working))
+            zf.writestr("episodes.jsonl", "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+            if vectors is not None:
+                zf.writestr("embeddings.f32", np.ascontiguousarray(vectors, dtype=np.float32).tobytes(),
+                            compress_type=zipfile.ZIP_STORED)
+            _report(progress, "episodes", len(records), len(records))
+            zf.writestr("graph.json", json.dumps(graph, ensure_ascii=False, default=str))
+            _report(progress, "graph", manifest["nodes"], manifest["nodes"])
+        span.set(episodes=len(records), nodes=manifest["nodes"])
+    log.info("Exported session %s to %s: %d turns, %d episodes, %d nodes, %d edges", manager.session_id,
+             path, manifest["turns"], manifest["episodes"], manifest["nodes"], manifest["edges"])
+    return manifest
+
+
+def import_session(manager, path: str, batch_size: int = None, reembed: bool = False, progress=None) -> dict:
+    """
+    Replace a MemoryManager's working buffer, episodic store and graph with an archive
+    written by export_session(). The stored embeddings are reused when they come from a
+    model of the same name and width as this store's; otherwise (or with `reembed`) the
+    episodes are encoded again in batches of `batch_size` (settings.EMBED_BATCH_SIZE).
+    The graph is loaded in bulk (UNWIND batches on Neo4j). Returns the manifest.
+    """
+    with tracer.span("session.import") as span, zipfile.ZipFile(path, "r") as zf:
+        manifest = json.loads(zf.read("manifest.json"))
+        if manifest.get("format") != FORMAT:
+            raise ValueError(f"{path} is not a session archive")
+        if manifest.get("version", 0) > VERSION:
+            raise ValueError(f"{path} was written by a newer version (archive format {manifest['version']}, "
+                             f"this build reads up to {VERSION})")
+        working = json.loads(zf.read("working.json"))
+        with zf.open("episodes.jsonl") as f:
+            records = [json.loads(line) for line in io.TextIOWrapper(f, encoding="utf-8") if line.strip()]
+        graph = json.loads(zf.read("graph.json"))
+
+        vectors = None
+        dim = manifest.get("dim", 0)
+        if records and not reembed and manifest.get("model") == manager.episodic.model_name \
+                and "embeddings.f32" in zf.namelist():
+            live_dim = manager.episodic.embedding_dim
+            vectors = np.frombuffer(zf.read("embeddings.f32"), dtype=np.float32)
+            if dim != live_dim:
+                log.warning("Embeddings in %s are %d-d but %s gives %d-d here; encoding them again",
+                            path, dim, manager.episodic.model_name, live_dim)
+                vectors = None
+            elif dim <= 0 or vectors.size != len(records) * dim:
+                log.warning("Embeddings in %s don't match its episodes; encoding them again", path)
+                vectors = None
+            else:
+                vectors = vectors.reshape(len(records), dim)
+
+        manager.flush()
+        manager.compactor.flush()
+        encoded = bool(records) and vectors is None
+        if encoded:
+            vectors = manager.episodic.encode_many(
+                [r["text"] for r in records], batch_size,
+                None if progress is None else lambda done, total: progress("embedding", done, total))
+        manager.episodic.import_events(records, vectors if records else None)
+        _report(progress, "episodes", len(records), len(records))
+
+        manager.graph.import_graph(graph)
+        _report(progress, "graph", len(graph.get("nodes", [])), len(graph.get("nodes", [])))
+
+        manager.working_buffer.clear()
+        manager.working_buffer.extend(working)
+        _report(progress, "working", len(working), len(working))
+        span.set(episodes=len(records), nodes=len(graph.get("nodes", [])), encoded=encoded)
+    log.info("Imported session %s from %s: %d turns, %d episodes, %d nodes", manifest.get("session_id"),
+             path, len(working), len(records), len(graph.get("nodes", [])))
+    return manifest
+
+
+def _report(progress, stage: str, done: int, total: int):
+    if progress is not None:
+        progress(stage, done, total)
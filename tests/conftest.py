@@ -0,0 +1,61 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the modules live at the repository root; the fakes (FakeChatModel, HashEncoder) in benchmarks/
+for path in (ROOT, os.path.join(ROOT, "benchmarks")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+NO_ENTITIES = '{"entities": [], "relationships": []}'
+
+
+@pytest.fixture
+def make_store(tmp_path):
+    """
+    make_store(name, model=None, model_name=None, **kwargs) -> EpisodicStore under tmp_path.
+    The model defaults to a HashEncoder (`dim`); model_name to the model's `name`.
+    """
+    from common import HashEncoder
+    from lazy import LazyResource
+    from vector_store import EpisodicStore
+    stores = []
+
+    def make(name: str = "episodic_store", model=None, model_name: str = None, dim: int = 384, **kwargs):
+        model = HashEncoder(dim) if model is None else model
+        store = EpisodicStore(path=os.path.join(tmp_path, name), model=LazyResource.of(model, "embedding model"),
+                              model_name=model_name or model.name, **kwargs)
+        stores.append(store)
+        return store
+    yield make
+    for store in stores:
+        store.close()
+
+
+@pytest.fixture
+def make_manager(make_store):
+    """
+    make_manager(session_id, story=None, extractor=None, graph=None, episodic=None, **kwargs)
+    -> MemoryManager on fakes: FakeChatModel story and extraction models (a silent DM and an
+    extractor that finds nothing unless given), an InMemoryGraphStore and a make_store()
+    store. Other keyword arguments go to MemoryManager. Managers are closed after the test.
+    """
+    from fake_llm import FakeChatModel
+    from llm_client import LLMClient
+    from memory_graph import InMemoryGraphStore
+    from memory_manager import MemoryManager
+    managers = []
+
+    def make(session_id: str = "game", story=None, extractor=None, graph=None, episodic=None, **kwargs):
+        llm = LLMClient(story_llm=story or FakeChatModel(lambda prompt: ""),
+                        extractor_llm=extractor or FakeChatModel(lambda prompt: NO_ENTITIES))
+        manager = MemoryManager(session_id=session_id, llm=llm,
+                                graph=InMemoryGraphStore(session_id) if graph is None else graph,
+                                episodic=make_store(session_id) if episodic is None else episodic, **kwargs)
+        managers.append(manager)
+        return manager
+    yield make
+    for manager in managers:
+        manager.close()
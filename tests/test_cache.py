@@ -0,0 +1,126 @@
+"""
+ContentCache: least-recently-used eviction, the disk tier surviving a restart, and the
+embedding / extraction caches missing when the model that produced an entry changes.
+"""
+import json
+import uuid
+
+import pytest
+
+from cache import ContentCache, make_key
+from common import HashEncoder
+from fake_llm import FakeChatModel
+from llm_client import LLMClient
+
+
+def text_cache(max_bytes: int = 30, directory: str = "") -> ContentCache:
+    return ContentCache("test", dumps=str.encode, loads=bytes.decode, max_bytes=max_bytes, directory=directory)
+
+
+class CountingEncoder(HashEncoder):
+    """HashEncoder under another name, counting the texts it encodes."""
+
+    def __init__(self, dim: int, name: str):
+        super().__init__(dim)
+        self.name = name
+        self.encoded = []
+
+    def encode(self, sentences, **kwargs):
+        self.encoded.extend([sentences] if isinstance(sentences, str) else sentences)
+        return super().encode(sentences, **kwargs)
+
+
+def test_make_key_separates_its_parts():
+    assert make_key("a", "bc") != make_key("ab", "c")
+    assert make_key("model", 1, "text") == make_key("model", "1", "text")
+    assert len(make_key()) == 64
+
+
+def test_evicts_the_least_recently_used():
+    cache = text_cache(max_bytes=30)
+    for key in "abc":
+        cache.put(key, key * 10)
+    assert cache.get("a") == "a" * 10  # a is now the most recently used
+    cache.put("d", "d" * 10)
+    assert cache.get("b") is None
+    assert [cache.get(k) for k in "acd"] == ["a" * 10, "c" * 10, "d" * 10]
+    cache.put("e", "e" * 10)
+    assert cache.get("a") is None and cache.get("e") == "e" * 10
+    stats = cache.stats()
+    assert stats["entries"] == 3 and stats["bytes"] == 30 and stats["evictions"] == 2
+    assert (stats["hits"], stats["misses"]) == (5, 2)
+
+
+def test_replacing_an_entry_and_oversized_values():
+    cache = text_cache(max_bytes=30)
+    cache.put("a", "a" * 10)
+    cache.put("a", "A" * 20)
+    assert cache.get("a") == "A" * 20 and cache.stats()["bytes"] == 20
+    cache.put("big", "x" * 31)  # larger than the whole cache: not kept, and nothing evicted for it
+    assert cache.get("big") is None and cache.get("a") == "A" * 20
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    cache = text_cache(max_bytes=30, directory=str(tmp_path))
+    for key in "abcd":
+        cache.put(key, key * 10)
+    assert cache.stats()["entries"] == 3
+    assert cache.get("a") == "a" * 10 and cache.stats()["disk_hits"] == 1  # evicted, read back from disk
+
+    restarted = text_cache(max_bytes=30, directory=str(tmp_path))
+    assert restarted.get("c") == "c" * 10
+    assert restarted.get("c") == "c" * 10
+    assert restarted.get("missing") is None
+    stats = restarted.stats()
+    assert (stats["disk_hits"], stats["hits"], stats["misses"]) == (1, 1, 1)
+    restarted.clear()  # clears the memory tier only
+    assert restarted.stats()["entries"] == 0 and restarted.get("d") == "d" * 10
+    # caches with another name keep their own directory
+    other = ContentCache("other", dumps=str.encode, loads=bytes.decode, max_bytes=30, directory=str(tmp_path))
+    assert other.get("c") is None
+
+
+def test_embeddings_are_cached_per_model(make_store):
+    first, second = CountingEncoder(16, f"first-{uuid.uuid4().hex}"), CountingEncoder(16, f"second-{uuid.uuid4().hex}")
+    text = f"The lantern flickers ({uuid.uuid4().hex})."
+    a = make_store("a", model=first)
+    a.add_event(text)
+    a.query(text, k=1)
+    assert first.encoded == [text]  # the query hit the embedding cache
+
+    # same dimension, different model: its own encoding, not the first model's vector
+    make_store("b", model=second).add_event(text)
+    assert second.encoded == [text]
+
+    # the same model under the same name shares the entries
+    make_store("c", model=first).add_event(text)
+    assert first.encoded == [text]
+
+
+def test_custom_embedding_model_needs_a_name(tmp_path):
+    from vector_store import EpisodicStore
+    with pytest.raises(ValueError):
+        EpisodicStore(path=str(tmp_path / "store"), model=HashEncoder(16))
+
+
+def test_extractions_are_cached_per_model():
+    reply = json.dumps({"entities": [{"name": "Kael", "type": "Player"}], "relationships": []})
+    first = FakeChatModel(lambda prompt: reply, model_name="first")
+    llm = LLMClient(story_llm=FakeChatModel(), extractor_llm=first)
+    assert llm.extract_entities("Kael waits.") == llm.extract_entities("Kael waits.")
+    assert first.calls == 1
+
+    other = FakeChatModel(lambda prompt: reply, model_name="second")
+    shared = LLMClient(story_llm=FakeChatModel(), extractor_llm=other)
+    shared.extract_cache = llm.extract_cache  # as with a shared disk tier
+    shared.extract_entities("Kael waits.")
+    assert other.calls == 1
+    renamed = LLMClient(story_llm=FakeChatModel(), extractor_llm=other, model_name="first")
+    renamed.extract_cache = llm.extract_cache
+    renamed.extract_entities("Kael waits.")
+    assert other.calls == 1
+
+    unnamed = FakeChatModel(lambda prompt: reply, model_name="")
+    with pytest.raises(ValueError):
+        LLMClient(story_llm=FakeChatModel(), extractor_llm=unnamed)
+    assert llm.extract_cache.stats()["hit_rate"] == pytest.approx(2 / 4)
@@ -0,0 +1,195 @@
+"""
+Near-duplicate dropping and consolidation of the episodic store: what is dropped, what is
+merged into which summary, and that nothing else is lost on the way.
+"""
+import threading
+import uuid
+
+import numpy as np
+import pytest
+
+from config import settings
+from consolidation import cap_groups, extractive_summary, parse_tiers, plan_groups, tier_of
+
+DIM = 8
+
+
+def similar(cos: float, axis: int = 0) -> np.ndarray:
+    """A unit vector at cosine `cos` to the basis vector e[axis], leaning towards e[axis + 1]."""
+    v = np.zeros(DIM, dtype=np.float32)
+    v[axis] = cos
+    v[(axis + 1) % DIM] = np.sqrt(1 - cos ** 2)
+    return v
+
+
+class TableEncoder:
+    """Encodes the texts of `table` to their given vectors and anything else to e[DIM - 1]."""
+
+    def __init__(self, table: dict):
+        self.table = table
+        self.name = f"table-{uuid.uuid4().hex[:8]}"  # keeps its vectors out of other tests' cache entries
+
+    def get_sentence_embedding_dimension(self):
+        return DIM
+
+    def encode(self, sentences, convert_to_numpy=True, normalize_embeddings=True, **kwargs):
+        single = isinstance(sentences, str)
+        rows = [self.table.get(t, np.eye(DIM, dtype=np.float32)[-1]) for t in ([sentences] if single else sentences)]
+        out = np.stack(rows).astype(np.float32)
+        return out[0] if single else out
+
+
+@pytest.fixture
+def store(make_store, monkeypatch):
+    monkeypatch.setattr(settings, "EPISODIC_DEDUP_THRESHOLD", 0.0)
+    monkeypatch.setattr(settings, "EPISODIC_AGE_TIERS", "")
+    monkeypatch.setattr(settings, "EPISODIC_MAX_EPISODES", 0)
+    monkeypatch.setattr(settings, "EPISODIC_MAX_CLUSTER", 8)
+    return lambda table=None, name="episodic_store": make_store(name, model=TableEncoder(table or {}))
+
+
+def texts_of(store) -> list:
+    return list(store.texts)
+
+
+# ---- near-duplicates ----
+
+def test_near_duplicates_are_dropped_at_the_threshold(store, monkeypatch):
+    monkeypatch.setattr(settings, "EPISODIC_DEDUP_THRESHOLD", 0.97)
+    s = store({"gate": similar(1.0), "gate again": similar(0.975), "gate nearby": similar(0.965)})
+    assert s.add_event("gate") == 0
+    assert s.add_event("gate again") is None
+    assert s.add_event("gate nearby") == 1
+    assert s.add_event("something else") == 2
+    assert texts_of(s) == ["gate", "gate nearby", "something else"]
+    assert s.duplicates_dropped == 1
+
+
+def test_add_events_drops_duplicates_within_the_batch(store, monkeypatch):
+    monkeypatch.setattr(settings, "EPISODIC_DEDUP_THRESHOLD", 0.97)
+    s = store({"a": similar(1.0), "b": similar(0.99), "c": similar(1.0, axis=2)})
+    assert s.add_events(["a", "b", "c", "a"]) == [0, None, 1, None]
+    assert texts_of(s) == ["a", "c"] and s.duplicates_dropped == 2
+
+
+def test_dedup_off_keeps_everything(store):
+    s = store({"a": similar(1.0)})
+    assert s.add_events(["a", "a", "a"]) == [0, 1, 2]
+
+
+# ---- grouping ----
+
+def test_parse_tiers_and_tier_of():
+    tiers = parse_tiers("2000:0.75, 200:0.85")
+    assert tiers == [(200, 0.85), (2000, 0.75)]
+    assert tier_of(np.array([0, 199, 200, 1999, 2000, 5000]), tiers).tolist() == [-1, -1, 0, 0, 1, 1]
+    assert tier_of(np.array([5, 500]), []).tolist() == [-1, -1]
+
+
+def test_plan_groups_uses_the_younger_rows_threshold():
+    vectors = np.stack([similar(1.0), similar(0.9), similar(1.0, axis=3), similar(0.95, axis=3)])
+    tiers = [(1, 0.92), (5, 0.85)]
+    fresh = np.ones(4, dtype=bool)
+    # rows 0/1 (cos 0.9) only merge if both are in the 0.85 tier; rows 2/3 (cos 0.95) merge in either
+    assert plan_groups(vectors, np.array([1, 1, 0, 0]), tiers, fresh, 8) == [[0, 1], [2, 3]]
+    assert plan_groups(vectors, np.array([1, 0, 0, 0]), tiers, fresh, 8) == [[2, 3]]
+    # too young for any tier, or nothing fresh: nothing to do
+    assert plan_groups(vectors, np.array([-1, -1, 0, 0]), tiers, fresh, 8) == [[2, 3]]
+    assert plan_groups(vectors, np.array([1, 1, 0, 0]), tiers, np.zeros(4, dtype=bool), 8) == []
+
+
+def test_plan_groups_respects_max_group():
+    vectors = np.stack([similar(c) for c in (1.0, 0.99, 0.98, 0.97, 0.96)])
+    groups = plan_groups(vectors, np.zeros(5, dtype=int), [(0, 0.9)], np.ones(5, dtype=bool), 2)
+    assert groups and all(len(g) <= 2 for g in groups)
+    assert len({r for g in groups for r in g}) == sum(len(g) for g in groups)
+
+
+def test_cap_groups_pairs_the_oldest_free_rows():
+    assert cap_groups(10, [], 6) == [[0, 1], [2, 3], [4, 5], [6, 7]]
+    assert cap_groups(10, [[0, 1]], 6) == [[0, 1], [2, 3], [4, 5], [6, 7]]
+    assert cap_groups(10, [[3, 4, 5]], 6) == [[0, 1], [2, 6], [3, 4, 5]]
+    assert cap_groups(10, [], 0) == [] and cap_groups(4, [], 6) == []
+
+
+def test_extractive_summary_keeps_what_the_episodes_share():
+    texts = ["Mira guards the Old Mill. It rains.",
+             "Mira guards the Old Mill at night. A wolf howls.",
+             "The Old Mill burns. Mira guards the Old Mill."]
+    summary = extractive_summary(texts, max_sentences=2)
+    assert summary.startswith("Mira guards the Old Mill.")
+    assert summary.count("Mira guards") == 1
+    assert len(extractive_summary(texts * 20, max_sentences=50, max_chars=60)) <= 62
+    assert extractive_summary([]) == ""
+
+
+# ---- consolidate() ----
+
+def test_similar_old_episodes_become_one_summary(store, monkeypatch):
+    monkeypatch.setattr(settings, "EPISODIC_AGE_TIERS", "3:0.9")
+    s = store({"old a": similar(1.0), "old b": similar(0.95), "young a": similar(1.0, axis=4),
+               "young b": similar(0.99, axis=4)})
+    s.add_events(["old a", "old b", "far", "between", "young a", "young b"],
+                 [{"ts": 10 + i} for i in range(6)])
+    result = s.consolidate(summarize=lambda texts: " + ".join(texts))
+    assert result["summaries"] == 1 and result["before"] == 6 and result["after"] == 5
+    assert texts_of(s) == ["old a + old b", "far", "between", "young a", "young b"]
+    meta = s.metadatas[0]
+    assert meta["summary"] and meta["source_ids"] == [0, 1] and meta["count"] == 2
+    assert (meta["ts"], meta["ts_end"]) == (10, 11)
+    assert s.ids[1:] == [2, 3, 4, 5]
+
+
+def test_max_episodes_merges_the_oldest(store, monkeypatch):
+    monkeypatch.setattr(settings, "EPISODIC_MAX_EPISODES", 4)
+    s = store({f"e{i}": similar(1.0, axis=i) for i in range(6)})
+    s.add_events([f"e{i}" for i in range(6)])
+    assert s.consolidate()["after"] == 4
+    assert [m.get("source_ids") for m in s.metadatas] == [[0, 1], [2, 3], None, None]
+    assert texts_of(s)[2:] == ["e4", "e5"]
+
+
+def test_source_ids_of_a_summary_of_summaries(store, monkeypatch):
+    monkeypatch.setattr(settings, "EPISODIC_MAX_EPISODES", 2)
+    s = store({f"e{i}": similar(1.0, axis=i) for i in range(6)})
+    s.add_events([f"e{i}" for i in range(4)])
+    s.consolidate()
+    s.add_events(["e4", "e5"])
+    s.consolidate()
+    # the first summaries took ids 4 and 5, so e4 and e5 came in as 6 and 7
+    assert [m.get("source_ids") for m in s.metadatas] == [[0, 1, 2, 3], [6, 7]]
+    assert [m.get("count") for m in s.metadatas] == [4, 2]
+
+
+def test_summarizer_failure_falls_back_to_the_extractive_summary(store, monkeypatch):
+    monkeypatch.setattr(settings, "EPISODIC_MAX_EPISODES", 1)
+    s = store()
+    s.add_events(["Kael crosses the Bridge.", "Kael crosses the Bridge again."])
+
+    def broken(texts):
+        raise RuntimeError("LLM down")
+    s.consolidate(summarize=broken)
+    assert texts_of(s) == [extractive_summary(["Kael crosses the Bridge.", "Kael crosses the Bridge again."])]
+
+
+def test_episodes_added_during_compaction_survive_the_swap(store, monkeypatch):
+    monkeypatch.setattr(settings, "EPISODIC_MAX_EPISODES", 2)
+    table = {f"e{i}": similar(1.0, axis=i) for i in range(DIM)}
+    s = store(table)
+    s.add_events(["e0", "e1", "e2", "e3"])
+
+    def summarize(texts):
+        # another thread (the memory writer) adds episodes while the summaries are written
+        if len(s) == 4:
+            writer = threading.Thread(target=s.add_events, args=(["e5", "e6"],))
+            writer.start()
+            writer.join()
+        return "+".join(texts)
+    s.consolidate(summarize=summarize)
+    assert texts_of(s) == ["e0+e1", "e2+e3", "e5", "e6"]
+    assert s.ids[2:] == [4, 5] and len(set(s.ids)) == 4
+    assert s.query("e6", k=1)[0]["text"] == "e6"
+
+    reopened = store(table, name="episodic_store")
+    assert texts_of(reopened) == texts_of(s) and reopened.ids == s.ids
+    assert [m.get("source_ids") for m in reopened.metadatas] == [[0, 1], [2, 3], None, None]
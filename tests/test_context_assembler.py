@@ -0,0 +1,113 @@
+"""
+The story prompt's world context must stay under its token budget, give up the least
+important lines first, and reuse the rendered text of sections that did not change.
+"""
+import pytest
+
+from config import settings
+from context_assembler import (ContextAssembler, Section, TokenCounter, LAST_TURN, WORLD_FACTS, EPISODES,
+                               EARLIER_TURNS)
+
+TURNS = [f"- Player: I open door {i} | DM: Door {i} creaks open onto a dusty hall." for i in range(6)]
+EVENTS = [f"- Goblin {i} fled from the mill towards the river, dropping a sack of stolen grain, "
+          f"two rusty knives and a map of the old tunnels under the village square." for i in range(3)]
+FACTS = [f"Npc 'Mira' OWNS Item 'Key {i}'" for i in range(4)]
+
+
+def sections(facts=FACTS) -> list:
+    newest = len(TURNS) - 1
+    return [
+        Section("recent", "Recent actions and DM responses:", TURNS,
+                [LAST_TURN if i == newest else EARLIER_TURNS + newest - i for i in range(len(TURNS))]),
+        Section("events", "Recent relevant events:", EVENTS, EPISODES),
+        Section("facts", "Relevant world facts and relationships:", facts, WORLD_FACTS),
+    ]
+
+
+def cost(counter: TokenCounter, header: str, lines: list) -> int:
+    """What the assembler charges for `lines` (and `header`, if given) of one section."""
+    return (counter.count(header) + 2 if header else 0) + sum(counter.count(line) + 1 for line in lines)
+
+
+@pytest.fixture
+def assembler():
+    return ContextAssembler(budget=10_000, counter=TokenCounter())
+
+
+def test_everything_fits(assembler):
+    text = assembler.assemble(sections())
+    assert all(line in text for line in TURNS + EVENTS + FACTS)
+    assert assembler.last_report["total"] <= assembler.budget
+    assert assembler.last_report["recent"]["dropped"] == 0
+
+
+def test_last_turn_and_facts_come_first(assembler):
+    c, (recent, events, facts) = assembler.counter, sections()
+    assembler.budget = cost(c, recent.header, TURNS[-1:]) + cost(c, facts.header, FACTS) + 10
+    text = assembler.assemble([recent, events, facts])
+    report = assembler.last_report
+    assert TURNS[-1] in text and all(f in text for f in FACTS)
+    assert not any(t in text for t in TURNS[:-1])
+    assert report["events"]["lines"] == 0 and report["recent"]["dropped"] == len(TURNS) - 1
+    assert report["total"] <= assembler.budget
+
+
+def test_oldest_turns_are_dropped_first(assembler):
+    c, (recent, events, facts) = assembler.counter, sections()
+    assembler.budget = (cost(c, recent.header, TURNS[-3:]) + cost(c, events.header, EVENTS)
+                        + cost(c, facts.header, FACTS))
+    text = assembler.assemble([recent, events, facts])
+    assert all(line in text for line in TURNS[-3:] + EVENTS + FACTS)
+    assert not any(t in text for t in TURNS[:-3])
+    assert assembler.last_report["total"] <= assembler.budget
+
+
+def test_a_line_that_does_not_fit_is_cut(assembler):
+    c, (recent, events, facts) = assembler.counter, sections()
+    assembler.budget = (cost(c, recent.header, TURNS[-1:]) + cost(c, facts.header, FACTS)
+                        + cost(c, events.header, EVENTS[:1]) + 20)
+    text = assembler.assemble([recent, events, facts])
+    report = assembler.last_report
+    assert EVENTS[0] in text
+    assert report["events"]["truncated"] == 1 and report["events"]["lines"] == 2
+    cut = text.split(EVENTS[0] + "\n")[1].split("\n")[0]
+    assert cut.endswith(" …") and EVENTS[1].startswith(cut[:-2])
+    assert report["total"] <= assembler.budget
+
+
+def test_unchanged_sections_are_reused(assembler):
+    first = assembler.assemble(sections())
+    assert not any(r["cached"] for r in assembler.last_report.values() if isinstance(r, dict))
+    assert assembler.assemble(sections()) == first
+    assert all(r["cached"] for r in assembler.last_report.values() if isinstance(r, dict))
+    assembler.assemble(sections(facts=FACTS + ["Npc 'Mira' FEARS Creature 'Goblin'"]))
+    report = assembler.last_report
+    assert report["recent"]["cached"] and report["events"]["cached"] and not report["facts"]["cached"]
+
+
+def test_long_game_stays_under_budget(monkeypatch, make_manager):
+    from fake_llm import FakeChatModel
+    from replay import SyntheticWorld
+
+    budget, turns = 600, 2000
+    monkeypatch.setattr(settings, "CONTEXT_TOKEN_BUDGET", budget)
+    # let every episodic hit through so all sections compete for the budget
+    monkeypatch.setattr(settings, "SIMILARITY_THRESHOLD", -1.0)
+    monkeypatch.setattr(settings, "CACHE_DIR", "")
+    world = SyntheticWorld()
+    manager = make_manager("budget", story=FakeChatModel(world.story), extractor=FakeChatModel(world.extraction),
+                           working_capacity=12)
+    assemble = manager.assembler.assemble
+    built = []
+    manager.assembler.assemble = lambda secs: built.append(assemble(secs)) or built[-1]
+    worst, seen, cached = 0, set(), 0
+    for t in range(turns):
+        manager.generate_and_update(world.action(t))
+        # count the string that went into the prompt, not the assembler's own bookkeeping
+        worst = max(worst, manager.assembler.counter.count(built.pop()))
+        report = manager.context_report
+        seen.update(name for name, r in report.items() if isinstance(r, dict) and r["lines"])
+        cached += any(r["cached"] for r in report.values() if isinstance(r, dict))
+    assert worst <= budget
+    assert seen == {"recent", "events", "facts"}
+    assert cached > 0
@@ -0,0 +1,93 @@
+"""
+Spotting known entity names in free text: whole words only, case- and plural-insensitive,
+overlapping names, and names added after earlier find() calls.
+"""
+import pytest
+
+from entity_spotter import EntitySpotter, normalize
+from memory_graph import InMemoryGraphStore
+
+
+def spotter(*names) -> EntitySpotter:
+    s = EntitySpotter()
+    s.add_many(names)
+    return s
+
+
+def test_normalize():
+    assert normalize("the Goblins' caves") == "the goblin cave"
+    assert normalize("Rubies, BOXES and Kael's torches!") == "ruby box and kael torch"
+    assert normalize("Glass moss status") == "glass moss status"
+
+
+@pytest.mark.parametrize("text, found", [
+    ("Kael waits.", ["Kael"]),
+    ("Kaelith waits.", []),
+    ("(Kael), Kael's sword, KAEL!", ["Kael"]),
+    ("The millstone turns.", []),
+    ("The mill-stone turns.", ["Mill"]),
+])
+def test_whole_words_only(text, found):
+    assert spotter("Kael", "Mill").find(text) == found
+
+
+@pytest.mark.parametrize("text", ["the old mill", "THE OLD MILL", "The Old Mills", "the OLD mill's door"])
+def test_case_and_plurals_are_ignored(text):
+    assert spotter("Old Mill").find(text) == ["Old Mill"]
+
+
+def test_casefold_beyond_ascii():
+    assert spotter("Straße").find("THE STRASSE IS EMPTY") == ["Straße"]
+
+
+def test_overlapping_names_are_all_found_longest_first():
+    s = spotter("Mill", "Old Mill", "Old Mill Road", "Mira Vale", "Vale Keep")
+    # ordered by where each match ends, the longer name first when two end together
+    assert s.find("Down the Old Mill Road") == ["Old Mill", "Mill", "Old Mill Road"]
+    assert s.find("Mira Vale Keep") == ["Mira Vale", "Vale Keep"]
+
+
+def test_first_mention_order_and_no_repeats():
+    s = spotter("Kael", "Mira", "Bridge")
+    assert s.find("Mira sees the bridge. Kael follows Mira over the Bridge.") == ["Mira", "Bridge", "Kael"]
+
+
+def test_names_that_normalise_alike_are_all_returned():
+    s = spotter("Goblin", "goblins", "Goblin")
+    assert len(s) == 2 and "goblins" in s
+    assert s.find("A goblin!") == ["Goblin", "goblins"]
+
+
+def test_names_added_between_finds_are_picked_up():
+    s = EntitySpotter()
+    names = [f"Tower {chr(ord('A') + i // 26)}{chr(ord('a') + i % 26)}" for i in range(100)]
+    for i, name in enumerate(names):
+        s.add(name)
+        assert s.find(f"We climb {name}.") == [name]
+        assert s.find(f"{names[0]} and {name}") == ([names[0]] if i == 0 else [names[0], name])
+        # every level is larger than the newer ones after it, so there are at most log2(n) + 1
+        sizes = [len(level.patterns) for level in s._levels]
+        assert sizes == sorted(sizes, reverse=True) and len(set(sizes)) == len(sizes)
+        assert sum(sizes) == i + 1
+    assert len(s._levels) <= 7
+    assert s.find(" ".join(reversed(names))) == list(reversed(names))
+
+
+def test_clear_forgets_everything():
+    s = spotter("Kael")
+    s.find("Kael")
+    s.clear()
+    assert len(s) == 0 and s.find("Kael") == []
+    s.add("Mira")
+    assert s.find("Kael and Mira") == ["Mira"]
+
+
+def test_graph_store_spots_entities_as_they_are_merged():
+    graph = InMemoryGraphStore("spotter")
+    graph.merge_entity("Kael", "Character")
+    assert graph.find_entities("Kael enters the Old Mill.") == ["Kael"]
+    graph.apply_extraction([{"name": "Old Mill", "type": "Location"}],
+                           [{"source": "Kael", "target": "Old Mill", "relation": "VISITS"}])
+    assert graph.find_entities("Kael enters the Old Mill.") == ["Kael", "Old Mill"]
+    graph.clear_graph()
+    assert graph.find_entities("Kael enters the Old Mill.") == []
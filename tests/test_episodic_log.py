@@ -0,0 +1,73 @@
+"""
+The episodic store's two append-only files (<path>.jsonl records, <path>.f32 embedding rows)
+must always pair each record with its own row: after a failed append, and after a crash
+that tore either file mid-record.
+"""
+import os
+
+import pytest
+
+TEXTS = [f"Player: I light torch {i}\nDM: Shadows dance on wall {i}." for i in range(6)]
+
+
+def assert_paired(store, texts):
+    """Every text is its own nearest neighbour, so each record still has its own embedding."""
+    assert list(store.texts) == texts
+    for text in texts:
+        assert store.query(text, k=1)[0]["text"] == text
+
+
+def sizes(store):
+    return os.path.getsize(store.log_path), os.path.getsize(store.emb_path)
+
+
+@pytest.mark.parametrize("precision", ["float32", "int8"])
+def test_failed_append_leaves_no_trace(make_store, precision):
+    store = make_store(precision=precision)
+    store.add_events(TEXTS[:3])
+    before = sizes(store)
+
+    def broken(i):
+        raise OSError("disk full")
+    record_line, store._record_line = store._record_line, broken  # fails after the .f32 append
+    with pytest.raises(OSError):
+        store.add_event(TEXTS[3])
+    with pytest.raises(OSError):
+        store.add_events(TEXTS[3:5])
+    assert sizes(store) == before and len(store) == 3
+    store._record_line = record_line
+
+    assert store.add_event(TEXTS[3]) == 3
+    store.add_events(TEXTS[4:])
+    assert_paired(store, TEXTS)
+    assert_paired(make_store(precision=precision), TEXTS)
+
+
+@pytest.mark.parametrize("torn", ["jsonl", "f32"])
+def test_torn_tail_is_cut_back_on_reopen(make_store, torn):
+    store = make_store()
+    store.add_events(TEXTS)
+    row_bytes = os.path.getsize(store.emb_path) // len(TEXTS)
+    path = store.log_path if torn == "jsonl" else store.emb_path
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - (10 if torn == "jsonl" else row_bytes // 2))
+
+    reopened = make_store()
+    assert_paired(reopened, TEXTS[:-1])
+    assert os.path.getsize(reopened.emb_path) == (len(TEXTS) - 1) * row_bytes
+    with open(reopened.log_path, "rb") as f:
+        assert f.read().endswith(b"\n")
+
+    reopened.add_event(TEXTS[-1])
+    assert_paired(make_store(), TEXTS)
+
+
+def test_torn_header_starts_empty(make_store):
+    store = make_store()
+    store.add_events(TEXTS)
+    with open(store.log_path, "r+b") as f:
+        f.truncate(5)
+    reopened = make_store()
+    assert len(reopened) == 0
+    reopened.add_events(TEXTS[:2])
+    assert_paired(make_store(), TEXTS[:2])
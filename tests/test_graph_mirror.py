@@ -0,0 +1,111 @@
+"""
+The Neo4j store's in-memory mirror must never stand between a committed write and the
+rest of the store: a failed load falls back to Neo4j reads and is retried, and writes
+that find it not loaded drop it instead of raising. Runs against a fake driver.
+"""
+import pytest
+
+from config import settings
+from graph_store import Neo4jGraphStore
+from lazy import LazyResource
+from memory_graph import InMemoryGraphStore
+
+
+class _Result(list):
+    counters = type("Counters", (), {"nodes_created": 0, "relationships_created": 0, "properties_set": 0})
+
+    def consume(self):
+        return self
+
+
+class FakeDriver:
+    """Answers the mirror's load query (failing the first `failures` times) and fetch_context."""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.queries = []
+
+    def session(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute_write(self, fn):
+        return fn(self)
+
+    def run(self, query, params=None):
+        self.queries.append(query)
+        if "OPTIONAL MATCH" in query:
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("neo4j went away")
+            return _Result([{"id": "1", "labels": ["Entity", "Npc"], "props": {"name": "Mira"}, "out": []}])
+        if "LIMIT $limit" in query:
+            return _Result([{"a_type": "Npc", "a_name": "Mira", "rel": "OWNS", "b_type": "Item", "b_name": "Key"}])
+        return _Result()
+
+    def loads(self) -> int:
+        return sum("OPTIONAL MATCH" in q for q in self.queries)
+
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setattr(settings, "GRAPH_MIRROR", True)
+
+    def make(failures: int = 0):
+        driver = FakeDriver(failures)
+        return Neo4jGraphStore(session_id="mirror", driver=LazyResource.of(driver, "neo4j driver")), driver
+    return make
+
+
+def test_failed_load_falls_back_to_neo4j_and_is_retried(store):
+    graph, driver = store(failures=1)
+    assert graph.fetch_context() == "Npc 'Mira' OWNS Item 'Key'"
+    assert graph.fetch_context() == ""  # now from the mirror, which has Mira but no relationships
+    assert driver.loads() == 2
+    assert graph.mirror is not None and graph.stats()["nodes"] == 1
+
+
+def test_writes_do_not_raise_while_the_mirror_is_unavailable(store):
+    graph, driver = store(failures=1)
+    graph.fetch_context()
+    graph.merge_entity("Goblin", "Creature", {"hp": 7})
+    graph.merge_relationship("Wolf", "hunts", "Goblin")
+    graph.apply_extraction([{"name": "Old Mill", "type": "Location"}],
+                           [{"source": "Kael", "relation": "visits", "target": "Old Mill"}])
+    assert graph.find_entities("Kael sees the wolf near the old mill") == ["Kael", "Wolf", "Old Mill"]
+    assert driver.loads() == 2  # the write dropped the failed mirror; find_entities loaded it again
+
+
+def test_write_while_loading_drops_the_mirror(store):
+    graph, driver = store()
+    graph.merge_entity("Goblin", "Creature")
+    assert driver.loads() == 0
+    graph.fetch_context()
+    graph.merge_entity("Wolf", "Creature")
+    assert "Wolf" in graph.mirror.by_name and driver.loads() == 1
+
+
+def test_clear_graph_leaves_an_empty_mirror(store):
+    graph, driver = store()
+    graph.fetch_context()
+    graph.clear_graph()
+    assert graph.fetch_context() == "" and driver.loads() == 1
+
+
+def test_no_op_merges_keep_the_memoized_context():
+    graph = InMemoryGraphStore(session_id="memo")
+    graph.merge_entity("Mira", "NPC", {"role": "innkeeper"})
+    graph.merge_relationship("Mira", "owns", "Silver Key")
+    version = graph.version
+    graph.merge_entity("Mira", "NPC", {"role": "innkeeper"})
+    graph.merge_relationship("Mira", "owns", "Silver Key")
+    graph.apply_extraction([{"name": "Mira", "type": "NPC", "attributes": {"role": "innkeeper"}}],
+                           [{"source": "Mira", "relation": "owns", "target": "Silver Key"}])
+    assert graph.version == version
+    graph.merge_entity("Mira", "NPC", {"role": "bard"})
+    assert graph.version == version + 1
@@ -0,0 +1,203 @@
+"""
+Both graph backends must answer every prompt-facing read the same way. Each test runs
+against the in-memory graph and against Neo4j (skipped unless NEO4J_URI points at a
+reachable server). Neo4j gives no row order without ORDER BY, so context is compared as
+sets of lines, with limits high enough that nothing is cut.
+"""
+import os
+import uuid
+
+import pytest
+
+from config import settings
+from memory_graph import InMemoryGraphStore
+
+ENTITIES = [
+    {"name": "Mira", "type": "NPC", "attributes": {"role": "innkeeper", "mood": "wary"}},
+    {"name": "Old Mill", "type": "Location", "attributes": {}},
+    {"name": "Silver Key", "type": "Item", "attributes": {"session": "hijack", "shiny-ness": 3}},
+    {"name": "Goblin", "type": "Creature", "attributes": {"hp": 7}},
+    {"name": "", "type": "NPC"},
+]
+RELATIONSHIPS = [
+    {"source": "Mira", "relation": "located in", "target": "Old Mill"},
+    {"source": "Mira", "relation": "OWNS", "target": "Silver Key"},
+    {"source": "Goblin", "relation": "guards", "target": "Old Mill"},
+    {"source": "Goblin", "relation": "guards", "target": "Old Mill"},
+    {"source": "Wolf", "relation": "hunts", "target": "Goblin"},
+    {"source": "Bridge", "relation": "leads to", "target": "Old Mill"},
+    {"source": "Wolf", "relation": "circles", "target": "Wolf"},
+    {"source": "Kael", "relation": None, "target": "Mira"},
+]
+ALL_FACTS = {
+    "Npc 'Mira' LOCATEDIN Location 'Old Mill'",
+    "Npc 'Mira' OWNS Item 'Silver Key'",
+    "Npc 'Mira' FEARS Creature 'Goblin'",
+    "Creature 'Goblin' GUARDS Location 'Old Mill'",
+    "Entity 'Wolf' HUNTS Creature 'Goblin'",
+    "Entity 'Wolf' CIRCLES Entity 'Wolf'",
+    "Location 'Bridge' LEADSTO Location 'Old Mill'",
+    "Entity 'Kael' RELATED Npc 'Mira'",
+    "Entity 'Stranger' WATCHES Npc 'Mira'",
+}
+
+
+def _neo4j_store():
+    if not settings.NEO4J_URI:
+        pytest.skip("NEO4J_URI not set")
+    pytest.importorskip("neo4j")
+    from graph_store import Neo4jGraphStore
+    store = Neo4jGraphStore(session_id=f"parity-{uuid.uuid4().hex[:8]}")
+    try:
+        store.driver
+    except Exception as e:
+        pytest.skip(f"Neo4j unreachable: {e}")
+    return store
+
+
+@pytest.fixture(params=["memory", "neo4j"])
+def graph(request):
+    store = InMemoryGraphStore(session_id="parity") if request.param == "memory" else _neo4j_store()
+    store.clear_graph()
+    yield store
+    store.clear_graph()
+    store.close()
+
+
+def play(graph) -> dict:
+    """Write the scripted world; returns the counts of the extraction write."""
+    counts = graph.apply_extraction(ENTITIES, RELATIONSHIPS)
+    graph.merge_entity("Bridge", "location", {"state": "broken"})
+    graph.merge_entity("Mira", "NPC", {"mood": "friendly"})
+    graph.merge_relationship("Mira", "fears", "Goblin")
+    graph.merge_relationship("Stranger", "watches", "Mira")
+    return counts
+
+
+def lines(text: str) -> set:
+    return set(text.splitlines())
+
+
+def canonical(data: dict):
+    """An export with backend-specific node ids replaced by the node contents."""
+    key = {n["id"]: (tuple(sorted(n["labels"])), tuple(sorted((k, str(v)) for k, v in n["props"].items())))
+           for n in data["nodes"]}
+    return sorted(key.values()), sorted((key[e["src"]], e["type"], key[e["tgt"]]) for e in data["edges"])
+
+
+def test_merge_entity(graph):
+    graph.merge_entity("Mira", "NPC", {"role": "innkeeper", "shiny-ness": 3})
+    graph.merge_entity("Mira", "NPC", {"mood": "friendly"})
+    graph.merge_entity("Bridge", "location", {"state": "broken"})
+    nodes, edges = canonical(graph.export_graph())
+    assert nodes == [
+        (("Entity", "Location"), (("name", "Bridge"), ("state", "broken"))),
+        (("Entity", "Npc"), (("mood", "friendly"), ("name", "Mira"), ("role", "innkeeper"), ("shiny_ness", "3"))),
+    ]
+    assert edges == []
+    assert graph.find_entities("mira crosses the bridges") == ["Mira", "Bridge"]
+
+
+def test_merge_relationship(graph):
+    graph.merge_entity("Mira", "NPC")
+    graph.merge_relationship("Mira", "located in", "Old Mill")
+    graph.merge_relationship("Mira", "located in", "Old Mill")
+    graph.merge_relationship("Stranger", "watches", "Mira")
+    assert lines(graph.fetch_context(limit=100)) == {
+        "Npc 'Mira' LOCATEDIN Entity 'Old Mill'",
+        "Entity 'Stranger' WATCHES Npc 'Mira'",
+    }
+    assert graph.find_entities("the stranger at the old mill") == ["Stranger", "Old Mill"]
+
+
+def test_apply_extraction_counts(graph):
+    assert play(graph) == {"entities": 4, "relationships": 8, "nodes_created": 7,
+                           "relationships_created": 7, "properties_set": 18}
+
+
+def test_fetch_context(graph):
+    play(graph)
+    assert lines(graph.fetch_context(limit=1000)) == ALL_FACTS
+    limited = graph.fetch_context(limit=3).splitlines()
+    assert len(limited) == 3 and set(limited) <= ALL_FACTS
+
+
+@pytest.mark.parametrize("names, depth, rel_types, expected", [
+    (["Mira"], 1, None, {
+        "Npc 'Mira' LOCATEDIN Location 'Old Mill'", "Npc 'Mira' OWNS Item 'Silver Key'",
+        "Npc 'Mira' FEARS Creature 'Goblin'", "Npc 'Mira' RELATED Entity 'Kael'",
+        "Npc 'Mira' WATCHES Entity 'Stranger'"}),
+    (["Old Mill", "Kael"], 1, None, {
+        "Location 'Old Mill' LOCATEDIN Npc 'Mira'", "Location 'Old Mill' GUARDS Creature 'Goblin'",
+        "Location 'Old Mill' LEADSTO Location 'Bridge'", "Entity 'Kael' RELATED Npc 'Mira'"}),
+    (["Wolf"], 2, None, {
+        "Entity 'Wolf' HUNTS Creature 'Goblin'", "Entity 'Wolf' CIRCLES Entity 'Wolf'",
+        "Creature 'Goblin' GUARDS Location 'Old Mill'", "Creature 'Goblin' FEARS Npc 'Mira'"}),
+    (["Goblin"], 3, ["guards", "hunts"], {
+        "Creature 'Goblin' GUARDS Location 'Old Mill'", "Creature 'Goblin' HUNTS Entity 'Wolf'"}),
+    (["Nobody"], 2, None, set()),
+    ([], 1, None, set()),
+])
+def test_get_context_for_entities(graph, names, depth, rel_types, expected):
+    play(graph)
+    text = graph.get_context_for_entities(names, limit_per_entity=1000, depth=depth, rel_types=rel_types)
+    assert lines(text) == expected
+
+
+def test_get_context_for_entities_limit(graph):
+    play(graph)
+    assert len(graph.get_context_for_entities(["Mira"], limit_per_entity=2).splitlines()) == 2
+
+
+@pytest.mark.parametrize("name, limit, nearest", [
+    ("Silver Key", 2, {"Item 'Silver Key' OWNS Npc 'Mira'"}),
+    ("Bridge", 1, {"Location 'Bridge' LEADSTO Location 'Old Mill'"}),
+    ("Kael", 3, {"Entity 'Kael' RELATED Npc 'Mira'"}),
+])
+def test_limit_keeps_the_nearest_hops(graph, name, limit, nearest):
+    # Which 2-hop rows fill the rest is up to the backend; the 1-hop rows must come first.
+    play(graph)
+    everything = lines(graph.get_context_for_entities([name], limit_per_entity=1000, depth=2))
+    limited = graph.get_context_for_entities([name], limit_per_entity=limit, depth=2).splitlines()
+    assert len(limited) == limit and set(limited) <= everything
+    assert nearest <= set(limited)
+
+
+def test_find_entities(graph):
+    play(graph)
+    assert graph.find_entities("Kael asks mira about the silver keys near the old mill") == \
+        ["Kael", "Mira", "Silver Key", "Old Mill"]
+    assert graph.find_entities("a wolf howls") == ["Wolf"]
+    assert graph.find_entities("nothing here") == []
+
+
+def test_clear_graph(graph):
+    play(graph)
+    graph.clear_graph()
+    assert graph.fetch_context(limit=100) == ""
+    assert graph.get_context_for_entities(["Mira"]) == ""
+    assert graph.find_entities("Mira and the wolf") == []
+    assert graph.export_graph() == {"nodes": [], "edges": []}
+
+
+def test_snapshot_restore(graph, tmp_path):
+    play(graph)
+    before = canonical(graph.export_graph())
+    path = os.path.join(tmp_path, "graph.json")
+    graph.snapshot(path)
+    graph.clear_graph()
+    graph.restore(path)
+    assert canonical(graph.export_graph()) == before
+    assert lines(graph.fetch_context(limit=1000)) == ALL_FACTS
+    assert graph.find_entities("a wolf howls") == ["Wolf"]
+
+    restored = InMemoryGraphStore(session_id="parity-restored", path=path)
+    assert canonical(restored.export_graph()) == before
+
+
+def test_import_export_of_the_other_backend(graph):
+    source = InMemoryGraphStore(session_id="parity-source")
+    play(source)
+    graph.import_graph(source.export_graph())
+    assert canonical(graph.export_graph()) == canonical(source.export_graph())
+    assert lines(graph.fetch_context(limit=1000)) == ALL_FACTS
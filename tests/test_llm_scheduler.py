@@ -0,0 +1,154 @@
+import threading
+import time
+
+import pytest
+
+from fake_llm import FakeChatModel, FakeRateLimitError
+from llm_client import LLMClient
+from llm_scheduler import LLMScheduler, LLMUnavailable, LLMDeadlineExceeded
+
+
+def flaky(failures: int, result="ok"):
+    """fn(timeout) failing with a 429 `failures` times, then returning `result`; .calls counts attempts."""
+    def fn(timeout):
+        fn.calls += 1
+        if fn.calls <= failures:
+            raise FakeRateLimitError()
+        return result
+    fn.calls = 0
+    return fn
+
+
+def wait_for(condition, timeout: float = 5.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "condition not reached"
+        time.sleep(0.005)
+
+
+def test_retries_a_429_then_succeeds():
+    scheduler = LLMScheduler(max_retries=3, backoff=0.001, max_backoff=0.01)
+    fn = flaky(2)
+    assert scheduler.call(fn) == "ok"
+    assert fn.calls == 3
+    stats = scheduler.stats()
+    assert stats["retries"] == 2 and stats["rate_limited"] == 2 and stats["failed"] == 0
+
+
+def test_gives_up_after_max_retries():
+    scheduler = LLMScheduler(max_retries=2, backoff=0.001, max_backoff=0.01)
+    fn = flaky(10)
+    with pytest.raises(LLMUnavailable) as info:
+        scheduler.call(fn, name="extract")
+    assert not isinstance(info.value, LLMDeadlineExceeded)
+    assert isinstance(info.value.__cause__, FakeRateLimitError)
+    assert fn.calls == 3 and scheduler.stats()["failed"] == 1
+
+
+def test_other_errors_are_not_retried():
+    scheduler = LLMScheduler(max_retries=3, backoff=0.001)
+
+    def fn(timeout):
+        raise ValueError("bad request")
+    with pytest.raises(ValueError):
+        scheduler.call(fn)
+    assert scheduler.stats()["retries"] == 0
+
+
+def test_deadline_bounds_each_request():
+    scheduler = LLMScheduler(max_retries=5, backoff=0.001, timeout=0.1)
+    slow = FakeChatModel(lambda prompt: "late", latency=2.0)
+    given = []
+
+    def fn(timeout):
+        given.append(timeout)
+        return slow.invoke([{"role": "user", "content": "hi"}], timeout=timeout)
+    t0 = time.monotonic()
+    with pytest.raises(LLMDeadlineExceeded):
+        scheduler.call(fn)
+    assert time.monotonic() - t0 < 0.5
+    assert given and 0 < given[0] <= 0.1
+    assert scheduler.stats()["deadline_exceeded"] == 1
+
+
+def test_deadline_covers_the_queue():
+    scheduler = LLMScheduler(max_concurrency=1, timeout=0.05)
+    release = threading.Event()
+    holder = threading.Thread(target=scheduler.call, args=(lambda timeout: release.wait(5),), kwargs={"timeout": 0})
+    holder.start()
+    wait_for(lambda: scheduler.stats()["running"] == 1)
+    try:
+        with pytest.raises(LLMDeadlineExceeded):
+            scheduler.call(lambda timeout: "never")
+    finally:
+        release.set()
+        holder.join()
+
+
+def test_client_requests_get_the_time_left():
+    scheduler = LLMScheduler(max_retries=5, backoff=0.001, timeout=0.1)
+    llm = LLMClient(story_llm=FakeChatModel(latency=2.0), extractor_llm=FakeChatModel(latency=2.0),
+                    scheduler=scheduler)
+    t0 = time.monotonic()
+    with pytest.raises(LLMDeadlineExceeded):
+        llm.generate_story("", "I wait")
+    assert time.monotonic() - t0 < 0.5
+
+
+def test_identical_keys_in_flight_share_one_request():
+    scheduler = LLMScheduler(max_concurrency=8)
+    release = threading.Event()
+    calls = []
+
+    def fn(timeout):
+        calls.append(1)
+        release.wait(5)
+        return {"entities": []}
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(scheduler.call(fn, key="same"))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    wait_for(lambda: scheduler.stats()["coalesced"] == 4)
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert results == [{"entities": []}] * 5
+    assert scheduler.stats()["coalescing"] == 0
+    assert scheduler.call(fn, key="same") == {"entities": []} and len(calls) == 2
+
+
+def test_concurrency_cap():
+    scheduler = LLMScheduler(max_concurrency=2)
+    provider = FakeChatModel(latency=0.03, max_concurrent=2)
+    threads = [threading.Thread(target=scheduler.call, args=(lambda timeout: provider.invoke(["hi"]),))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert provider.calls == 8 and provider.rate_limited == 0
+    assert scheduler.stats()["running"] == 0
+
+
+def test_closing_a_stream_early_frees_its_slot():
+    scheduler = LLMScheduler(max_concurrency=1, timeout=0.5)
+    model = FakeChatModel(lambda prompt: "one two three four five six", chunk_words=1)
+    stream = scheduler.stream(lambda timeout: model.stream(["hi"], timeout=timeout))
+    assert next(stream).content == "one"
+    assert scheduler.stats()["running"] == 1
+    stream.close()
+    assert scheduler.stats()["running"] == 0
+    assert scheduler.call(lambda timeout: "next", timeout=0.05) == "next"
+
+
+def test_stream_retries_until_the_first_chunk():
+    scheduler = LLMScheduler(max_retries=3, backoff=0.001)
+    model = FakeChatModel(lambda prompt: "a b c", chunk_words=1)
+    fails = flaky(2)
+
+    def open_stream(timeout):
+        fails(timeout)
+        return model.stream(["hi"])
+    assert [c.content for c in scheduler.stream(open_stream)] == ["a", " b", " c"]
+    assert fails.calls == 3 and scheduler.stats()["running"] == 0
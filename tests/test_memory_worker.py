@@ -0,0 +1,164 @@
+"""
+The background write queue: strictly first in, first out (also when workers share a pool),
+drained by flush() and close(), and not stopped by a write that fails.
+"""
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from fake_llm import FakeChatModel
+from memory_worker import MemoryWorker
+
+
+def recorder(log: list, busy: list = None):
+    """job(item, delay=0) appends `item` to `log` after `delay` seconds; `busy` counts overlapping jobs."""
+    lock = threading.Lock()
+
+    def job(item, delay: float = 0.0):
+        with lock:
+            if busy is not None:
+                busy.append(busy[-1] + 1 if busy else 1)
+        time.sleep(delay)
+        with lock:
+            log.append(item)
+            if busy is not None:
+                busy.append(busy[-1] - 1)
+        return item
+    return job
+
+
+def test_runs_in_submission_order():
+    worker = MemoryWorker("test")
+    log = []
+    job = recorder(log)
+    futures = [worker.submit(job, i, delay=0.01 if i % 3 == 0 else 0) for i in range(20)]
+    assert worker.flush(timeout=5)
+    assert log == list(range(20)) and [f.result() for f in futures] == list(range(20))
+    assert worker.pending == 0
+    worker.close()
+
+
+def test_workers_sharing_a_pool_keep_their_own_order():
+    pool = ThreadPoolExecutor(max_workers=4)
+    logs = {name: [] for name in "ab"}
+    busy = {name: [] for name in "ab"}
+    workers = {name: MemoryWorker(name, executor=pool) for name in "ab"}
+    jobs = {name: recorder(logs[name], busy[name]) for name in "ab"}
+    for i in range(15):
+        for name in "ab":
+            workers[name].submit(jobs[name], i, delay=0.002 * (i % 4))
+    for worker in workers.values():
+        assert worker.flush(timeout=5)
+    for name in "ab":
+        assert logs[name] == list(range(15))
+        assert max(busy[name]) == 1  # one write at a time per worker, though the pool has four threads
+    pool.shutdown()
+
+
+def test_a_failing_write_does_not_stop_the_worker():
+    worker = MemoryWorker("test")
+    log = []
+    job = recorder(log)
+
+    def broken():
+        raise RuntimeError("graph down")
+    worker.submit(job, 1)
+    failed = worker.submit(broken)
+    worker.submit(job, 2)
+    assert worker.flush(timeout=5)
+    assert log == [1, 2] and worker.pending == 0
+    with pytest.raises(RuntimeError):
+        failed.result()
+    assert worker.submit(job, 3).result(timeout=5) == 3
+    worker.close()
+
+
+def test_flush_times_out_on_a_stuck_write():
+    worker = MemoryWorker("test")
+    release = threading.Event()
+    worker.submit(release.wait, 5)
+    assert not worker.flush(timeout=0.02) and worker.pending == 1
+    release.set()
+    assert worker.flush(timeout=5)
+    worker.close()
+
+
+def test_close_drains_the_queue():
+    worker = MemoryWorker("test")
+    log = []
+    job = recorder(log)
+    for i in range(5):
+        worker.submit(job, i, delay=0.01)
+    worker.close()
+    assert log == list(range(5)) and worker.pending == 0
+    assert MemoryWorker("idle").flush(timeout=0)
+
+
+# ---- through MemoryManager ----
+
+def room_extractor():
+    """Extraction model naming the "Room <n>" of the story text as a Location."""
+    def respond(prompt):
+        rooms = re.findall(r"Room \d+", prompt.split("Story:", 1)[-1])
+        return json.dumps({"entities": [{"name": r, "type": "Location"} for r in rooms], "relationships": []})
+    return FakeChatModel(respond)
+
+
+def graph_names(manager) -> set:
+    return {n["props"].get("name") for n in manager.graph.export_graph()["nodes"]}
+
+
+@pytest.fixture
+def manager(make_manager):
+    turns = iter(range(100))
+    return make_manager("writes", story=FakeChatModel(lambda prompt: f"You enter Room {next(turns)}."),
+                        extractor=room_extractor())
+
+
+def test_interleaved_graph_and_episodic_writes_apply_in_order(manager):
+    order = []
+    add_event, apply_extraction = manager.episodic.add_event, manager.graph.apply_extraction
+
+    def slow_add_event(text, metadata=None):
+        time.sleep(0.03 if not order else 0)  # the first write is the slowest: nothing may overtake it
+        order.append(("episodic", re.search(r"Room \d+", text).group()))
+        return add_event(text, metadata)
+
+    def logged_apply(entities, relationships):
+        order.append(("graph", entities[0]["name"]))
+        return apply_extraction(entities, relationships)
+    manager.episodic.add_event = slow_add_event
+    manager.graph.apply_extraction = logged_apply
+
+    for i in range(4):
+        manager.generate_and_update(f"I walk on {i}")
+    manager.flush()
+    assert manager.pending_writes == 0
+    assert order == [(store, f"Room {i}") for i in range(4) for store in ("episodic", "graph")]
+    assert [t.split("DM: ")[1] for t in manager.episodic.texts] == [f"You enter Room {i}." for i in range(4)]
+    assert {f"Room {i}" for i in range(4)} <= graph_names(manager)
+
+
+def test_a_queued_reset_lands_between_the_turns(manager):
+    manager.generate_and_update("I walk on")
+    manager.reset_memory(wait=False)
+    manager.generate_and_update("I walk on")
+    manager.flush()
+    assert [t.split("DM: ")[1] for t in manager.episodic.texts] == ["You enter Room 1."]
+    names = graph_names(manager)
+    assert "Room 1" in names and "Room 0" not in names
+
+
+def test_close_applies_the_queued_writes(make_manager, make_store):
+    episodic = make_store("closing")
+    manager = make_manager("closing", story=FakeChatModel(lambda prompt: "The torch gutters."), episodic=episodic)
+    add_event = episodic.add_event
+    episodic.add_event = lambda text, metadata=None: time.sleep(0.02) or add_event(text, metadata)
+    for i in range(3):
+        manager.generate_and_update(f"I wait {i}")
+    manager.writer.close()
+    assert len(episodic) == 3 and manager.pending_writes == 0
@@ -0,0 +1,143 @@
+"""
+float16/int8 embedding matrices: how far the decoded rows may drift from the float32 ones,
+and the episodic store re-ranking its shortlist against the float32 rows on disk (or falling
+back to the codes when that file is short).
+"""
+import os
+
+import numpy as np
+import pytest
+
+from config import settings
+from quantization import EmbeddingMatrix
+
+# Against the query e0, `near` (0.6) beats `close` (0.5992) at float32, but int8 codes `near` to
+# 95 * 0.8/127 = 0.59843 while `close`, whose largest coordinate is e0, keeps 0.5992 exactly.
+NEAR = np.array([0.6, 0.8, 0, 0], dtype=np.float32)
+CLOSE = np.array([0.5992, 0.5992, np.sqrt(1 - 2 * 0.5992 ** 2), 0], dtype=np.float32)
+QUERY = np.array([1, 0, 0, 0], dtype=np.float32)
+FAR = np.array([0, 0, 0, 1], dtype=np.float32)
+
+
+class FixedEncoder:
+    """Encodes "near", "close" and "query" to the vectors above and anything else to FAR."""
+
+    name = "fixed-encoder-4"
+    vectors = {"near": NEAR, "close": CLOSE, "query": QUERY}
+
+    def get_sentence_embedding_dimension(self):
+        return 4
+
+    def encode(self, sentences, convert_to_numpy=True, normalize_embeddings=True, **kwargs):
+        single = isinstance(sentences, str)
+        out = np.stack([self.vectors.get(t, FAR) for t in ([sentences] if single else sentences)])
+        return out[0] if single else out
+
+
+def unit_rows(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    v = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+# ---- EmbeddingMatrix ----
+
+def test_float32_is_exact():
+    vectors = unit_rows(100, 32)
+    m = EmbeddingMatrix(32, "float32", capacity=8)
+    m.append(vectors)
+    assert m.exact and m.shape == (100, 32)
+    assert np.array_equal(m[:], vectors) and np.array_equal(m @ vectors[0], vectors @ vectors[0])
+
+
+def test_float16_error_bound():
+    vectors = unit_rows(200, 64)
+    m = EmbeddingMatrix(64, "float16")
+    m.append(vectors)
+    # half precision keeps 11 significant bits: relative error at most 2**-11 per coordinate
+    assert np.all(np.abs(m[:] - vectors) <= np.abs(vectors) * 2 ** -11 + 1e-7)
+    assert m.nbytes == 200 * 64 * 2
+
+
+def test_int8_error_bound():
+    vectors = unit_rows(200, 64)
+    m = EmbeddingMatrix(64, "int8")
+    m.append(vectors)
+    # symmetric per-row codes: each coordinate is off by at most half a step of max|row| / 127
+    step = np.abs(vectors).max(axis=1, keepdims=True) / 127
+    assert np.all(np.abs(m[:] - vectors) <= step / 2 + 1e-7)
+    assert np.abs(m[:] @ vectors[0] - vectors @ vectors[0]).max() <= np.sqrt(64) * step.max() / 2
+    assert m.nbytes == 200 * 64 + 200 * 4
+
+
+def test_int8_zero_row_decodes_to_zero():
+    m = EmbeddingMatrix(4, "int8")
+    m.append(np.zeros((2, 4)))
+    assert np.array_equal(m[:], np.zeros((2, 4), dtype=np.float32))
+
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_matmul_decodes_in_chunks(monkeypatch, precision):
+    vectors = unit_rows(50, 16)
+    m = EmbeddingMatrix(16, precision, capacity=4)
+    m.append(vectors[:30])
+    m.append(vectors[30:])
+    expected = m[:] @ vectors[7]
+    monkeypatch.setattr(EmbeddingMatrix, "CHUNK", 7)
+    assert np.allclose(m @ vectors[7], expected)
+    assert m[[3, 41]].shape == (2, 16) and np.allclose(m[41], m[:][41])
+
+
+@pytest.mark.parametrize("precision", ["float32", "float16", "int8"])
+def test_truncate_then_append(precision):
+    vectors = unit_rows(10, 8)
+    m = EmbeddingMatrix(8, precision)
+    m.append(vectors)
+    m.truncate(6)
+    assert len(m) == 6 and (m @ vectors[0]).shape == (6,)
+    m.append(vectors[9])
+    assert len(m) == 7 and np.allclose(m[6], vectors[9], atol=1e-2)
+    m.truncate(100)
+    assert len(m) == 7
+
+
+def test_unknown_precision():
+    with pytest.raises(ValueError):
+        EmbeddingMatrix(8, "int4")
+
+
+# ---- re-ranking in the episodic store ----
+
+@pytest.fixture
+def fixed_store(make_store, monkeypatch):
+    monkeypatch.setattr(settings, "EPISODIC_DEDUP_THRESHOLD", 0.0)
+    monkeypatch.setattr(settings, "EPISODIC_INDEX", "exact")
+    return lambda precision: make_store(f"fixed-{precision}", model=FixedEncoder(), precision=precision)
+
+
+def test_codes_alone_misorder_the_near_tie(fixed_store, monkeypatch):
+    monkeypatch.setattr(settings, "EPISODIC_RERANK", 1)
+    store = fixed_store("int8")
+    store.add_events(["far", "near", "close"])
+    assert store.query("query", k=1)[0]["text"] == "close"
+
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_rerank_restores_the_float32_order(fixed_store, precision):
+    exact = fixed_store("float32")
+    store = fixed_store(precision)
+    for s in (exact, store):
+        s.add_events(["far", "near", "close"])
+    want = exact.query("query", k=3)
+    got = store.query("query", k=3)
+    assert [r["text"] for r in got] == [r["text"] for r in want] == ["near", "close", "far"]
+    # re-ranked against the float32 rows on disk, so the scores are the float32 ones
+    assert np.allclose([r["score"] for r in got], [r["score"] for r in want], atol=1e-6)
+
+
+def test_short_f32_file_falls_back_to_the_codes(fixed_store):
+    store = fixed_store("int8")
+    store.add_events(["far", "near", "close"])
+    os.truncate(store.emb_path, 4 * 4)  # only the first row left on disk
+    got = store.query("query", k=3)
+    assert [r["text"] for r in got] == ["close", "near", "far"]
+    assert got[1]["score"] == pytest.approx(95 * 0.8 / 127, abs=1e-6)
@@ -0,0 +1,53 @@
+"""
+A graph lookup that misses its deadline keeps its thread; later turns must go on without
+the graph instead of queueing more lookups behind it, and the episodic search must not
+wait for it.
+"""
+import threading
+
+import pytest
+
+from config import settings
+from memory_graph import InMemoryGraphStore
+from tracing import tracer
+
+
+class StuckGraph(InMemoryGraphStore):
+    """Graph lookups block until `release` is set."""
+
+    def __init__(self):
+        super().__init__("stuck")
+        self.release = threading.Event()
+        self.lookups = 0
+
+    def get_context_for_entities(self, *args, **kwargs):
+        self.lookups += 1
+        self.release.wait(5)
+        return super().get_context_for_entities(*args, **kwargs)
+
+
+@pytest.fixture
+def manager(make_manager, monkeypatch):
+    monkeypatch.setattr(settings, "CONTEXT_GRAPH_TIMEOUT", 0.05)
+    monkeypatch.setattr(settings, "SIMILARITY_THRESHOLD", -1.0)
+    monkeypatch.setattr(tracer, "enabled", True)
+    tracer.reset()
+    m = make_manager("stuck", graph=StuckGraph())
+    m.graph.merge_entity("Mira", "NPC")
+    m.graph.merge_relationship("Mira", "owns", "Silver Key")
+    m.episodic.add_event("Player: I greet Mira\nDM: Mira nods.")
+    yield m
+    m.graph.release.set()
+
+
+def test_stuck_graph_lookup_is_not_queued_again(manager):
+    for _ in range(3):
+        context = manager.get_world_context("I ask Mira about the key")
+        assert "Mira nods." in context and "OWNS" not in context
+    assert manager.graph.lookups == 1
+    assert tracer.counters.get("context.graph_timeouts") == 1
+    assert tracer.counters.get("context.graph_skipped") == 2
+
+    manager.graph.release.set()
+    manager._lookups["graph"].result(timeout=5)
+    assert "Npc 'Mira' OWNS Entity 'Silver Key'" in manager.get_world_context("I ask Mira about the key")
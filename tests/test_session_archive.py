@@ -0,0 +1,75 @@
+"""
+A session archive restores the same game, and its stored embeddings are only reused by
+a model of the same name and width.
+"""
+import os
+
+import numpy as np
+import pytest
+
+from session_archive import export_session, import_session
+
+TEXTS = [f"Player: I search room {i} of the keep\nDM: You find clue {i * 7}." for i in range(20)]
+
+
+@pytest.fixture
+def game(make_manager, make_store):
+    """game(name, dim, model_name): a manager whose store's HashEncoder has that width and name."""
+    def make(name: str, dim: int = 384, model_name: str = "hash-test"):
+        return make_manager(name, episodic=make_store(name, dim=dim, model_name=model_name))
+    return make
+
+
+def encodes(manager) -> list:
+    """Record the sizes of encode_many() calls made by `manager`'s store."""
+    calls = []
+    encode_many = manager.episodic.encode_many
+    manager.episodic.encode_many = lambda texts, *a, **kw: calls.append(len(texts)) or encode_many(texts, *a, **kw)
+    return calls
+
+
+def test_round_trip_reuses_embeddings(game, tmp_path):
+    source = game("source")
+    source.episodic.add_events(TEXTS)
+    source.graph.merge_relationship("Kael", "visits", "Room 3")
+    source.working_buffer.append({"player": "hi", "dm": "hello", "ts": 0})
+    archive = os.path.join(tmp_path, "game.zip")
+    manifest = export_session(source, archive)
+    assert manifest["model"] == "hash-test" and manifest["dim"] == 384 and manifest["episodes"] == len(TEXTS)
+
+    target = game("target")
+    calls = encodes(target)
+    import_session(target, archive)
+    assert calls == []
+    assert list(target.working_buffer) == list(source.working_buffer)
+    assert target.graph.fetch_context() == source.graph.fetch_context()
+    src_records, src_vectors = source.episodic.export_events()
+    records, vectors = target.episodic.export_events()
+    assert records == src_records
+    np.testing.assert_allclose(vectors, src_vectors, atol=1e-6)
+
+
+def test_other_width_under_the_same_name_encodes_again(game, tmp_path):
+    source = game("source", dim=384)
+    source.episodic.add_events(TEXTS)
+    archive = os.path.join(tmp_path, "game.zip")
+    export_session(source, archive)
+
+    target = game("target", dim=128)
+    calls = encodes(target)
+    import_session(target, archive)
+    assert calls == [len(TEXTS)]
+    assert target.episodic.export_events()[1].shape == (len(TEXTS), 128)
+    assert target.episodic.query(TEXTS[3], k=1)[0]["text"] == TEXTS[3]
+
+
+def test_other_model_name_encodes_again(game, tmp_path):
+    source = game("source", model_name="hash-a")
+    source.episodic.add_events(TEXTS)
+    archive = os.path.join(tmp_path, "game.zip")
+    export_session(source, archive)
+
+    target = game("target", model_name="hash-b")
+    calls = encodes(target)
+    import_session(target, archive)
+    assert calls == [len(TEXTS)]
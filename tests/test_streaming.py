@@ -0,0 +1,43 @@
+import pytest
+
+from fake_llm import FakeChatModel
+
+REPLY = "The gate creaks open and a cold wind blows out. What do you do?"
+LATENCY = 0.05
+CHUNK_DELAY = 0.02
+
+
+@pytest.fixture
+def manager(make_manager):
+    story = FakeChatModel(lambda prompt: REPLY, latency=LATENCY, chunk_delay=CHUNK_DELAY, chunk_words=3)
+    return make_manager("stream", story=story)
+
+
+def test_chunks_arrive_in_order(manager):
+    chunks = list(manager.stream_and_update("I open the gate"))
+    words = REPLY.split(" ")
+    assert chunks == [(" " if i else "") + " ".join(words[i:i + 3]) for i in range(0, len(words), 3)]
+    assert "".join(chunks) == REPLY
+
+
+def test_memory_gets_the_assembled_text(manager):
+    added, extracted = [], []
+    add_event, extract = manager.episodic.add_event, manager.llm.extract_entities
+    manager.episodic.add_event = lambda text, metadata=None: added.append(text) or add_event(text, metadata)
+    manager.llm.extract_entities = lambda text: extracted.append(text) or extract(text)
+
+    list(manager.stream_and_update("I open the gate"))
+    manager.flush()
+
+    assert added == [f"Player: I open the gate\nDM: {REPLY}"]
+    assert extracted == [REPLY]
+    assert list(manager.working_buffer)[-1]["dm"] == REPLY
+
+
+def test_records_ttft_and_total(manager):
+    n_chunks = -(-len(REPLY.split(" ")) // 3)
+    list(manager.stream_and_update("I open the gate"))
+    assert len(manager.turn_timings) == 1
+    timing = manager.turn_timings[-1]
+    assert LATENCY <= timing["ttft"] < timing["total"]
+    assert timing["total"] >= LATENCY + (n_chunks - 1) * CHUNK_DELAY
@@ -0,0 +1,144 @@
+"""
+The approximate indexes against exact search on a small seeded matrix: recall, incremental
+add/remove, and the save/load round trip.
+"""
+import numpy as np
+import pytest
+
+from config import settings
+from vector_index import BinaryIndex, ExactIndex, IVFIndex, top_k
+
+N, DIM, K = 2000, 64, 10
+
+
+def unit(x: np.ndarray) -> np.ndarray:
+    return (x / np.linalg.norm(x, axis=-1, keepdims=True)).astype(np.float32)
+
+
+@pytest.fixture(scope="module")
+def data():
+    """N clustered unit vectors and 50 queries near some of them."""
+    rng = np.random.default_rng(0)
+    centres = rng.standard_normal((20, DIM))
+    vectors = unit(centres[rng.integers(0, 20, N)] + 0.6 * rng.standard_normal((N, DIM)))
+    queries = unit(vectors[rng.choice(N, 50, replace=False)] + 0.3 * rng.standard_normal((50, DIM)))
+    return vectors, queries
+
+
+def recall(index, vectors, queries, live=None) -> float:
+    hits = 0
+    for q in queries:
+        if live is None:
+            want = set(ExactIndex().search(vectors, q, K)[0].tolist())
+        else:
+            want = set(top_k(np.where(live, vectors @ q, -np.inf), K).tolist())
+        hits += len(want & set(index.search(vectors, q, K)[0].tolist()))
+    return hits / (K * len(queries))
+
+
+def test_top_k_is_sorted_best_first():
+    scores = np.array([0.1, 0.9, 0.5, 0.9, -1.0])
+    assert top_k(scores, 3).tolist() == [1, 3, 2]
+    assert top_k(scores, 10).tolist() == [1, 3, 2, 0, 4]
+    assert top_k(scores, 0).size == 0
+
+
+INDEXES = pytest.mark.parametrize("make", [lambda: IVFIndex(nprobe=8), lambda: BinaryIndex(candidates=400)],
+                                  ids=["ivf", "binary"])
+
+
+@INDEXES
+def test_recall_against_exact_search(data, make):
+    vectors, queries = data
+    index = make()
+    index.build(vectors)
+    assert len(index) == N
+    assert recall(index, vectors, queries) >= 0.9
+    rows, scores = index.search(vectors, queries[0], K)
+    assert np.allclose(scores, vectors[rows] @ queries[0]) and np.all(np.diff(scores) <= 0)
+
+
+@INDEXES
+def test_added_rows_are_found_and_removed_rows_are_not(data, make):
+    vectors, queries = data
+    index = make()
+    index.build(vectors[:1500])
+    index.add(np.arange(1500, N), vectors)  # under twice the training size: bucketed, not retrained
+    assert len(index) == N
+    for row in (1500, 1777, N - 1):
+        assert index.search(vectors, vectors[row], 1)[0].tolist() == [row]
+
+    gone = np.arange(0, N, 3)
+    index.remove(gone)
+    index.remove(gone)  # removing twice is harmless
+    assert len(index) == N - gone.size
+    live = np.ones(N, dtype=bool)
+    live[gone] = False
+    for q in np.concatenate([queries, vectors[gone[:20]]]):
+        assert live[index.search(vectors, q, K)[0]].all()
+    assert recall(index, vectors, queries, live) >= 0.85
+
+
+def test_ivf_retrains_once_it_has_doubled(data):
+    vectors, _ = data
+    index = IVFIndex(nprobe=8)
+    index.build(vectors[:500])
+    buckets = index.centroids.shape[0]
+    index.add(np.arange(500, N), vectors)
+    assert index.centroids.shape[0] > buckets and len(index) == N
+
+
+def test_ivf_save_and_load_round_trip(data, tmp_path):
+    vectors, queries = data
+    path = str(tmp_path / "index.ivf.npz")
+    index = IVFIndex(nprobe=8)
+    index.build(vectors[:1500])
+    index.remove([3, 4])
+    index.save(path)
+
+    loaded = IVFIndex(nprobe=8)
+    assert loaded.load(path, vectors[:1500])
+    assert np.array_equal(loaded.centroids, index.centroids) and len(loaded) == 1498
+    for q in queries:
+        assert loaded.search(vectors, q, K)[0].tolist() == index.search(vectors, q, K)[0].tolist()
+
+    # rows appended after the save are bucketed on load; the removed ones stay removed
+    grown = IVFIndex(nprobe=8)
+    assert grown.load(path, vectors)
+    assert len(grown) == N - 2
+    assert grown.search(vectors, vectors[1900], 1)[0].tolist() == [1900]
+    assert 3 not in grown.search(vectors, vectors[3], K)[0]
+
+    # a file for another dimension, or for more rows than the store has, is not used
+    assert not IVFIndex().load(path, vectors[:1000])
+    assert not IVFIndex().load(path, vectors[:, :32])
+    assert not IVFIndex().load(str(tmp_path / "missing.npz"), vectors)
+
+
+def test_binary_load_rebuilds_from_the_vectors(data, tmp_path):
+    vectors, queries = data
+    index = BinaryIndex(candidates=400)
+    index.build(vectors)
+    index.save(str(tmp_path / "unused"))
+    loaded = BinaryIndex(candidates=400)
+    assert loaded.load(str(tmp_path / "unused"), vectors) and len(loaded) == N
+    assert np.array_equal(loaded.bits[:N], index.bits[:N])
+    assert loaded.search(vectors, queries[0], K)[0].tolist() == index.search(vectors, queries[0], K)[0].tolist()
+
+
+@pytest.mark.parametrize("kind, cls", [("ivf", IVFIndex), ("binary", BinaryIndex)])
+def test_store_keeps_its_index_in_step_with_a_failed_append(make_store, monkeypatch, kind, cls):
+    monkeypatch.setattr(settings, "EPISODIC_INDEX", kind)
+    store = make_store(dim=32)
+    store.add_events([f"Episode {i} at the Old Mill." for i in range(40)])
+    assert isinstance(store.index, cls) and len(store.index) == 40
+
+    def broken(i):
+        raise OSError("disk full")
+    record_line, store._record_line = store._record_line, broken
+    with pytest.raises(OSError):
+        store.add_events(["A new episode.", "And another."])
+    assert len(store.index) == 40 and len(store) == 40
+    store._record_line = record_line
+    store.add_event("The Bridge falls.")
+    assert store.query("The Bridge falls.", k=1)[0]["text"] == "The Bridge falls."
@@ -0,0 +1,162 @@
+import json
+import math
+import time
+import threading
+import logging
+from collections import deque
+from config import settings
+
+log = logging.getLogger("tracing")
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "attrs", "t0")
+
+    def __init__(self, tracer, name: str, attrs: dict):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        """Attach more attributes (token counts, row counts...) before the span ends."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer.record(self.name, time.perf_counter() - self.t0, **self.attrs)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class Tracer:
+    """
+    Per-stage latency of a turn, e.g. "context.episodic", "llm.story" or "graph.apply_extraction".
+    - span(name, **attrs) times a block; spans may end on any thread (background writes)
+    - count(name, n) adds to a counter, e.g. "neo4j.round_trips" or "llm.input_tokens"
+    - stats()/format() give rolling p50/p95/p99 over the last `window` spans of each stage
+    - export_to(path) also appends every span as one JSON line
+    When disabled, span() returns a shared no-op and count()/record() return at once.
+    """
+
+    def __init__(self, enabled: bool = True, path: str = "", window: int = 1000):
+        self.enabled = enabled
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}   # stage -> deque of seconds
+        self._totals = {}    # stage -> spans recorded since reset
+        self.counters = {}
+        self._file = None
+        if path:
+            self.export_to(path)
+
+    def span(self, name: str, **attrs):
+        if not self.enabled:
+            return _NOOP
+        return _Span(self, name, attrs)
+
+    def record(self, name: str, seconds: float, **attrs):
+        if not self.enabled:
+            return
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append(seconds)
+            self._totals[name] = self._totals.get(name, 0) + 1
+            if self._file is not None:
+                event = {"ts": time.time(), "span": name, "ms": round(seconds * 1000, 3),
+                         "thread": threading.current_thread().name}
+                event.update(attrs)
+                self._file.write(json.dumps(event, default=str) + "\n")
+
+    def count(self, name: str, n: int = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def export_to(self, path: str):
+        """Append every span from now on to `path` as JSON lines."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+            self._file = open(path, "a", encoding="utf-8", buffering=1)
+        log.info("Tracing spans to %s", path)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._totals.clear()
+            self.counters.clear()
+
+    def stats(self) -> dict:
+        """{stage: {"count", "p50", "p95", "p99", "mean"}} in milliseconds, over the rolling window."""
+        with self._lock:
+            samples = {name: sorted(s) for name, s in self._samples.items()}
+            totals = dict(self._totals)
+        out = {}
+        for name, xs in samples.items():
+            out[name] = {
+                "count": totals[name],
+                "p50": _percentile(xs, 50) * 1000,
+                "p95": _percentile(xs, 95) * 1000,
+                "p99": _percentile(xs, 99) * 1000,
+                "mean": sum(xs) / len(xs) * 1000,
+            }
+        return out
+
+    def format(self) -> str:
+        if not self.enabled:
+            return "(tracing is disabled; set TRACE=true)"
+        stats = self.stats()
+        with self._lock:
+            counters = dict(self.counters)
+        if not stats and not counters:
+            return "(no turns traced yet)"
+        width = max([len(s) for s in stats] + [len(c) for c in counters] + [5])
+        lines = [f"{'stage':<{width}}  {'n':>6}  {'p50 ms':>9}  {'p95 ms':>9}  {'p99 ms':>9}"]
+        for name in sorted(stats):
+            st = stats[name]
+            lines.append(f"{name:<{width}}  {st['count']:>6}  {st['p50']:>9.1f}  {st['p95']:>9.1f}  {st['p99']:>9.1f}")
+        if counters:
+            turns = stats.get("turn", {}).get("count", 0)
+            lines.append("")
+            for name in sorted(counters):
+                per_turn = f"  ({counters[name] / turns:.1f} per turn)" if turns else ""
+                lines.append(f"{name:<{width}}  {counters[name]:>6}{per_turn}")
+        return "\n".join(lines)
+
+
+def _percentile(sorted_xs: list, p: float) -> float:
+    """Nearest-rank percentile of an already sorted, non-empty list."""
+    rank = max(1, math.ceil(p / 100 * len(sorted_xs)))
+    return sorted_xs[rank - 1]
+
+
+tracer = Tracer(enabled=settings.TRACE, path=settings.TRACE_FILE, window=settings.TRACE_WINDOW)
@@ -1,7 +1,10 @@
-def pretty_print_memory(mem):
-    print("=== Graph facts ===")
-    print(mem.get("graph") or "(no facts)")
-    print("\n=== Episodic hits ===")
+def format_memory(mem) -> str:
+    lines = ["=== Graph facts ===", mem.get("graph") or "(no facts)", "\n=== Episodic hits ==="]
     for i, e in enumerate(mem.get("episodic", []), 1):
         text = e.get("text") or e.get("page_content") or ""
-        print(f"{i}. [{e.get('score'):.4f}] {text[:300]}")
+        lines.append(f"{i}. [{e.get('score'):.4f}] {text[:300]}")
+    return "\n".join(lines)
+
+
+def pretty_print_memory(mem):
+    print(format_memory(mem))
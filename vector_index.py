@@ -0,0 +1,265 @@
+import os
+import logging
+import numpy as np
+
+log = logging.getLogger("vector_index")
+
+
+def top_k(scores: np.ndarray, k: int):
+    """Indices of the k largest scores, best first (partial sort)."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.shape[0]:
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(scores.shape[0])
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class ExactIndex:
+    """
+    Brute-force cosine search over the store's embedding matrix.
+    Keeps no state of its own, so add/remove/save/load are no-ops.
+    """
+
+    name = "exact"
+
+    def add(self, rows, vectors: np.ndarray):
+        pass
+
+    def remove(self, rows):
+        pass
+
+    def search(self, vectors: np.ndarray, query: np.ndarray, k: int):
+        scores = vectors @ query
+        top = top_k(scores, k)
+        return top, scores[top]
+
+    def save(self, path: str):
+        pass
+
+    def load(self, path: str, vectors: np.ndarray) -> bool:
+        return True
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest-neighbour index written with NumPy.
+    - vectors are bucketed by their nearest centroid (spherical k-means)
+    - search() scores only the `nprobe` buckets closest to the query
+    - add()/remove() are incremental; the centroids are retrained when the
+      index has doubled in size since the last training so the buckets stay balanced
+    - save()/load() keep the centroids and the row -> bucket assignment in an .npz file
+    Row ids are positions in the store's embedding matrix.
+    """
+
+    name = "ivf"
+    TRAIN_SAMPLE = 20000
+    CHUNK = 8192
+
+    def __init__(self, nprobe: int = 16, nlist: int = None, train_iters: int = 10, seed: int = 0):
+        self.nprobe = nprobe
+        self.fixed_nlist = nlist
+        self.train_iters = train_iters
+        self.rng = np.random.default_rng(seed)
+        self.centroids = None
+        self.assign = np.empty(0, dtype=np.int32)  # row -> bucket, -1 when removed / never added
+        self.lists = []
+        self._arrays = []  # cached np.array of each bucket, None when stale
+        self._trained_on = 0
+        self._rows_seen = 0  # highest row id handed to the index + 1
+
+    def __len__(self):
+        return int((self.assign >= 0).sum())
+
+    def add(self, rows, vectors: np.ndarray):
+        rows = np.asarray(rows, dtype=np.int64).reshape(-1)
+        if rows.size == 0:
+            return
+        if self.centroids is None or vectors.shape[0] >= 2 * self._trained_on:
+            self.build(vectors, keep=np.concatenate([self._live_rows(), rows]))
+            return
+        self._grow_assign(int(rows.max()) + 1)
+        self._rows_seen = max(self._rows_seen, int(rows.max()) + 1)
+        self._assign_rows(rows, vectors[rows])
+
+    def remove(self, rows):
+        for row in np.asarray(rows, dtype=np.int64).reshape(-1):
+            if row < self.assign.shape[0] and self.assign[row] >= 0:
+                b = int(self.assign[row])
+                self.lists[b].remove(int(row))
+                self._arrays[b] = None
+                self.assign[row] = -1
+
+    def build(self, vectors: np.ndarray, keep=None):
+        """(Re)train the centroids on `vectors` and bucket every row in `keep` (default: all)."""
+        n = vectors.shape[0]
+        rows = np.arange(n) if keep is None else np.unique(np.asarray(keep, dtype=np.int64))
+        nlist = self.fixed_nlist or int(np.clip(2 * np.sqrt(max(n, 1)), 8, 4096))
+        nlist = max(1, min(nlist, rows.size))
+        sample = rows if rows.size <= self.TRAIN_SAMPLE else self.rng.choice(rows, self.TRAIN_SAMPLE, replace=False)
+        self.centroids = self._kmeans(vectors[sample], nlist)
+        self.lists = [[] for _ in range(nlist)]
+        self._arrays = [None] * nlist
+        self.assign = np.full(n, -1, dtype=np.int32)
+        for start in range(0, rows.size, self.CHUNK):
+            chunk = rows[start:start + self.CHUNK]
+            self._assign_rows(chunk, vectors[chunk])
+        self._trained_on = max(n, 1)
+        self._rows_seen = n
+        log.info("IVFIndex: trained %d buckets on %d vectors", nlist, rows.size)
+
+    def search(self, vectors: np.ndarray, query: np.ndarray, k: int):
+        if self.centroids is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        probe = top_k(self.centroids @ query, self.nprobe)
+        cand = [self._bucket(int(b)) for b in probe]
+        cand = np.concatenate(cand) if cand else np.empty(0, dtype=np.int64)
+        if cand.size == 0:
+            return cand, np.empty(0, dtype=np.float32)
+        scores = vectors[cand] @ query
+        top = top_k(scores, k)
+        return cand[top], scores[top]
+
+    def save(self, path: str):
+        if self.centroids is None:
+            return
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, centroids=self.centroids, assign=self.assign[:self._rows_seen],
+                 trained_on=np.int64(self._trained_on), nprobe=np.int64(self.nprobe))
+        os.replace(tmp, path)
+
+    def load(self, path: str, vectors: np.ndarray) -> bool:
+        """Load a saved index; rows appended since it was saved are bucketed now."""
+        if not os.path.exists(path):
+            return False
+        with np.load(path) as data:
+            centroids, assign = data["centroids"], data["assign"]
+            trained_on = int(data["trained_on"])
+        n = vectors.shape[0]
+        if centroids.shape[1] != vectors.shape[1] or assign.shape[0] > n:
+            return False
+        self.centroids = centroids.astype(np.float32)
+        self.lists = [[] for _ in range(centroids.shape[0])]
+        self._arrays = [None] * centroids.shape[0]
+        self.assign = np.full(n, -1, dtype=np.int32)
+        for row, b in enumerate(assign.tolist()):
+            if b >= 0:
+                self.lists[b].append(row)
+                self.assign[row] = b
+        self._trained_on = trained_on
+        self._rows_seen = assign.shape[0]
+        missing = np.arange(assign.shape[0], n)
+        if missing.size:
+            self.add(missing, vectors)
+        return True
+
+    def _assign_rows(self, rows: np.ndarray, vecs: np.ndarray):
+        buckets = np.argmax(vecs @ self.centroids.T, axis=1)
+        self.assign[rows] = buckets
+        for row, b in zip(rows.tolist(), buckets.tolist()):
+            self.lists[b].append(row)
+            self._arrays[b] = None
+
+    def _bucket(self, b: int) -> np.ndarray:
+        if self._arrays[b] is None:
+            self._arrays[b] = np.asarray(self.lists[b], dtype=np.int64)
+        return self._arrays[b]
+
+    def _grow_assign(self, n: int):
+        if n > self.assign.shape[0]:
+            grown = np.full(max(n, 2 * self.assign.shape[0]), -1, dtype=np.int32)
+            grown[:self.assign.shape[0]] = self.assign
+            self.assign = grown
+
+    def _live_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.assign >= 0)
+
+    def _kmeans(self, x: np.ndarray, nlist: int) -> np.ndarray:
+        c = x[self.rng.choice(x.shape[0], nlist, replace=False)].copy()
+        for _ in range(self.train_iters):
+            labels = np.argmax(x @ c.T, axis=1)
+            sums = np.zeros_like(c)
+            np.add.at(sums, labels, x)
+            empty = np.bincount(labels, minlength=nlist) == 0
+            # Re-seed empty buckets with random points instead of letting them die.
+            if empty.any():
+                sums[empty] = x[self.rng.choice(x.shape[0], int(empty.sum()))]
+            c = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+        return c.astype(np.float32)
+
+
+class BinaryIndex:
+    """
+    Hamming-distance prefilter on sign codes.
+    - each row is kept as dim/8 bytes, one bit per coordinate (1 where it is positive)
+    - search() ranks every row by the Hamming distance between its bits and the query's,
+      then scores only the `candidates` nearest rows against `vectors`
+    The bits are derived from the vectors, so save() writes nothing and load() rebuilds them.
+    Row ids are positions in the store's embedding matrix.
+    """
+
+    name = "binary"
+    CHUNK = 8192
+
+    def __init__(self, candidates: int = 1000):
+        self.candidates = candidates
+        self.bits = None  # (capacity, dim / 8) uint8
+        self.live = np.empty(0, dtype=bool)
+        self._rows_seen = 0
+
+    def __len__(self):
+        return int(self.live[:self._rows_seen].sum())
+
+    def add(self, rows, vectors: np.ndarray):
+        rows = np.asarray(rows, dtype=np.int64).reshape(-1)
+        if rows.size == 0:
+            return
+        self._grow(int(rows.max()) + 1, vectors.shape[1])
+        for start in range(0, rows.size, self.CHUNK):
+            chunk = rows[start:start + self.CHUNK]
+            self.bits[chunk] = np.packbits(vectors[chunk] > 0, axis=1)
+        self.live[rows] = True
+        self._rows_seen = max(self._rows_seen, int(rows.max()) + 1)
+
+    def remove(self, rows):
+        rows = np.asarray(rows, dtype=np.int64).reshape(-1)
+        self.live[rows[rows < self.live.shape[0]]] = False
+
+    def build(self, vectors: np.ndarray, keep=None):
+        self.bits = None
+        self.live = np.empty(0, dtype=bool)
+        self._rows_seen = 0
+        self.add(np.arange(vectors.shape[0]) if keep is None else keep, vectors)
+
+    def search(self, vectors: np.ndarray, query: np.ndarray, k: int):
+        n = self._rows_seen
+        if n == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        q = np.packbits(query > 0)
+        dist = np.bitwise_count(self.bits[:n] ^ q).sum(axis=1, dtype=np.int32)
+        dist[~self.live[:n]] = np.iinfo(np.int32).max
+        cand = top_k(-dist, min(max(self.candidates, k), int(self.live[:n].sum())))
+        scores = vectors[cand] @ query
+        top = top_k(scores, k)
+        return cand[top], scores[top]
+
+    def save(self, path: str):
+        pass
+
+    def load(self, path: str, vectors: np.ndarray) -> bool:
+        self.build(vectors)
+        return True
+
+    def _grow(self, n: int, dim: int):
+        if self.bits is None:
+            self.bits = np.zeros((max(n, 64), (dim + 7) // 8), dtype=np.uint8)
+            self.live = np.zeros(self.bits.shape[0], dtype=bool)
+        elif n > self.bits.shape[0]:
+            capacity = max(n, 2 * self.bits.shape[0])
+            bits = np.zeros((capacity, self.bits.shape[1]), dtype=np.uint8)
+            bits[:self.bits.shape[0]] = self.bits
+            live = np.zeros(capacity, dtype=bool)
+            live[:self.live.shape[0]] = self.live
+            self.bits, self.live = bits, live
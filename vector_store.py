@@ -1,86 +1,668 @@
 import os
 import json
+import time
 import logging
-from sentence_transformers import SentenceTransformer, util
-import torch
+import threading
+import numpy as np
+from config import settings
+from lazy import LazyResource, startup_report
+from cache import ContentCache, make_key
+from vector_index import ExactIndex, IVFIndex, BinaryIndex, top_k
+from quantization import EmbeddingMatrix
+from consolidation import parse_tiers, tier_of, plan_groups, cap_groups, extractive_summary
+from tracing import tracer
 
 log = logging.getLogger("vector_store")
 
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+
+def _load_embedding_model():
+    with startup_report.measure("imports: sentence_transformers"):
+        from sentence_transformers import SentenceTransformer
+    with startup_report.measure("model load"):
+        return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+
+# One model per process, shared by every EpisodicStore that isn't given its own.
+EMBEDDING_MODEL = LazyResource("embedding model", _load_embedding_model)
+
+# Normalised embeddings keyed by (model name, text), shared by every EpisodicStore.
+EMBEDDING_CACHE = ContentCache(
+    "embedding",
+    dumps=lambda v: v.astype(np.float32).tobytes(),
+    loads=lambda b: np.frombuffer(b, dtype=np.float32).copy(),
+    max_bytes=settings.CACHE_MAX_BYTES,
+    directory=settings.CACHE_DIR,
+)
+
 class EpisodicStore:
     """
     Simple episodic store using sentence-transformers for semantic search.
     - add_event(text, metadata)
     - query(query_text, k)
-    - persist/load (simple JSON)
+    - recent(n) / clear()
+    - persist/load (append-only log, see below)
+    - close() saves the search index
+
+    A `model` other than the shared EMBEDDING_MODEL needs its own `model_name`, which keys
+    the embedding cache and identifies the vectors in session archives.
+
+    The sentence-transformers model is loaded lazily (see lazy.py): warm_up() starts loading
+    it in the background and the first query/add_event only blocks if that isn't done yet.
+    Reads and writes may come from different threads (see memory_worker.py); they are
+    serialised on a lock, while encoding runs outside it.
+
+    Embeddings are kept L2-normalised in one contiguous matrix that grows by capacity
+    doubling, so a query is a single matrix-vector product plus a partial top-k.
+    Text and metadata live in parallel lists indexed by row.
+    The matrix is float32 by default; `precision` (settings.EPISODIC_PRECISION) can keep it as
+    float16 or int8 codes instead (see quantization.py). Search then runs on the codes and
+    only its best settings.EPISODIC_RERANK rows are re-scored with the float32 rows on disk.
+
+    On disk the store is two append-only files next to `path`:
+    - <path>.jsonl  a header line followed by one {"id", "text", "metadata"} record per event
+    - <path>.f32    the raw float32 embedding rows, in the same order, loaded through numpy.memmap
+    A torn tail left by a crash is cut back to the last event present in both files; an
+    append that fails is undone in both files and in memory, and its error raised.
+    A legacy <path>.json store is migrated on load.
+
+    Search goes through a pluggable index (see vector_index.py): exact brute force, an
+    approximate IVF index once the store reaches settings.ANN_THRESHOLD episodes, or a
+    Hamming prefilter on sign bits (settings.EPISODIC_INDEX picks the policy). The IVF index
+    is saved to <path>.ivf.npz.
+
+    The store is kept bounded (settings.EPISODIC_*):
+    - add_event() drops an episode that is a near-duplicate of a stored one
+    - consolidate() merges groups of similar old episodes into one summary episode each, with
+      the ids of the originals in its metadata ("source_ids"), and merges the oldest episodes
+      pairwise while the store is over its cap. compaction_due() says when to run it; it is
+      meant for a background thread and only holds the lock to copy and to swap the rows.
+    - stats() reports the size on disk and in memory and what consolidation has done
+
+    Bulk paths (see session_archive.py) encode in batches of settings.EMBED_BATCH_SIZE:
+    - add_events(texts, metadatas) is add_event() for many episodes, with one append per batch
+    - export_events() / import_events(records, vectors) dump and replace the whole store
     """
 
-    def __init__(self, path: str = "episodic_store.json"):
+    INITIAL_CAPACITY = 64
+    FORMAT_VERSION = 1
+
+    def __init__(self, path: str = "episodic_store", model=None, model_name: str = None,
+                 precision: str = None):
+        if path.endswith(".json"):
+            path = path[:-len(".json")]
         self.path = path
-        self.docs = []  # List of {"text":..., "embedding":..., "metadata":...}
-        self.model = SentenceTransformer('all-MiniLM-L6-v2') # Loads the model
+        self.log_path = path + ".jsonl"
+        self.emb_path = path + ".f32"
+        self.legacy_path = path + ".json"
+        self.index_path = path + ".ivf.npz"
+        self.ids = []
+        self.texts = []
+        self.metadatas = []
+        self.precision = precision or settings.EPISODIC_PRECISION
+        self._matrix = None  # EmbeddingMatrix, created with the first row
+        self._full = None    # read-only memmap of the float32 rows on disk, for re-ranking
+        self._size = 0
+        self._next_id = 0
+        self.index = ExactIndex()
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()  # one consolidate() at a time
+        self._inserts = 0    # episodes added since the last consolidate()
+        self._checked = {}   # id -> tier it was last compared at (not persisted: a restart rechecks all)
+        self.duplicates_dropped = 0
+        self.compactions = 0
+        self.last_compaction = {}
+        if model is None:
+            model = EMBEDDING_MODEL
+        if model_name is None:
+            # the name keys EMBEDDING_CACHE, so another model must not borrow the default one
+            if model is not EMBEDDING_MODEL:
+                raise ValueError("pass model_name along with a custom embedding model")
+            model_name = EMBEDDING_MODEL_NAME
+        self.model_name = model_name
+        self._model = model if isinstance(model, LazyResource) else LazyResource.of(model, "embedding model")
+
+        try:
+            if os.path.exists(self.log_path):
+                self._load()
+            elif os.path.exists(self.legacy_path):
+                self._migrate_legacy()
+        except Exception as e:
+            log.warning("Failed to load episodic store, starting empty: %s", e)
+            self._reset()
+        self._select_index()
+
+
+    def __len__(self):
+        return self._size
+
+
+    @property
+    def model(self):
+        return self._model.get()
 
-        if os.path.exists(self.path):
-            try:
-                with open(self.path, "r", encoding="utf-8") as f:
-                    loaded_docs = json.load(f)
-                    for doc in loaded_docs:
-                        # Convert embedding from list back to torch.Tensor
-                        doc['embedding'] = torch.tensor(doc['embedding'])
-                    self.docs = loaded_docs
-            except Exception:
-                self.docs = []
+
+    @property
+    def embedding_dim(self) -> int:
+        """Width of the vectors the model gives (loads it if it isn't yet)."""
+        model = self.model
+        get_dim = getattr(model, "get_sentence_embedding_dimension", None)
+        dim = get_dim() if get_dim is not None else None
+        if not dim:
+            dim = np.asarray(model.encode("", convert_to_numpy=True)).shape[-1]
+        return int(dim)
+
+
+    def warm_up(self):
+        self._model.start()
 
 
     def add_event(self, text: str, metadata: dict = None):
+        """Store one episode and return its id, or None if it was dropped as a near-duplicate."""
         # Encode the text to get its vector embedding
-        embedding = self.model.encode(text, convert_to_tensor=True)
-        self.docs.append({
-            "text": text,
-            "embedding": embedding,
-            "metadata": metadata or {}
-        })
-        self.persist()
+        embedding = _unit(self._encode(text))
+        with tracer.span("episodic.append"), self._lock:
+            if self._is_duplicate(embedding):
+                self.duplicates_dropped += 1
+                return None
+            next_id = self._next_id
+            row = self._append(text, embedding, metadata or {})
+            try:
+                self._write_rows(row, embedding[None])
+            except Exception:
+                self._drop_rows(row, next_id)
+                raise
+            self._index_rows(row, row + 1)
+            self._inserts += 1
+            return self.ids[row]
+
+
+    def add_events(self, texts: list, metadatas: list = None, batch_size: int = None, progress=None) -> list:
+        """add_event() for many texts, encoded in batches; returns their ids (None for dropped duplicates)."""
+        metadatas = metadatas or [None] * len(texts)
+        vectors = self.encode_many(texts, batch_size, progress)
+        ids, kept = [], []
+        with tracer.span("episodic.append", rows=len(texts)), self._lock:
+            start, next_id = self._size, self._next_id
+            for text, embedding, metadata in zip(texts, vectors, metadatas):
+                embedding = _unit(embedding)
+                if self._is_duplicate(embedding):
+                    self.duplicates_dropped += 1
+                    ids.append(None)
+                    continue
+                row = self._append(text, embedding, metadata or {})
+                self._index_rows(row, row + 1)
+                ids.append(self.ids[row])
+                kept.append(embedding)
+            if kept:
+                try:
+                    self._write_rows(start, np.stack(kept))
+                except Exception:
+                    self._drop_rows(start, next_id)
+                    raise
+                self._inserts += len(kept)
+        return ids
+
+
+    def encode_many(self, texts: list, batch_size: int = None, progress=None) -> np.ndarray:
+        """
+        (len(texts), dim) normalised float32 embeddings, one model.encode() call per batch.
+        Bypasses the embedding cache, which bulk loads would only flush.
+        `progress(done, total)` is called after each batch.
+        """
+        batch_size = batch_size or settings.EMBED_BATCH_SIZE
+        chunks = []
+        for start in range(0, len(texts), batch_size):
+            batch = list(texts[start:start + batch_size])
+            with tracer.span("episodic.encode", rows=len(batch)):
+                chunks.append(np.asarray(self.model.encode(batch, batch_size=batch_size, convert_to_numpy=True,
+                                                           normalize_embeddings=True), dtype=np.float32))
+            if progress is not None:
+                progress(start + len(batch), len(texts))
+        if not chunks:
+            return np.empty((0, self._matrix.dim if self._matrix is not None else 0), dtype=np.float32)
+        return np.concatenate(chunks).reshape(len(texts), -1)
+
+
+    def export_events(self):
+        """([{"id", "text", "metadata"}], (n, dim) float32 embeddings) of every episode."""
+        with self._lock:
+            records = [{"id": i, "text": t, "metadata": m} for i, t, m in zip(self.ids, self.texts, self.metadatas)]
+            vectors = self._exact(np.arange(self._size)) if self._size else None
+        return records, vectors
+
+
+    def import_events(self, records: list, vectors: np.ndarray):
+        """Replace the store with `records` (as from export_events()) and their float32 `vectors`."""
+        with self._lock:
+            self._reset()
+            vectors = _unit_rows(vectors) if len(records) else None
+            if len(records):
+                self._matrix = EmbeddingMatrix(vectors.shape[1], self.precision, self.INITIAL_CAPACITY)
+                self._matrix.append(vectors)
+            for r in records:
+                self.ids.append(r["id"])
+                self.texts.append(r["text"])
+                self.metadatas.append(r.get("metadata") or {})
+            self._size = len(records)
+            self._next_id = max(self.ids) + 1 if self.ids else 0
+            self.persist(vectors)
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            self._select_index()
+
+
+    def _is_duplicate(self, embedding: np.ndarray) -> bool:
+        threshold = settings.EPISODIC_DEDUP_THRESHOLD
+        if threshold <= 0 or not self._size:
+            return False
+        _, scores = self._search(embedding, 1)
+        return len(scores) > 0 and float(scores[0]) >= threshold
+
+
+    def compaction_due(self) -> bool:
+        """True once settings.EPISODIC_COMPACT_EVERY episodes were added since the last consolidate()."""
+        every = settings.EPISODIC_COMPACT_EVERY
+        return every > 0 and self._inserts >= every
+
+
+    def consolidate(self, summarize=None) -> dict:
+        """
+        Merge similar old episodes (settings.EPISODIC_AGE_TIERS) and, over
+        settings.EPISODIC_MAX_EPISODES, the oldest ones. `summarize(texts) -> str` writes each
+        summary; consolidation.extractive_summary is used when it is None or fails.
+        A summary takes the place of its earliest episode, with the weighted mean embedding.
+        Episodes added while it runs are kept. Returns what it did (also in last_compaction).
+        """
+        with self._compact_lock, tracer.span("episodic.compact") as span:
+            t0 = time.perf_counter()
+            with self._lock:
+                n = self._size
+                ids, texts, metas = list(self.ids), list(self.texts), list(self.metadatas)
+                vectors = self._exact(np.arange(n)) if n else None
+                newest = self._next_id - 1
+                self._inserts = 0
+            groups = []
+            if n >= 2:
+                tiers = parse_tiers(settings.EPISODIC_AGE_TIERS)
+                # a summary is as old as its newest episode
+                anchors = np.array([max(m.get("source_ids") or [i]) for i, m in zip(ids, metas)])
+                tier = tier_of(newest - anchors, tiers)
+                fresh = np.array([t >= 0 and t > self._checked.get(i, -1) for i, t in zip(ids, tier.tolist())])
+                groups = plan_groups(vectors, tier, tiers, fresh, settings.EPISODIC_MAX_CLUSTER)
+                groups = cap_groups(n, groups, settings.EPISODIC_MAX_EPISODES)
+                self._checked = {i: t for i, t in zip(ids, tier.tolist()) if t >= 0}
+
+            merges = []
+            for rows in groups:
+                member_texts = [texts[r] for r in rows]
+                text = None
+                if summarize is not None:
+                    try:
+                        text = summarize(member_texts)
+                    except Exception as e:
+                        log.warning("Summarizer failed, using the extractive summary: %s", e)
+                text = text or extractive_summary(member_texts)
+                weights = np.array([metas[r].get("count", 1) for r in rows], dtype=np.float32)
+                embedding = (vectors[rows] * weights[:, None]).sum(axis=0)
+                meta = {"summary": True,
+                        "source_ids": sorted(s for r in rows for s in (metas[r].get("source_ids") or [ids[r]])),
+                        "count": int(weights.sum())}
+                starts = [metas[r]["ts"] for r in rows if "ts" in metas[r]]
+                if starts:
+                    meta["ts"] = min(starts)
+                    meta["ts_end"] = max(metas[r].get("ts_end", metas[r].get("ts", 0)) for r in rows)
+                merges.append(([ids[r] for r in rows], text, embedding, meta))
+
+            with self._lock:
+                merged = self._apply_merges(merges) if merges else 0
+                after = self._size
+            result = {"before": n, "after": after, "summaries": len(merges), "merged": merged,
+                      "elapsed_s": time.perf_counter() - t0}
+            span.set(**result)
+            self.compactions += 1
+            self.last_compaction = result
+        if merges:
+            log.info("Consolidated %d episodes into %d summaries (%d -> %d episodes)",
+                     merged, len(merges), n, after)
+        return result
+
+
+    def _apply_merges(self, merges: list) -> int:
+        """Swap each group of ids for its summary and rewrite the files; returns episodes removed."""
+        row_of = {i: r for r, i in enumerate(self.ids)}
+        summary_at = {}
+        dropped = set()
+        for member_ids, text, embedding, meta in merges:
+            rows = [row_of.get(i) for i in member_ids]
+            if None in rows:
+                continue  # cleared since the snapshot
+            summary_at[min(rows)] = (text, embedding, meta)
+            dropped.update(rows)
+        if not summary_at:
+            return 0
 
+        ids, texts, metas = self.ids, self.texts, self.metadatas
+        n, next_id = self._size, self._next_id
+        exact = self._exact(np.arange(n))
+        inserts, checked = self._inserts, self._checked
+        self._reset()
+        self._next_id, self._inserts, self._checked = next_id, inserts, checked
+        kept = []
+        for r in range(n):
+            if r in summary_at:
+                text, embedding, meta = summary_at[r]
+                kept.append(_unit(embedding))
+                self._append(text, kept[-1], meta)
+            elif r not in dropped:
+                kept.append(exact[r])
+                self._append(texts[r], exact[r], metas[r], id_=ids[r])
+        self.persist(np.stack(kept))
+        if os.path.exists(self.index_path):
+            os.remove(self.index_path)
+        self._select_index()
+        return n - self._size
 
-    def persist(self):
+
+    def stats(self) -> dict:
+        with self._lock:
+            summaries = [m for m in self.metadatas if m.get("summary")]
+            out = {
+                "episodes": self._size,
+                "summaries": len(summaries),
+                "merged_episodes": sum(m.get("count", 1) for m in summaries),
+                "precision": self.precision,
+                "matrix_bytes": self._matrix.nbytes if self._matrix is not None else 0,
+                "duplicates_dropped": self.duplicates_dropped,
+                "compactions": self.compactions,
+                "pending_inserts": self._inserts,
+            }
+        out["disk_bytes"] = sum(os.path.getsize(p) for p in (self.log_path, self.emb_path, self.index_path)
+                                if os.path.exists(p))
+        if self.last_compaction:
+            out["last_compaction"] = dict(self.last_compaction)
+        return out
+
+
+    def recent(self, n: int):
+        """Return the last n events as {"text":..., "metadata":...} dicts, oldest first."""
+        with self._lock:
+            start = max(0, self._size - n)
+            return [{"text": self.texts[i], "metadata": self.metadatas[i]} for i in range(start, self._size)]
+
+
+    def clear(self):
+        """Drop every event and persist the empty store."""
+        with self._lock:
+            self._reset()
+            self.persist()
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+
+
+    def close(self):
+        with self._lock:
+            self.index.save(self.index_path)
+
+
+    def remove_files(self):
+        """Delete the on-disk store (the in-memory copy is left untouched)."""
+        for p in (self.log_path, self.emb_path, self.index_path):
+            if os.path.exists(p):
+                os.remove(p)
+
+
+    def _reset(self):
+        self.ids = []
+        self.texts = []
+        self.metadatas = []
+        self._matrix = None
+        self._full = None
+        self._size = 0
+        self._next_id = 0
+        self.index = ExactIndex()
+        self._inserts = 0
+        self._checked = {}
+
+
+    def persist(self, vectors: np.ndarray = None):
+        """
+        Rewrite both files from memory. Normal appends never need this.
+        `vectors` are the float32 rows to write when the files no longer match the rows in memory.
+        """
         try:
-            # Create a serializable copy of docs
-            docs_to_save = []
-            for doc in self.docs:
-                serializable_doc = doc.copy()
-                # Convert tensor to a list for JSON serialization
-                serializable_doc['embedding'] = doc['embedding'].tolist()
-                docs_to_save.append(serializable_doc)
-
-            with open(self.path, "w", encoding="utf-8") as f:
-                json.dump(docs_to_save, f, ensure_ascii=False, indent=2)
+            if vectors is None and self._size:
+                vectors = self._exact(np.arange(self._size))
+            tmp_log, tmp_emb = self.log_path + ".tmp", self.emb_path + ".tmp"
+            with open(tmp_log, "w", encoding="utf-8") as f:
+                if self._matrix is not None:
+                    f.write(self._header_line())
+                for i in range(self._size):
+                    f.write(self._record_line(i))
+            with open(tmp_emb, "wb") as f:
+                if self._size:
+                    f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            self._full = None
+            os.replace(tmp_emb, self.emb_path)
+            os.replace(tmp_log, self.log_path)
         except Exception as e:
             log.warning("Failed to persist episodic store: %s", e)
 
 
+    def _write_rows(self, start: int, vectors: np.ndarray):
+        """
+        Append the rows from `start` on, whose float32 embeddings are `vectors`: embeddings
+        first, then the records. If either write fails, both files are cut back to where they
+        were, so every later record still lines up with its embedding row, and the error is
+        raised for the caller to drop the rows from memory too.
+        """
+        end = start + vectors.shape[0]
+        sizes = {p: os.path.getsize(p) if os.path.exists(p) else 0 for p in (self.emb_path, self.log_path)}
+        try:
+            with open(self.emb_path, "ab") as f:
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                if sizes[self.log_path] == 0:
+                    f.write(self._header_line())
+                f.write("".join(self._record_line(i) for i in range(start, end)))
+        except Exception as e:
+            log.warning("Failed to append %d episodes to the episodic store: %s", end - start, e)
+            for path, size in sizes.items():
+                try:
+                    if os.path.exists(path) and os.path.getsize(path) > size:
+                        os.truncate(path, size)
+                except OSError as e2:
+                    log.warning("Could not cut %s back after a failed append: %s", path, e2)
+            raise
+
+
+    def _drop_rows(self, start: int, next_id: int):
+        """Forget the rows from `start` on (added but never written) and hand their ids out again."""
+        self.index.remove(np.arange(start, self._size))
+        del self.ids[start:], self.texts[start:], self.metadatas[start:]
+        self._matrix.truncate(start)
+        self._size = start
+        self._next_id = next_id
+
+
+    def _exact(self, rows: np.ndarray) -> np.ndarray:
+        """float32 embeddings of `rows`: from the matrix itself at float32, else from <path>.f32."""
+        if self._matrix.exact:
+            return self._matrix[rows]
+        need = int(rows.max()) + 1 if rows.size else 0
+        if self._full is None or self._full.shape[0] < need:
+            on_disk = os.path.getsize(self.emb_path) // (4 * self._matrix.dim) if os.path.exists(self.emb_path) else 0
+            self._full = np.memmap(self.emb_path, dtype=np.float32, mode="r",
+                                   shape=(on_disk, self._matrix.dim)) if on_disk else None
+        if self._full is None or self._full.shape[0] < need:
+            return self._matrix[rows]  # a failed write left the file short: the codes are all we have
+        return np.asarray(self._full[rows])
+
+
+    def _header_line(self) -> str:
+        return json.dumps({"format": "episodic-log", "version": self.FORMAT_VERSION,
+                           "dim": int(self._matrix.dim)}) + "\n"
+
+
+    def _record_line(self, i: int) -> str:
+        return json.dumps({"id": self.ids[i], "text": self.texts[i], "metadata": self.metadatas[i]},
+                          ensure_ascii=False) + "\n"
+
+
+    def _load(self):
+        records, header = [], None
+        ends = []  # byte offset just past the header (ends[0]) and past every record
+        good_bytes = 0
+        with open(self.log_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn write
+                try:
+                    obj = json.loads(line)
+                except ValueError:
+                    break
+                good_bytes += len(line)
+                if header is None:
+                    header = obj
+                else:
+                    records.append(obj)
+                ends.append(good_bytes)
+        if header is None:
+            self.remove_files()  # nothing recoverable, not even the header
+            return
+
+        dim = int(header["dim"])
+        row_bytes = dim * 4
+        emb_size = os.path.getsize(self.emb_path) if os.path.exists(self.emb_path) else 0
+        n = min(len(records), emb_size // row_bytes)
+
+        # Cut both files back to the last event that made it into both.
+        if os.path.getsize(self.log_path) != ends[n]:
+            log.warning("Episodic log had a torn tail; recovered %d events", n)
+            with open(self.log_path, "r+b") as f:
+                f.truncate(ends[n])
+        if emb_size != n * row_bytes:
+            with open(self.emb_path, "r+b") as f:
+                f.truncate(n * row_bytes)
+
+        self._matrix = EmbeddingMatrix(dim, self.precision, self.INITIAL_CAPACITY)
+        if n:
+            full = np.memmap(self.emb_path, dtype=np.float32, mode="r", shape=(n, dim))
+            for start in range(0, n, EmbeddingMatrix.CHUNK):
+                self._matrix.append(full[start:start + EmbeddingMatrix.CHUNK])
+        for r in records[:n]:
+            self.ids.append(r["id"])
+            self.texts.append(r["text"])
+            self.metadatas.append(r.get("metadata", {}))
+        self._size = n
+        self._next_id = max(self.ids) + 1 if self.ids else 0
+
+
+    def _migrate_legacy(self):
+        with open(self.legacy_path, "r", encoding="utf-8") as f:
+            loaded_docs = json.load(f)
+        vectors = []
+        for doc in loaded_docs:
+            vectors.append(_unit(doc["embedding"]))
+            self._append(doc["text"], vectors[-1], doc.get("metadata", {}))
+        self.persist(np.stack(vectors) if vectors else None)
+        os.replace(self.legacy_path, self.legacy_path + ".migrated")
+        log.info("Migrated %d events from %s", self._size, self.legacy_path)
+
+
     def query(self, query_text: str, k: int = 5):
-        if not self.docs:
+        if not self._size or k <= 0:
             return []
 
-        # Encode the query to get its embedding
-        query_embedding = self.model.encode(query_text, convert_to_tensor=True)
+        # Encode the query to get its (normalised) embedding
+        query_embedding = self._encode(query_text)
+
+        # Cosine similarity, best first
+        with tracer.span("episodic.search", size=self._size), self._lock:
+            rows, scores = self._search(query_embedding, k)
+            return [
+                {"text": self.texts[i], "score": float(s), "metadata": self.metadatas[i]}
+                for i, s in zip(rows.tolist(), scores.tolist())
+            ]
+
+
+    def _search(self, query: np.ndarray, k: int):
+        if self._matrix.exact:
+            return self.index.search(self._matrix, query, k)
+        # shortlist on the codes, then re-rank it at full precision
+        rows, _ = self.index.search(self._matrix, query, max(k, settings.EPISODIC_RERANK))
+        scores = self._exact(rows) @ query
+        top = top_k(scores, k)
+        return rows[top], scores[top]
+
+
+    def _index_rows(self, start: int, end: int):
+        if isinstance(self.index, (IVFIndex, BinaryIndex)):
+            self.index.add(np.arange(start, end), self._matrix)
+        else:
+            self._select_index()
+
+
+    def _select_index(self):
+        """Switch from exact to IVF or binary search when the configured policy says so."""
+        mode = settings.EPISODIC_INDEX
+        if mode == "binary":
+            if not isinstance(self.index, BinaryIndex):
+                self.index = BinaryIndex(candidates=settings.BINARY_CANDIDATES)
+                if self._size:
+                    self.index.build(self._matrix)
+            return
+        want_ivf = self._size > 0 and (mode == "ivf" or (mode == "auto" and self._size >= settings.ANN_THRESHOLD))
+        if not want_ivf or isinstance(self.index, IVFIndex):
+            return
+        vectors = self._matrix
+        index = IVFIndex(nprobe=settings.IVF_NPROBE)
+        try:
+            loaded = index.load(self.index_path, vectors)
+        except Exception as e:
+            log.warning("Ignoring unreadable index file %s: %s", self.index_path, e)
+            loaded = False
+        if not loaded:
+            index.build(vectors)
+            index.save(self.index_path)
+        self.index = index
+
+
+    def _encode(self, text: str) -> np.ndarray:
+        key = make_key(self.model_name, text)
+        emb = EMBEDDING_CACHE.get(key)
+        if emb is None:
+            with tracer.span("episodic.encode"):
+                emb = np.asarray(self.model.encode(text, convert_to_numpy=True, normalize_embeddings=True),
+                                 dtype=np.float32)
+            EMBEDDING_CACHE.put(key, emb)
+        return emb
+
+
+    def _append(self, text: str, embedding: np.ndarray, metadata: dict, id_: int = None):
+        embedding = _unit(embedding)
+        if self._matrix is None:
+            self._matrix = EmbeddingMatrix(embedding.shape[0], self.precision, self.INITIAL_CAPACITY)
+        self._matrix.append(embedding)
+        if id_ is None:
+            id_ = self._next_id
+            self._next_id += 1
+        self.ids.append(id_)
+        self.texts.append(text)
+        self.metadatas.append(metadata)
+        self._size += 1
+        return self._size - 1
 
-        # Get all stored document embeddings
-        corpus_embeddings = torch.stack([doc['embedding'] for doc in self.docs])
 
-        # Use the library's semantic search utility to find the top k hits
-        hits = util.semantic_search(query_embedding, corpus_embeddings, top_k=k)
+def _unit(embedding) -> np.ndarray:
+    embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(embedding)
+    return embedding / norm if norm > 0 else embedding
 
-        # The result is a list of lists, we take the first list for our single query
-        hits = hits[0]
 
-        results = []
-        for hit in hits:
-            doc_index = hit['corpus_id']
-            doc = self.docs[doc_index]
-            results.append({
-                "text": doc["text"],
-                "score": hit['score'],
-                "metadata": doc.get("metadata", {})
-            })
-        return results
\ No newline at end of file
+def _unit_rows(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms